@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.account import urls
+from utils.tests.utils import QueryBudgetMixin
+
+# (url name, method): the most queries the view may run, whatever the number of users,
+# the session and the user loading included
+QUERY_BUDGETS = {
+    ('account:registration', 'GET'): 0,
+    # the registration form and the view both log the new user in
+    ('account:registration', 'POST'): 19,
+    ('account:login', 'GET'): 0,
+    ('account:login', 'POST'): 9,
+    ('account:logout', 'GET'): 4,
+    ('account:user_account', 'GET'): 2,
+}
+PASSWORD = 'budget-password-1'
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        self.user = get_user_model().objects.get(id=1)
+        self.user.set_password(PASSWORD)
+        self.user.save()
+
+    def grow_catalog(self, size: int):
+        """
+        Add users up to the size, the number of books does not matter to the account views.
+        """
+        for i in range(get_user_model().objects.count(), size):
+            get_user_model().objects.create(username=f'budget_user_{i}')
+
+    def assertGetBudget(self, name: str, login: bool = False):
+        def request():
+            if login:
+                self.client.force_login(self.user)
+            return lambda: self.client.get(reverse(name))
+        self.assertViewBudget(QUERY_BUDGETS[name, 'GET'], name, request)
+
+    def test_budgets_cover_all_views(self):
+        self.assertEqual({name for name, _ in QUERY_BUDGETS},
+                         {f'{urls.app_name}:{pattern.name}' for pattern in urls.urlpatterns})
+
+    def test_registration(self):
+        self.assertGetBudget('account:registration')
+
+        def request():
+            self.client.logout()
+            username = f'registered_user_{get_user_model().objects.count()}'
+            data = {'username': username, 'password1': PASSWORD, 'password2': PASSWORD}
+            return lambda: self.client.post(reverse('account:registration'), data)
+        self.assertViewBudget(QUERY_BUDGETS['account:registration', 'POST'], 'account:registration', request)
+
+    def test_login(self):
+        self.assertGetBudget('account:login')
+
+        def request():
+            self.client.logout()
+            data = {'username': self.user.username, 'password': PASSWORD}
+            return lambda: self.client.post(reverse('account:login'), data)
+        self.assertViewBudget(QUERY_BUDGETS['account:login', 'POST'], 'account:login', request)
+
+    def test_logout(self):
+        self.assertGetBudget('account:logout', login=True)
+
+    def test_user_account(self):
+        self.assertGetBudget('account:user_account', login=True)
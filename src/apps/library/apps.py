@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.library'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        post_migrate.connect(signals.create_search_index_after_migrate, sender=self)
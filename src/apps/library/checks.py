@@ -0,0 +1,18 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The catalog and user library versions live in the default cache, all the worker processes have to share it.
+    """
+    if isinstance(caches['default'], LocMemCache):
+        return [Error(
+            'The default cache is a local memory cache, every worker process would keep its own catalog '
+            'and user library versions and serve stale pages after edits handled by the other ones.',
+            hint='Set CACHE_BACKEND to file or db.',
+            id='library.E001',
+        )]
+    return []
@@ -0,0 +1,69 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.library.models import Book
+from apps.library.utils.benchmark_utils import run_benchmark, compare_results, BenchmarkOptions, ENDPOINTS, \
+    PERCENTILES
+
+
+class Command(BaseCommand):
+    help = ('Load-test the library and statistic pages with concurrent simulated users, logged in as the users '
+            'of the database, for example a dataset from generate_dataset. Requests go through the whole '
+            'middleware and URL map in this process. Reports throughput, latency percentiles and query counts '
+            'per endpoint, and writes them as json to compare runs between commits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of simulated users.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Users sending requests at the same time.')
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests per user.')
+        parser.add_argument('--warmup', type=int, default=5, help='Requests per user sent before measuring.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+        parser.add_argument('--output', help='Path of the json results.')
+        parser.add_argument('--compare', help='Path of the json results of a previous run, fail on regressions.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Share of growth of the p95 latency reported as a regression.')
+
+    def handle(self, *args, **options):
+        if not Book.objects.exists():
+            raise CommandError('There are no books, generate a dataset first.')
+        if not get_user_model().objects.filter(is_superuser=False).exists():
+            raise CommandError('There are no users, generate a dataset first.')
+
+        results = run_benchmark(BenchmarkOptions(
+            users=options['users'],
+            concurrency=options['concurrency'],
+            requests=options['requests'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            endpoints=options['endpoints'],
+        ))
+
+        percentiles = ''.join(f'{f"p{percentile} ms":>9}' for percentile in PERCENTILES)
+        self.stdout.write(f'{"endpoint":<40}{"requests":>9}{"req/s":>9}{percentiles}{"queries":>9}{"errors":>8}')
+        for label, summary in [*results['endpoints'].items(), ('total', results['total'])]:
+            if not summary:
+                continue
+            values = ''.join(f'{summary[f"p{percentile}_ms"]:>9.1f}' for percentile in PERCENTILES)
+            self.stdout.write(f'{label:<40}{summary["requests"]:>9}{summary["throughput"]:>9.1f}{values}'
+                              f'{summary["mean_queries"]:>9.1f}{summary["errors"]:>8}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}.'))
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+            try:
+                regressions = compare_results(previous, results, options['threshold'])
+            except ValueError as error:
+                raise CommandError(f'Cannot compare with {options["compare"]}. {error}.')
+            for label, metric, old, new in regressions:
+                self.stderr.write(f'{label}: {metric} {old:.1f} -> {new:.1f}')
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["compare"]}.')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}.'))
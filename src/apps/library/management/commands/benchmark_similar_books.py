@@ -0,0 +1,62 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.library.models import Book
+from apps.library.utils.similarity_utils import find_similar_books, get_book_features, SIMILAR_BOOKS_LIMIT
+
+
+def get_jaccard(features: set[str], other: set[str]) -> float:
+    return len(features & other) / len(features | other)
+
+
+def get_exact_similar_books(book_id: int, features: dict[int, set[str]], limit: int) -> list[int]:
+    """
+    Return ids of the books with the highest exact jaccard similarity of their features.
+    """
+    book_features = features[book_id]
+    scores = [(-get_jaccard(book_features, other), other_id)
+              for other_id, other in features.items() if other_id != book_id and book_features & other]
+    return [other_id for _, other_id in sorted(scores)[:limit]]
+
+
+class Command(BaseCommand):
+    help = ('Measure the latency of the similar books lookup and its recall against '
+            'the exact jaccard top-k over all books.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=100, help='Number of random books to look up.')
+        parser.add_argument('--limit', type=int, default=SIMILAR_BOOKS_LIMIT)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        if not book_ids:
+            self.stderr.write('There are no books.')
+            return
+        features = get_book_features(book_ids)
+        samples = random.Random(options['seed']).sample(book_ids, min(options['samples'], len(book_ids)))
+        limit = options['limit']
+
+        timings, found, relevant = [], 0, 0
+        for book_id in samples:
+            start = time.perf_counter()
+            similar = find_similar_books(book_id, limit)
+            timings.append((time.perf_counter() - start) * 1000)
+            exact = get_exact_similar_books(book_id, features, limit)
+            if exact:
+                # books tied with the last exact score are as relevant as it
+                threshold = get_jaccard(features[book_id], features[exact[-1]])
+                hits = sum(get_jaccard(features[book_id], features[similar_id]) >= threshold
+                           for similar_id, _ in similar)
+                found += min(hits, len(exact))
+                relevant += len(exact)
+
+        quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        recall = found / relevant if relevant else 1.0
+        self.stdout.write(f'{len(samples)} lookups of {limit} similar books among {len(book_ids)} books')
+        self.stdout.write(f'latency: p50 {quantiles[49]:.2f} ms, p95 {quantiles[94]:.2f} ms, '
+                          f'max {max(timings):.2f} ms')
+        self.stdout.write(f'recall@{limit}: {recall:.3f}')
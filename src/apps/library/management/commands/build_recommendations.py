@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.library.utils.recommendation_utils import build_recommendations, RECOMMENDATIONS_TOP, MAX_USER_BOOKS
+
+
+class Command(BaseCommand):
+    help = 'Recompute the "readers also read" neighbors of all books from the users libraries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=RECOMMENDATIONS_TOP, help='Neighbors stored per book.')
+        parser.add_argument('--min-common', type=int, default=1,
+                            help='Minimal number of common readers of a book and its neighbor.')
+        parser.add_argument('--max-user-books', type=int, default=MAX_USER_BOOKS,
+                            help='Libraries with more books are skipped.')
+
+    def handle(self, *args, **options):
+        stored = build_recommendations(options['top'], options['min_common'], options['max_user_books'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} book neighbors.'))
@@ -0,0 +1,80 @@
+import datetime
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from apps.library.models import Book
+from apps.library.utils.cache_utils import bump_catalog_version, bump_book_genres_version
+from apps.library.utils.dataset_utils import generate_dataset, DatasetOptions
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic catalog with users libraries and reading history into an empty catalog. '
+            'Popularity of authors, genres, title words and books is Zipfian, the same seed gives the same data. '
+            'The search and similar books indexes and the statistics are rebuilt afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1_000_000)
+        parser.add_argument('--authors', type=int, default=50_000)
+        parser.add_argument('--genres', type=int, default=1_000)
+        parser.add_argument('--countries', type=int, default=200)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--books-per-user', type=float, default=20, help='Mean size of a user library.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--zipf', type=float, default=1.1, help='Exponent of the popularity distributions.')
+        parser.add_argument('--history-days', type=int, default=365,
+                            help='Days of reading history before --until.')
+        parser.add_argument('--until', type=datetime.date.fromisoformat,
+                            help='Date of the end of the reading history (YYYY-MM-DD), by default now. '
+                                 'Pass it to reproduce the timestamps as well.')
+        parser.add_argument('--password', default='password', help='Password of the generated users.')
+        parser.add_argument('--skip-indexes', action='store_true',
+                            help="Don't rebuild the indexes and the statistics.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if options['authors'] < 1 or options['genres'] < 1:
+            raise CommandError('Books need at least one author and one genre.')
+        if min(options['books'], options['countries'], options['users'], options['history_days']) < 0:
+            raise CommandError('The counts should not be negative.')
+        if Book.objects.using(using).exists():
+            raise CommandError('The catalog is not empty, generate the dataset into an empty database.')
+
+        until = options['until']
+        if until is not None:
+            until = timezone.make_aware(datetime.datetime.combine(until, datetime.time()))
+        dataset_options = DatasetOptions(
+            books=options['books'],
+            authors=options['authors'],
+            genres=options['genres'],
+            countries=options['countries'],
+            users=options['users'],
+            books_per_user=options['books_per_user'],
+            seed=options['seed'],
+            zipf=options['zipf'],
+            history_days=options['history_days'],
+            until=until,
+            password=options['password'],
+        )
+
+        start = time.monotonic()
+
+        def progress(report):
+            self.stdout.write(f'{report.books} books, {report.instances} book instances, '
+                              f'{time.monotonic() - start:.0f} s')
+
+        report = generate_dataset(dataset_options, using, progress=progress)
+        bump_catalog_version()
+        bump_book_genres_version()
+        if not options['skip_indexes']:
+            call_command('rebuild_search_index', database=using, stdout=self.stdout, stderr=self.stderr)
+            call_command('rebuild_similarity_index', database=using, stdout=self.stdout, stderr=self.stderr)
+            call_command('rebuild_statistics', database=using, stdout=self.stdout, stderr=self.stderr)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {report.books} books, {report.authors} authors, {report.genres} genres, '
+            f'{report.countries} countries, {report.users} users, {report.instances} book instances '
+            f'and {report.events} reading events.'))
@@ -0,0 +1,49 @@
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.library.utils.import_utils import import_books, parse_csv, parse_jsonl, IMPORT_BATCH_SIZE
+
+PARSERS = {
+    'csv': parse_csv,
+    'jsonl': parse_jsonl,
+}
+
+
+class Command(BaseCommand):
+    help = ('Import books from a csv or json lines file (- for stdin). '
+            'Columns: title, year_of_publication, description, authors, genres, country.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=PARSERS, help='Input format, by default from the file extension.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or Path(path).suffix.lstrip('.').lower()
+        if input_format not in PARSERS:
+            raise CommandError('Unknown input format, use --format csv or --format jsonl.')
+
+        start = time.monotonic()
+
+        def progress(report):
+            elapsed = time.monotonic() - start
+            self.stdout.write(f'Imported {report.imported} books, {len(report.errors)} errors, '
+                              f'{report.imported / elapsed:.0f} books/s')
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            report = import_books(PARSERS[input_format](stream), options['batch_size'], options['database'],
+                                  progress=progress)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for line, message in report.errors:
+            self.stderr.write(f'Line {line}: {message}')
+        self.stdout.write(self.style.SUCCESS(f'Imported {report.imported} books.'))
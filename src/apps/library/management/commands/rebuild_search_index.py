@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.library.utils.search_utils import rebuild_search_index, is_search_index_supported
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of books.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not is_search_index_supported(using):
+            self.stderr.write('The database does not support the full-text search index.')
+            return
+        count = rebuild_search_index(using)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} books.'))
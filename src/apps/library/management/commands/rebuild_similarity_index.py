@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.library.utils.similarity_utils import rebuild_similarity_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the MinHash signatures and LSH buckets of the similar books index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        count = rebuild_similarity_index(options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} books.'))
@@ -1,9 +1,14 @@
+from bisect import bisect_left
+
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
 from django.db import models
+from django.db.models.query import ModelIterable
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.text import slugify
 
 from utils.utils import get_minimal_book_year, get_maximal_book_year, get_default_book_image
+from .utils.cache_utils import CatalogCachedQuerySet
 from .utils.models_utils import (
     get_accepted_book_extensions,
     validate_book_size,
@@ -66,6 +71,39 @@ class Genre(FullCleanBeforeSaveMixin, models.Model):
         return self.name
 
 
+class BookQuerySet(CatalogCachedQuerySet):
+    """
+    Queryset of books. Can flag the fetched books with `read` from a sorted sequence of read book ids,
+    so the query itself stays independent of the user.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._read_book_ids = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._read_book_ids = self._read_book_ids
+        return clone
+
+    def flag_read(self, read_book_ids):
+        """
+        Set `read` on every fetched book, read_book_ids must be sorted.
+        """
+        clone = self._chain()
+        clone._read_book_ids = read_book_ids
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._read_book_ids is not None and issubclass(self._iterable_class, ModelIterable):
+            read_book_ids = self._read_book_ids
+            for book in self._result_cache:
+                i = bisect_left(read_book_ids, book.pk)
+                book.read = i < len(read_book_ids) and read_book_ids[i] == book.pk
+
+
 class Book(FullCleanBeforeSaveMixin, models.Model):
     """
     Represents a book.
@@ -82,7 +120,6 @@ class Book(FullCleanBeforeSaveMixin, models.Model):
     genre = models.ManyToManyField(Genre, related_name='books')
     year_of_publication = models.IntegerField(
         validators=[MinValueValidator(get_minimal_book_year()), MaxValueValidator(get_maximal_book_year())],
-        db_index=True,
     )
     file = models.FileField(upload_to='book_files',
                             blank=True,
@@ -90,6 +127,17 @@ class Book(FullCleanBeforeSaveMixin, models.Model):
                                         validate_book_size])
     added_by = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True, blank=True,
                                  related_name='added_books')
+    # changes with the book itself and with its authors and genres
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        # the keyset pages of the library sorts are ranges of these indexes, the id breaks the ties
+        indexes = [
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['year_of_publication', 'id']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -121,3 +169,60 @@ class UserBookInstance(FullCleanBeforeSaveMixin, models.Model):
 
     class Meta:
         unique_together = ('user', 'book')
+
+
+class ReadingEvent(models.Model):
+    """
+    Append-only log of changes of users libraries.
+    """
+    class Action(models.IntegerChoices):
+        ADD = 1, 'Add'
+        REMOVE = 2, 'Remove'
+        READ = 3, 'Read'
+        UNREAD = 4, 'Unread'
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='reading_events')
+    # the history is kept when a book is deleted
+    book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True, related_name='reading_events')
+    action = models.PositiveSmallIntegerField(choices=Action.choices)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f'{self.get_action_display()} {self.book_id} by {self.user_id}'
+
+
+class BookNeighbor(models.Model):
+    """
+    A book read by the readers of another book, precomputed by the build_recommendations command.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        # the index of the book page lookup
+        unique_together = ('book', 'rank')
+
+
+class BookMinHash(models.Model):
+    """
+    MinHash signature of the authors, genres, decade and title words of a book.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='minhash')
+    signature = models.BinaryField()
+
+
+class BookLSHBand(models.Model):
+    """
+    Bucket of a band of a book MinHash signature, books sharing a bucket are candidates of similar books.
+    """
+    # the unique (book, band) index serves the lookups by book
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+', db_index=False)
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('book', 'band')
+        # covers the bucket lookups, the books are read from the index only
+        indexes = [models.Index(fields=['band', 'bucket', 'book'])]
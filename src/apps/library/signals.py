@@ -0,0 +1,220 @@
+from functools import partial
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.contrib.auth import get_user_model
+from django.dispatch import receiver, Signal
+from django.utils import timezone
+
+from .models import Author, Genre, Book, UserBookInstance, ReadingEvent
+from .utils.cache_utils import bump_user_library_version, bump_catalog_version, bump_recommendations_version, \
+    bump_similarity_version, bump_book_genres_version
+from .utils.search_utils import index_books, remove_books_from_search_index, create_search_index, \
+    rebuild_search_index, is_search_index_supported
+from .utils.similarity_utils import index_similar_books
+
+# sent by the bulk writes of book instances that bypass the model signals,
+# with user_id, book_ids of the changed instances and the ReadingEvent action
+book_instances_changed = Signal()
+
+# sent by the bulk import of books that bypasses the model signals, with book_ids
+books_imported = Signal()
+
+# sent after reading events are appended to the log, with the created events
+reading_events_logged = Signal()
+
+
+def create_search_index_after_migrate(using, **kwargs):
+    """
+    Create the search index after migrations and fill it with the existing books.
+    """
+    if not is_search_index_supported(using):
+        return
+    if Book._meta.db_table not in connections[using].introspection.table_names():
+        return
+    if create_search_index(using):
+        rebuild_search_index(using)
+
+
+def refresh_books(book_ids, using):
+    """
+    Refresh the search documents, the similar books index and the modification time of books
+    whose authors or genres changed.
+    """
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    Book.objects.using(using).filter(pk__in=book_ids).update(updated_at=timezone.now())
+    index_books(book_ids, using)
+    index_similar_books(book_ids, using)
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance: Book, using, **kwargs):
+    index_books([instance.pk], using)
+    index_similar_books([instance.pk], using)
+
+
+@receiver(post_delete, sender=Book)
+def remove_deleted_book(sender, instance: Book, using, **kwargs):
+    remove_books_from_search_index([instance.pk], using)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_book_relations(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """
+    Refresh the books whose authors or genres were changed, from either side of the relation.
+    """
+    if not reverse:
+        if action.startswith('post_'):
+            refresh_books([instance.pk], using)
+        return
+    match action:
+        case 'pre_clear':
+            instance._search_book_ids = list(instance.books.values_list('id', flat=True))
+        case 'post_clear':
+            refresh_books(getattr(instance, '_search_book_ids', []), using)
+        case 'post_add' | 'post_remove':
+            refresh_books(pk_set, using)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def index_renamed_relation(sender, instance, created, using, **kwargs):
+    """
+    Refresh the books of a changed author or genre.
+    """
+    if not created:
+        refresh_books(instance.books.values_list('id', flat=True), using)
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def collect_relation_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.books.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def index_deleted_relation(sender, instance, using, **kwargs):
+    refresh_books(getattr(instance, '_search_book_ids', []), using)
+
+
+# the versions are bumped once the changes are committed, a reader bumping into the new version
+# before the commit would cache the old rows under it
+
+
+@receiver(post_save, sender=UserBookInstance)
+@receiver(post_delete, sender=UserBookInstance)
+def invalidate_user_library(sender, instance: UserBookInstance, using, **kwargs):
+    transaction.on_commit(partial(bump_user_library_version, instance.user_id), using=using)
+
+
+@receiver(book_instances_changed)
+def invalidate_changed_user_library(sender, user_id, using=DEFAULT_DB_ALIAS, **kwargs):
+    transaction.on_commit(partial(bump_user_library_version, user_id), using=using)
+    transaction.on_commit(bump_catalog_version, using=using)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=UserBookInstance)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=UserBookInstance)
+def invalidate_catalog(sender, using, **kwargs):
+    transaction.on_commit(bump_catalog_version, using=using)
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_recommendations(sender, using, **kwargs):
+    # the neighbors of the deleted book are deleted from the pages of other books
+    transaction.on_commit(bump_recommendations_version, using=using)
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_similar_books(sender, using, **kwargs):
+    # the similar books of the other books are cached with the deleted one
+    transaction.on_commit(bump_similarity_version, using=using)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_catalog_relations(sender, action, using, **kwargs):
+    if action.startswith('post_'):
+        transaction.on_commit(bump_catalog_version, using=using)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Genre)
+def invalidate_book_genres(sender, using, **kwargs):
+    transaction.on_commit(bump_book_genres_version, using=using)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_book_genres_relations(sender, action, using, **kwargs):
+    if action.startswith('post_'):
+        transaction.on_commit(bump_book_genres_version, using=using)
+
+
+def log_reading_events(user_id, book_ids, action) -> None:
+    """
+    Append the events of the user's books to the reading log with one INSERT.
+    """
+    now = timezone.now()
+    events = ReadingEvent.objects.bulk_create([
+        ReadingEvent(user_id=user_id, book_id=book_id, action=action, created_at=now) for book_id in book_ids
+    ])
+    reading_events_logged.send(sender=ReadingEvent, events=events)
+
+
+@receiver(book_instances_changed)
+def log_changed_instances(sender, user_id, book_ids, action, **kwargs):
+    log_reading_events(user_id, book_ids, action)
+
+
+@receiver(pre_save, sender=UserBookInstance)
+def collect_stored_instance(sender, instance: UserBookInstance, using, **kwargs):
+    """
+    Load the stored book and read status of a changed instance with one query,
+    for the reading log and the statistics rollups.
+    """
+    instance._stored_values = None
+    if not instance._state.adding:
+        instance._stored_values = UserBookInstance.objects.using(using).filter(pk=instance.pk).values_list(
+            'book_id', 'is_read').first()
+
+
+def get_stored_instance_values(instance: UserBookInstance) -> tuple[int, bool] | None:
+    """
+    Return the (book_id, is_read) of the instance before its save, None when it was created.
+    """
+    return getattr(instance, '_stored_values', None)
+
+
+@receiver(post_save, sender=UserBookInstance)
+def log_saved_instance(sender, instance: UserBookInstance, created, raw, **kwargs):
+    if raw:
+        return
+    stored_values = get_stored_instance_values(instance)
+    old_is_read = stored_values[1] if stored_values is not None else None
+    if created:
+        log_reading_events(instance.user_id, [instance.book_id], ReadingEvent.Action.ADD)
+    if created and instance.is_read or old_is_read is not None and old_is_read != instance.is_read:
+        action = ReadingEvent.Action.READ if instance.is_read else ReadingEvent.Action.UNREAD
+        log_reading_events(instance.user_id, [instance.book_id], action)
+
+
+@receiver(post_delete, sender=UserBookInstance)
+def log_deleted_instance(sender, instance: UserBookInstance, origin=None, **kwargs):
+    # instances deleted with their book or user are not logged, the events could not reference them
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model in (Book, get_user_model()):
+        return
+    log_reading_events(instance.user_id, [instance.book_id], ReadingEvent.Action.REMOVE)
@@ -0,0 +1,116 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.test import TransactionTestCase, SimpleTestCase
+
+from apps.library.models import Book, UserBookInstance, ReadingEvent
+from apps.library.utils.benchmark_utils import summarize, compare_results, Sample, ENDPOINTS
+from utils.tests.utils import create_book_in_db
+
+
+class SummaryTestCase(SimpleTestCase):
+
+    def test_summarize(self):
+        samples = [Sample('book', seconds / 1000, 3, 200) for seconds in range(1, 101)]
+        samples.append(Sample('book', 0.5, 7, 500))
+        summary = summarize(samples, seconds=2)
+        self.assertEqual(summary['requests'], 101)
+        self.assertEqual(summary['errors'], 1)
+        self.assertAlmostEqual(summary['throughput'], 50.5)
+        self.assertAlmostEqual(summary['p50_ms'], 51)
+        self.assertAlmostEqual(summary['p99_ms'], 100, delta=1)
+        self.assertEqual(summary['max_queries'], 7)
+
+    def test_compare_results(self):
+        meta = {'dataset': {'seed': 0, 'books': 10, 'book_instances': 5}}
+        previous = {'meta': meta, 'endpoints': {'book': {'p95_ms': 10.0, 'mean_queries': 4.0},
+                                                'library': {'p95_ms': 10.0, 'mean_queries': 4.0}}}
+        current = {'meta': meta, 'endpoints': {'book': {'p95_ms': 11.0, 'mean_queries': 4.0},
+                                 'library': {'p95_ms': 20.0, 'mean_queries': 6.0},
+                                 'statistic:statistic': {'p95_ms': 30.0, 'mean_queries': 2.0}}}
+        self.assertEqual(compare_results(previous, current), [
+            ('library', 'p95_ms', 10.0, 20.0),
+            ('library', 'mean_queries', 4.0, 6.0),
+        ])
+
+        # runs on other datasets are not compared
+        for dataset in [None, {**meta['dataset'], 'book_instances': 6}, {**meta['dataset'], 'seed': 1}]:
+            with self.subTest(dataset=dataset), self.assertRaises(ValueError):
+                compare_results({**previous, 'meta': {'dataset': dataset}}, current)
+
+
+class BenchmarkEndpointsTestCase(TransactionTestCase):
+    # the simulated users send requests from other threads, so the data has to be committed
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='Benchmark Book', year_of_publication=1990)
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = Path(self.directory.name) / 'results.json'
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+        self.directory.cleanup()
+
+    def test_benchmark_endpoints(self):
+        instances = set(UserBookInstance.objects.values_list('user_id', 'book_id', 'is_read'))
+        events = ReadingEvent.objects.count()
+        out = StringIO()
+        call_command('benchmark_endpoints', '--users', 2, '--concurrency', 2, '--requests', 60, '--warmup', 0,
+                     '--output', self.output, stdout=out)
+        self.assertIn('total', out.getvalue())
+        results = json.loads(self.output.read_text())
+        self.assertEqual(results['meta']['users'], 1)
+        self.assertEqual(results['meta']['dataset']['seed'], 0)
+        self.assertEqual(results['meta']['dataset']['books'], Book.objects.count())
+        self.assertEqual(results['total']['requests'], 60)
+        self.assertEqual(results['total']['errors'], 0, {k: v['errors'] for k, v in results['endpoints'].items()})
+        self.assertTrue(set(results['endpoints']) & {'book', 'library'})
+        for summary in results['endpoints'].values():
+            self.assertGreater(summary['mean_queries'], 0)
+            self.assertLessEqual(summary['p50_ms'], summary['p95_ms'])
+            self.assertLessEqual(summary['p95_ms'], summary['p99_ms'])
+
+        # every endpoint of the url map is reachable
+        call_command('benchmark_endpoints', '--users', 1, '--requests', 3, '--warmup', 0,
+                     '--endpoints', *ENDPOINTS, '--output', self.output, stdout=StringIO())
+        self.assertEqual(json.loads(self.output.read_text())['total']['errors'], 0)
+
+        # the writes of the simulated users are rolled back
+        self.assertEqual(instances, set(UserBookInstance.objects.values_list('user_id', 'book_id', 'is_read')))
+        self.assertEqual(events, ReadingEvent.objects.count())
+
+    def test_compare_with_previous_run(self):
+        call_command('benchmark_endpoints', '--users', 1, '--requests', 5, '--endpoints', 'book',
+                     '--output', self.output, stdout=StringIO())
+        results = json.loads(self.output.read_text())
+        slower = Path(self.directory.name) / 'slower.json'
+        results['endpoints']['book']['p95_ms'] *= 100
+        slower.write_text(json.dumps(results))
+        out = StringIO()
+        call_command('benchmark_endpoints', '--users', 1, '--requests', 5, '--endpoints', 'book',
+                     '--compare', slower, stdout=out)
+        self.assertIn('No regressions', out.getvalue())
+
+        results['endpoints']['book']['p95_ms'] = 0
+        results['endpoints']['book']['mean_queries'] = 0
+        faster = Path(self.directory.name) / 'faster.json'
+        faster.write_text(json.dumps(results))
+        with self.assertRaises(CommandError):
+            call_command('benchmark_endpoints', '--users', 1, '--requests', 5, '--endpoints', 'book',
+                         '--compare', faster, stdout=StringIO(), stderr=StringIO())
+
+        results['meta']['dataset']['books'] += 1
+        other = Path(self.directory.name) / 'other.json'
+        other.write_text(json.dumps(results))
+        with self.assertRaisesMessage(CommandError, 'different datasets'):
+            call_command('benchmark_endpoints', '--users', 1, '--requests', 5, '--endpoints', 'book',
+                         '--compare', other, stdout=StringIO(), stderr=StringIO())
@@ -0,0 +1,96 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.checks import run_checks
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from apps.library.models import Book, Author, UserBookInstance
+from apps.library.utils.cache_utils import get_catalog_version, get_user_library_version, cache_by_catalog
+from apps.library.utils.views_utils import add_books_to_user_library
+from utils.tests.utils import create_book_in_db
+
+
+@cache_by_catalog()
+def get_book_titles():
+    return sorted(Book.objects.values_list('title', flat=True))
+
+
+class CatalogCacheTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='New Book')
+        self.book = Book.objects.get(title='New Book')
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def test_catalog_version_changes(self):
+        changes = [
+            self.book.save,
+            lambda: self.book.authors.add(Author.objects.create(first_name='New', last_name='Author')),
+            lambda: UserBookInstance.objects.create(user_id=1, book=self.book),
+        ]
+        for change in changes:
+            version = get_catalog_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+                # readers of the uncommitted change keep the old version, they would cache the old rows
+                # under the new one
+                self.assertEqual(get_catalog_version(), version)
+            self.assertNotEqual(get_catalog_version(), version)
+
+    def test_user_library_version_changes_on_commit(self):
+        version = get_user_library_version(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            add_books_to_user_library([self.book.pk], get_user_model().objects.get(id=1))
+            self.assertEqual(get_user_library_version(1), version)
+        self.assertNotEqual(get_user_library_version(1), version)
+
+    def test_cached_queryset(self):
+        queryset = Book.objects.prefetch_related('authors').order_by('id').cache_by_catalog()
+        self.assertEqual(len(list(queryset.all())), 2)
+        authors = list(self.book.authors.all())
+        with self.assertNumQueries(0):
+            books = list(queryset.all())
+            self.assertEqual(list(books[-1].authors.all()), authors)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(list(queryset.filter(pk=self.book.pk)), [self.book])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_book_in_db(title='Another Book')
+        self.assertEqual(len(list(queryset.all())), 3)
+
+    def test_cached_function(self):
+        self.assertEqual(get_book_titles(), ['Book Title 1', 'New Book'])
+        with self.assertNumQueries(0):
+            get_book_titles()
+        self.book.title = 'Renamed Book'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        self.assertEqual(get_book_titles(), ['Book Title 1', 'Renamed Book'])
+
+    def test_book_page_is_cached(self):
+        url = reverse('library:book', kwargs={'slug': self.book.slug})
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, self.book.title)
+
+
+class SharedCacheCheckTestCase(SimpleTestCase):
+
+    def test_local_memory_cache_is_rejected_on_deploy(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([error.id for error in run_checks(include_deployment_checks=True)
+                              if error.id.startswith('library.')], ['library.E001'])
+            # the development server may keep it
+            self.assertFalse([error for error in run_checks() if error.id.startswith('library.')])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertFalse([error for error in run_checks(include_deployment_checks=True)
+                              if error.id.startswith('library.')])
@@ -0,0 +1,100 @@
+from io import StringIO
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db.models import Count
+from django.test import TestCase, SimpleTestCase
+
+from apps.library.models import Country, Author, Genre, Book, UserBookInstance, ReadingEvent, BookMinHash
+from apps.library.utils.dataset_utils import get_rng, get_zipf_cdf, sample_zipf, get_years
+from apps.statistic.models import BookStat
+
+DATASET_ARGS = ['--books', 300, '--authors', 40, '--genres', 10, '--countries', 5, '--users', 30,
+                '--books-per-user', 8, '--seed', 7, '--until', '2026-01-01']
+
+
+def get_dataset_snapshot() -> dict:
+    return {
+        'books': list(Book.objects.order_by('id').values_list('id', 'title', 'slug', 'year_of_publication')),
+        'authors': list(Book.authors.through.objects.order_by('book_id', 'author_id').values_list(
+            'book_id', 'author__full_name')),
+        'genres': list(Book.genre.through.objects.order_by('book_id', 'genre_id').values_list(
+            'book_id', 'genre__name')),
+        'instances': list(UserBookInstance.objects.order_by('user_id', 'book_id').values_list(
+            'user__username', 'book_id', 'is_read')),
+        'events': sorted(ReadingEvent.objects.values_list('user_id', 'book_id', 'action', 'created_at')),
+    }
+
+
+class DistributionsTestCase(SimpleTestCase):
+
+    def test_zipf_popularity(self):
+        rng = get_rng(0, 1)
+        cdf = get_zipf_cdf(100, 1.1)
+        popularity = rng.permutation(100)
+        counts = np.bincount(sample_zipf(rng, cdf, popularity, 100_000), minlength=100)
+        # the most popular item is picked about twice as often as the second one
+        self.assertEqual(counts.argmax(), popularity[0])
+        self.assertAlmostEqual(counts[popularity[0]] / counts[popularity[1]], 2 ** 1.1, delta=0.2)
+        self.assertGreater(counts[popularity[:10]].sum(), counts.sum() / 2)
+
+    def test_years(self):
+        years = get_years(get_rng(0), 10_000, 2026)
+        self.assertLessEqual(years.max(), 2026)
+        self.assertGreater(np.median(years), 1990)
+        self.assertLess(years.min(), 1000)
+
+
+class GenerateDatasetTestCase(TestCase):
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_generate_dataset(self):
+        out = StringIO()
+        call_command('generate_dataset', *DATASET_ARGS, stdout=out, stderr=StringIO())
+        self.assertIn('Generated 300 books', out.getvalue())
+        self.assertEqual((Country.objects.count(), Genre.objects.count(), Author.objects.count()), (5, 10, 40))
+        self.assertEqual(get_user_model().objects.count(), 30)
+        self.assertFalse(Book.objects.filter(authors__isnull=True).exists())
+        self.assertFalse(Book.objects.filter(genre__isnull=True).exists())
+        instances = UserBookInstance.objects.count()
+        self.assertGreater(instances, 0)
+        self.assertEqual(ReadingEvent.objects.filter(action=ReadingEvent.Action.ADD).count(), instances)
+        self.assertEqual(ReadingEvent.objects.filter(action=ReadingEvent.Action.READ).count(),
+                         UserBookInstance.objects.filter(is_read=True).count())
+        self.assertTrue(get_user_model().objects.get(username='reader1').check_password('password'))
+
+        # the popularity is skewed: the most popular author has many more books than the median one
+        author_books = sorted(Author.objects.annotate(count=Count('books')).values_list('count', flat=True))
+        self.assertGreater(author_books[-1], 3 * author_books[len(author_books) // 2])
+
+        # the indexes and the statistics are rebuilt
+        self.assertEqual(BookMinHash.objects.count(), 300)
+        self.assertEqual(sum(BookStat.objects.values_list('add_count', flat=True)), instances)
+
+        # the ids continue after the generated rows
+        book = Book.objects.create(title='Created Book', year_of_publication=2000)
+        self.assertEqual(book.pk, 301)
+
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', *DATASET_ARGS, stdout=StringIO())
+
+    def test_dataset_is_repeatable(self):
+        call_command('generate_dataset', *DATASET_ARGS, '--skip-indexes', stdout=StringIO())
+        snapshot = get_dataset_snapshot()
+        self.assertFalse(BookMinHash.objects.exists())
+
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        Country.objects.all().delete()
+        Genre.objects.all().delete()
+        get_user_model().objects.all().delete()
+        call_command('generate_dataset', *DATASET_ARGS, '--skip-indexes', stdout=StringIO())
+        self.assertEqual(get_dataset_snapshot(), snapshot)
+
+        Book.objects.all().delete()
+        call_command('generate_dataset', *DATASET_ARGS[:-4], '--seed', 8, '--skip-indexes', stdout=StringIO())
+        self.assertNotEqual(get_dataset_snapshot()['books'], snapshot['books'])
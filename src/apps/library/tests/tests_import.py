@@ -0,0 +1,118 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.library.models import Book, Author, Genre, Country
+from apps.library.utils.cache_utils import get_catalog_version, bump_catalog_version
+from apps.library.utils.import_utils import allocate_unique_slugs
+from apps.library.utils.search_utils import is_search_index_supported, search_rank, build_match_expression
+
+CSV_DATA = '''title,year_of_publication,description,authors,genres,country
+Book Title 1,1999,Same title as in fixture,Author First Name 1 Author Last Name 1,Genre Name 1,
+Imported Book,2001,,Ann Smith;Bob Brown,Genre Name 2;Poetry,Country Name 1
+Imported Book,2002,,Ann Smith,Poetry,
+Broken Year,year,,Ann Smith,Poetry,
+No Authors,2000,,,Poetry,
+'''
+
+
+class ImportBooksTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        cache.clear()
+
+    def write(self, name, content) -> str:
+        path = Path(self.directory.name) / name
+        path.write_text(content)
+        return str(path)
+
+    def test_import_csv(self):
+        stdout, stderr = StringIO(), StringIO()
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            call_command('import_books', self.write('books.csv', CSV_DATA), '--batch-size', '2',
+                         stdout=stdout, stderr=stderr)
+        # the catalog version is bumped on the commit of every batch with imported books
+        self.assertEqual(callbacks.count(bump_catalog_version), 2)
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertIn('Imported 3 books.', stdout.getvalue())
+        self.assertIn('Line 5:', stderr.getvalue())
+        self.assertIn('Line 6:', stderr.getvalue())
+
+        self.assertEqual(
+            sorted(Book.objects.values_list('slug', flat=True)),
+            ['book-title-1', 'book-title-1-2', 'imported-book', 'imported-book-2'],
+        )
+        self.assertEqual(Author.objects.filter(full_name='Ann Smith').count(), 1)
+        self.assertEqual(Author.objects.get(full_name='Bob Brown').country, Country.objects.get(name='Country Name 1'))
+        self.assertEqual(Genre.objects.filter(name='Poetry').count(), 1)
+
+        book = Book.objects.get(slug='imported-book')
+        self.assertEqual(book.year_of_publication, 2001)
+        self.assertEqual(sorted(book.authors.values_list('full_name', flat=True)), ['Ann Smith', 'Bob Brown'])
+        self.assertEqual(sorted(book.genre.values_list('name', flat=True)), ['Genre Name 2', 'Poetry'])
+        self.assertEqual(Book.objects.get(slug='book-title-1-2').authors.get().pk, 1)
+
+        if is_search_index_supported():
+            expression = build_match_expression('ann smith')
+            self.assertEqual(
+                Book.objects.annotate(rank=search_rank(expression)).filter(rank__lt=0).count(), 2)
+
+    def test_import_jsonl(self):
+        rows = [
+            {'title': 'Json Book', 'year_of_publication': 1990,
+             'authors': [{'first_name': 'Leo', 'last_name': 'Tolstoy', 'country': 'Russia'}],
+             'genres': ['Novel']},
+            {'title': 'Json Book', 'year_of_publication': 1991, 'authors': ['Leo Tolstoy'], 'genres': 'Novel'},
+        ]
+        path = self.write('books.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        call_command('import_books', path, stdout=StringIO())
+        self.assertEqual(sorted(Book.objects.filter(title='Json Book').values_list('slug', flat=True)),
+                         ['json-book', 'json-book-2'])
+        self.assertEqual(Author.objects.get(full_name='Leo Tolstoy').country.name, 'Russia')
+
+    def test_import_invalid_jsonl(self):
+        row = {'title': 'Json Book', 'year_of_publication': 1990, 'authors': 'Leo Tolstoy', 'genres': 'Novel'}
+        lines = ['{"title": "Broken', '[]', json.dumps({**row, 'title': 5}), json.dumps(row)]
+        stderr = StringIO()
+        call_command('import_books', self.write('books.jsonl', '\n'.join(lines)), stdout=StringIO(), stderr=stderr)
+        self.assertIn('Line 1: Invalid JSON', stderr.getvalue())
+        self.assertIn('Line 2: Line should be a JSON object', stderr.getvalue())
+        self.assertIn('Line 3: Invalid value types', stderr.getvalue())
+        self.assertTrue(Book.objects.filter(title='Json Book').exists())
+
+    def test_import_invalid_related_fields(self):
+        row = {'title': 'Json Book', 'year_of_publication': 1990, 'authors': 'Leo Tolstoy', 'genres': 'Novel'}
+        rows = [
+            {**row, 'authors': 'Homer'},
+            {**row, 'authors': [{'first_name': 'Leo', 'last_name': 'T' * 151}]},
+            {**row, 'country': 'C' * 201},
+            {**row, 'genres': 'G' * 41},
+            row,
+        ]
+        stderr = StringIO()
+        call_command('import_books', self.write('books.jsonl', '\n'.join(json.dumps(row) for row in rows)),
+                     stdout=StringIO(), stderr=stderr)
+        self.assertIn('Line 1: Author "Homer": first_name:', stderr.getvalue())
+        self.assertIn('Line 2: Author "Leo TTT', stderr.getvalue())
+        self.assertIn('last_name:', stderr.getvalue())
+        self.assertIn('Line 3: Country "CCC', stderr.getvalue())
+        self.assertIn('Line 4: Genre "GGG', stderr.getvalue())
+        self.assertEqual(Book.objects.filter(title='Json Book').count(), 1)
+        self.assertFalse(Author.objects.filter(full_name='Homer').exists())
+
+    def test_allocate_unique_slugs(self):
+        self.assertEqual(
+            allocate_unique_slugs(Book, ['book-title-1', 'new', 'new', 'new-2', 'x' * 60]),
+            ['book-title-1-2', 'new', 'new-3', 'new-2', 'x' * 50],
+        )
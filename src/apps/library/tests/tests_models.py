@@ -2,7 +2,10 @@ import os
 
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.utils.connection import ConnectionDoesNotExist
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
 
 from apps.library.models import Country, Author, Genre, Book, UserBookInstance
@@ -127,3 +130,53 @@ class ModelTestCase(TestCase):
         with self.assertRaises(ValidationError):
             UserBookInstance.objects.create(user_id=1, book_id=1, is_read=True)
             UserBookInstance.objects.create(user_id=1, book_id=1, is_read=False)
+
+    def test_save_update_fields_validates_only_updated_fields(self):
+        instance = UserBookInstance.objects.get(user_id=1, book_id=1)
+        instance.is_read = True
+        # only the updated field is checked, no unique query for (user, book)
+        with CaptureQueriesContext(connection) as context:
+            instance.save(update_fields=['is_read'])
+        self.assertFalse([query for query in context.captured_queries
+                          if query['sql'].startswith('SELECT 1 AS "a" FROM "library_userbookinstance"')])
+        self.assertTrue(UserBookInstance.objects.get(pk=instance.pk).is_read)
+
+        book = Book.objects.get(title='Book Title 1')
+        book.year_of_publication = -1001
+        with self.assertRaises(ValidationError):
+            book.save(update_fields=['year_of_publication'])
+
+    def test_save_update_fields_by_attname(self):
+        create_book_in_db(title='New Book')
+        instance = UserBookInstance.objects.get(user_id=1, book_id=1)
+        instance.book_id = Book.objects.get(title='New Book').pk
+        instance.save(update_fields=['book_id'])
+        self.assertEqual(UserBookInstance.objects.get(pk=instance.pk).book.title, 'New Book')
+
+        instance.book_id = 0
+        with self.assertRaises(ValidationError):
+            instance.save(update_fields=['book_id'])
+
+    def test_bulk_full_clean(self):
+        books = [
+            Book(title='Bulk Book', slug='bulk-book', year_of_publication=2000),
+            Book(title='Bulk Book', slug='bulk-book', year_of_publication=2000),
+            Book(title='Book Title 1', slug='book-title-1', year_of_publication=2000),
+            Book(title='Invalid Year', slug='invalid-year', year_of_publication=-1001),
+        ]
+        with self.assertNumQueries(1):
+            errors = Book.bulk_full_clean(books, exclude=['image', 'file', 'authors', 'genre', 'added_by'])
+        self.assertEqual(set(errors), {1, 2, 3})
+        self.assertIn('slug', errors[1].message_dict)
+        self.assertIn('slug', errors[2].message_dict)
+        self.assertIn('year_of_publication', errors[3].message_dict)
+        # the stored rows are looked up in the given database
+        with self.assertRaises(ConnectionDoesNotExist):
+            Book.bulk_full_clean(books, exclude=['image', 'file', 'authors', 'genre', 'added_by'], using='missing')
+
+        create_book_in_db(title='New Book')
+        book = Book.objects.get(title='New Book')
+        instances = [UserBookInstance(user_id=1, book_id=1), UserBookInstance(user_id=1, book=book)]
+        errors = UserBookInstance.bulk_full_clean(instances)
+        self.assertEqual(set(errors), {0})
+        self.assertIn('__all__', errors[0].message_dict)
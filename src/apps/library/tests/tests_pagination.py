@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.library.models import Book, UserBookInstance
+from apps.library.views import LibraryView, UserLibraryView
+from utils.tests.utils import create_book_in_db
+
+
+@mock.patch.object(LibraryView, 'page_size', 2)
+class KeysetPaginationTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='B New Book', year_of_publication=1990)
+        create_book_in_db(title='A New Book', year_of_publication=1990)
+        create_book_in_db(title='C New Book', year_of_publication=1800)
+        create_book_in_db(title='D New Book', year_of_publication=2000)
+        self.user = get_user_model().objects.get(id=1)
+        UserBookInstance.objects.create(user=self.user, book=Book.objects.get(title='C New Book'), is_read=True)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def walk_pages(self, url_name, params, context_object_name='books', page_template='library/book_list_page.html'):
+        """
+        Follow the next cursors and collect the ids of all loaded objects.
+        """
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        ids = [obj.id for obj in response.context_data[context_object_name]]
+        while response.context_data['next_cursor']:
+            response = self.client.get(reverse(url_name), {**params, 'cursor': response.context_data['next_cursor']})
+            self.assertEqual(response.status_code, 200)
+            self.assertTemplateUsed(response, page_template)
+            ids += [obj.id for obj in response.context_data[context_object_name]]
+        return ids
+
+    def test_pages_follow_sort_order(self):
+        self.client.force_login(self.user)
+        orderings = {
+            'latest': Book.objects.order_by('-id'),
+            'title': Book.objects.order_by('title', 'id'),
+            'year_of_publication': Book.objects.order_by('year_of_publication', 'id'),
+            'read': Book.objects.order_by('-instances__is_read', 'id'),
+        }
+        for sort_by, queryset in orderings.items():
+            for url_name in ('library:library', 'library:library_search'):
+                with self.subTest(sort_by=sort_by, url_name=url_name):
+                    ids = self.walk_pages(url_name, {'q': '', 'sorted': sort_by})
+                    self.assertEqual(ids, list(queryset.values_list('id', flat=True)))
+
+    def test_pages_with_search(self):
+        ids = self.walk_pages('library:library_search', {'q': 'new book', 'sorted': 'year_of_publication'})
+        queryset = Book.objects.filter(title__icontains='new book').order_by('year_of_publication', 'id')
+        self.assertEqual(ids, list(queryset.values_list('id', flat=True)))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_page_cost_is_constant(self):
+        response = self.client.get(reverse('library:library_search'), {'sorted': 'title'})
+        cursor = response.context_data['next_cursor']
+        with self.assertNumQueries(3):
+            self.client.get(reverse('library:library_search'), {'sorted': 'title', 'cursor': cursor})
+
+    def test_pages_are_index_range_scans(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('The plans are checked on sqlite')
+        for sort_by in ['latest', 'title', 'year_of_publication']:
+            response = self.client.get(reverse('library:library_search'), {'sorted': sort_by})
+            params = {'sorted': sort_by, 'cursor': response.context_data['next_cursor']}
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('library:library_search'), params)
+            page_sql = next(query['sql'] for query in queries
+                            if query['sql'].startswith('SELECT') and 'FROM "library_book"' in query['sql'])
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {page_sql}')
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            with self.subTest(sort_by=sort_by, plan=plan, sql=page_sql):
+                # the page starts at the cursor in the index, the rows come out sorted
+                self.assertIn('SEARCH library_book USING', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    @mock.patch.object(UserLibraryView, 'page_size', 2)
+    def test_user_library_pages(self):
+        for book in Book.objects.filter(title__endswith='New Book').exclude(title='C New Book'):
+            UserBookInstance.objects.create(user=self.user, book=book, is_read=book.title == 'A New Book')
+        self.client.force_login(self.user)
+        instances = UserBookInstance.objects.filter(user=self.user).order_by('-id')
+        filters = {
+            'all': instances,
+            'read': instances.filter(is_read=True),
+            'unread': instances.filter(is_read=False),
+        }
+        for book_filter, queryset in filters.items():
+            for url_name in ('library:user_books', 'library:user_books_filter'):
+                with self.subTest(book_filter=book_filter, url_name=url_name):
+                    ids = self.walk_pages(url_name, {'filter': book_filter},
+                                          'user_books', 'library/user_book_list_page.html')
+                    self.assertEqual(ids, list(queryset.values_list('id', flat=True)))
+
+        response = self.client.get(reverse('library:user_books'))
+        self.assertEqual(response.context_data['library_counts'], {'total': 5, 'read': 2, 'unread': 3})
+        self.assertContains(response, 'Unread (3)')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('library:library_search'), {'cursor': 'wrong'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('library:library_search'), {'sorted': 'title'})
+        cursor = response.context_data['next_cursor']
+        response = self.client.get(reverse('library:library_search'), {'sorted': 'latest', 'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
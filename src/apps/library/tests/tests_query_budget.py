@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.library import urls
+from apps.library.models import Book, Author, Genre, UserBookInstance
+from utils.tests.utils import create_book_in_db, get_mock_file, QueryBudgetMixin
+
+# (url name, method): the most queries the view may run, whatever the number of books in the catalog
+# and the user library, the session and the user loading included
+QUERY_BUDGETS = {
+    ('library:index', 'GET'): 0,
+    ('library:book', 'GET'): 7,
+    ('library:similar_books', 'GET'): 4,
+    ('library:library', 'GET'): 6,
+    ('library:library_search', 'GET'): 6,
+    ('library:add_book', 'GET'): 4,
+    # the search, similarity and statistics indexes are updated for the book and each of its relations
+    ('library:add_book', 'POST'): 65,
+    ('library:user_books', 'GET'): 4,
+    ('library:user_books_filter', 'GET'): 4,
+    ('library:add_book_to_user_library', 'POST'): 18,
+    ('library:remove_book_from_user_library', 'POST'): 17,
+    ('library:change_book_read_status', 'POST'): 15,
+    ('library:add_books_to_user_library', 'POST'): 17,
+    ('library:remove_books_from_user_library', 'POST'): 17,
+    ('library:change_books_read_status', 'POST'): 18,
+}
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        self.user = get_user_model().objects.get(id=1)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def grow_catalog(self, size: int):
+        """
+        Add books to the catalog up to the size, every other one to the user library.
+        """
+        for i in range(Book.objects.count(), size):
+            create_book_in_db(title=f'Budget Book {i}', year_of_publication=1900 + i)
+            if i % 2 == 0:
+                UserBookInstance.objects.create(user=self.user, book=Book.objects.latest('id'), is_read=i % 4 == 0)
+
+    def get_library_book_ids(self) -> list[int]:
+        return list(UserBookInstance.objects.filter(user=self.user).values_list('book_id', flat=True))
+
+    def get_other_book_ids(self) -> list[int]:
+        return list(Book.objects.exclude(id__in=self.get_library_book_ids()).values_list('id', flat=True))
+
+    def assertGetBudget(self, name: str, params: dict | None = None):
+        self.assertViewBudget(QUERY_BUDGETS[name, 'GET'], name, lambda: lambda: self.client.get(reverse(name), params))
+
+    def assertPostBudget(self, name: str, get_kwargs=lambda: {}, get_data=lambda: {}):
+        def request():
+            url, data = reverse(name, kwargs=get_kwargs()), get_data()
+            return lambda: self.client.post(url, data)
+        self.assertViewBudget(QUERY_BUDGETS[name, 'POST'], name, request)
+
+    def test_budgets_cover_all_views(self):
+        self.assertEqual({name for name, _ in QUERY_BUDGETS},
+                         {f'{urls.app_name}:{pattern.name}' for pattern in urls.urlpatterns})
+
+    def test_index(self):
+        self.assertGetBudget('library:index')
+
+    def test_book(self):
+        def request():
+            url = reverse('library:book', kwargs={'slug': Book.objects.latest('id').slug})
+            return lambda: self.client.get(url)
+        self.assertViewBudget(QUERY_BUDGETS['library:book', 'GET'], 'library:book', request)
+
+    def test_similar_books(self):
+        def request():
+            url = reverse('library:similar_books', kwargs={'id': Book.objects.earliest('id').id})
+            return lambda: self.client.get(url, {'limit': 50})
+        self.assertViewBudget(QUERY_BUDGETS['library:similar_books', 'GET'], 'library:similar_books', request)
+
+    def test_library(self):
+        self.assertGetBudget('library:library')
+        for sort in ['latest', 'title', 'year_of_publication', 'relevance', 'read']:
+            self.assertGetBudget('library:library_search', {'q': 'book', 'sorted': sort})
+
+    def test_add_book(self):
+        self.assertGetBudget('library:add_book')
+        self.assertPostBudget('library:add_book', get_data=lambda: {
+            'title': f'Added Book {Book.objects.count()}',
+            'year_of_publication': 2000,
+            'authors': list(Author.objects.values_list('id', flat=True)),
+            'genre': list(Genre.objects.values_list('id', flat=True)),
+            'file': get_mock_file('added_book_file.txt', 1),
+        })
+
+    def test_user_books(self):
+        for book_filter in ['', 'read', 'unread']:
+            params = {'filter': book_filter} if book_filter else {}
+            self.assertGetBudget('library:user_books', params)
+            self.assertGetBudget('library:user_books_filter', params)
+
+    def test_change_user_library(self):
+        self.assertPostBudget('library:add_book_to_user_library',
+                              get_kwargs=lambda: {'id': self.get_other_book_ids()[0]})
+        self.assertPostBudget('library:remove_book_from_user_library',
+                              get_kwargs=lambda: {'id': self.get_library_book_ids()[0]})
+        self.assertPostBudget('library:change_book_read_status',
+                              get_kwargs=lambda: {'id': self.get_library_book_ids()[0]})
+
+    def test_add_books_to_user_library(self):
+        self.assertPostBudget('library:add_books_to_user_library',
+                              get_data=lambda: {'book_id': self.get_other_book_ids()})
+
+    def test_remove_books_from_user_library(self):
+        self.assertPostBudget('library:remove_books_from_user_library',
+                              get_data=lambda: {'book_id': self.get_library_book_ids()})
+
+    def test_change_books_read_status(self):
+        self.assertPostBudget('library:change_books_read_status',
+                              get_data=lambda: {'book_id': self.get_library_book_ids(), 'is_read': 'true'})
@@ -0,0 +1,107 @@
+import itertools
+import math
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+
+from apps.library.models import Book, BookNeighbor
+from apps.library.utils import recommendation_utils
+from apps.library.utils.recommendation_utils import compute_book_neighbors, get_book_neighbors
+from apps.library.utils.views_utils import add_books_to_user_library
+from utils.tests.utils import create_book_in_db
+
+
+def get_neighbors_brute_force(user_ids, book_ids, top, min_common) -> list[tuple]:
+    libraries = {}
+    for user_id, book_id in zip(user_ids.tolist(), book_ids.tolist()):
+        libraries.setdefault(user_id, set()).add(book_id)
+    libraries = [books for books in libraries.values() if len(books) > 1]
+    readers = Counter(book_id for books in libraries for book_id in books)
+    common = Counter(pair for books in libraries for pair in itertools.permutations(books, 2))
+    rows = []
+    for book_id in sorted(readers):
+        scores = sorted(((-count / math.sqrt(readers[book_id] * readers[other]), other)
+                         for (book, other), count in common.items() if book == book_id and count >= min_common))
+        rows += [(book_id, other, rank, -score) for rank, (score, other) in enumerate(scores[:top])]
+    return rows
+
+
+class ComputeNeighborsTestCase(SimpleTestCase):
+
+    def test_compute_book_neighbors(self):
+        rng = np.random.default_rng(0)
+        entries = np.unique(np.column_stack((rng.integers(0, 40, 400), rng.integers(0, 30, 400) * 7)), axis=0)
+        user_ids, book_ids = entries[:, 0], entries[:, 1]
+        for top, min_common in ((3, 1), (10, 2)):
+            with self.subTest(top=top, min_common=min_common):
+                rows = compute_book_neighbors(user_ids, book_ids, top, min_common)
+                expected = get_neighbors_brute_force(user_ids, book_ids, top, min_common)
+                self.assertEqual([row[:3] for row in rows.tolist()], [row[:3] for row in expected])
+                np.testing.assert_allclose(rows.score, [row[3] for row in expected])
+
+        # the pairs are expanded in chunks
+        with mock.patch.object(recommendation_utils, 'PAIR_CHUNK_SIZE', 50):
+            chunked = compute_book_neighbors(user_ids, book_ids, 3, 1)
+        self.assertEqual(chunked.tolist(), compute_book_neighbors(user_ids, book_ids, 3, 1).tolist())
+        self.assertEqual(len(compute_book_neighbors(np.array([1]), np.array([1]))), 0)
+
+
+class RecommendationsTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        for title in ('First New Book', 'Second New Book', 'Third New Book'):
+            create_book_in_db(title=title)
+        self.books = {book.title: book for book in Book.objects.all()}
+        users = [get_user_model().objects.get(id=1)] + [
+            get_user_model().objects.create_user(username=f'reader{i}', password='password') for i in range(2)]
+        add_books_to_user_library([self.books['First New Book'].pk, self.books['Second New Book'].pk], users[1])
+        add_books_to_user_library([self.books['First New Book'].pk, self.books['Third New Book'].pk], users[2])
+        add_books_to_user_library([self.books['First New Book'].pk, self.books['Second New Book'].pk], users[0])
+        self.user = users[0]
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def test_build_recommendations(self):
+        out = StringIO()
+        call_command('build_recommendations', stdout=out)
+        self.assertIn('Stored', out.getvalue())
+        first = self.books['First New Book']
+        self.assertEqual([book.title for book in get_book_neighbors(first)],
+                         ['Second New Book', 'Book Title 1', 'Third New Book'])
+        self.assertEqual([book.title for book in get_book_neighbors(self.books['Second New Book'])],
+                         ['First New Book', 'Book Title 1'])
+
+        call_command('build_recommendations', '--min-common', 2, stdout=StringIO())
+        self.assertEqual(list(BookNeighbor.objects.values_list('book__title', 'neighbor__title')),
+                         [('First New Book', 'Second New Book'), ('Second New Book', 'First New Book')])
+
+    def test_book_page_block(self):
+        url = reverse('library:book', kwargs={'slug': self.books['First New Book'].slug})
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Readers also read')
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('build_recommendations', stdout=StringIO())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Readers also read')
+        self.assertContains(response, reverse('library:book', kwargs={'slug': self.books['Second New Book'].slug}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books['Second New Book'].delete()
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Second New Book')
@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.library.models import Book, Author, Genre
+from apps.library.utils.search_utils import is_search_index_supported, rebuild_search_index, build_match_expression
+from utils.tests.utils import create_book_in_db
+
+
+class SearchIndexTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        if not is_search_index_supported():
+            self.skipTest('Database has no full-text search index')
+        create_book_in_db(title='Dune')
+        create_book_in_db(title='Children of Dune Messiah')
+        self.url = reverse('library:library')
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def search(self, query, sort_by='latest'):
+        response = self.client.get(self.url, {'q': query, 'sorted': sort_by})
+        self.assertEqual(response.status_code, 200)
+        return [book.title for book in response.context_data['books']]
+
+    def test_build_match_expression(self):
+        self.assertEqual(build_match_expression('New  Boo'), '"new"* + "boo"*')
+        self.assertEqual(build_match_expression("it's"), '"it"* + "s"*')
+        self.assertIsNone(build_match_expression(' !? '))
+
+    def test_search_by_title_prefix(self):
+        self.assertEqual(set(self.search('dun')), {'Dune', 'Children of Dune Messiah'})
+        self.assertEqual(self.search('dune mess'), ['Children of Dune Messiah'])
+        self.assertEqual(self.search('mess dune'), [])
+
+    def test_search_relevance(self):
+        create_book_in_db(title='Dune Dune Dune')
+        self.assertEqual(self.search('dune', 'relevance')[0], 'Dune Dune Dune')
+
+    def test_rank_only_for_relevance(self):
+        for sort_by, ranked in [('latest', False), ('title', False), ('relevance', True)]:
+            with CaptureQueriesContext(connection) as queries:
+                self.search('dune', sort_by)
+            self.assertEqual(any('bm25' in query['sql'] for query in queries), ranked, sort_by)
+
+    def change(self, change):
+        # the cached pages are dropped on the commit of the change
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+
+    def test_index_follows_relations(self):
+        dune = Book.objects.get(title='Dune')
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        self.change(lambda: dune.authors.add(author))
+        self.assertEqual(self.search('herbert'), ['Dune'])
+
+        author.full_name = 'Frank Patrick Herbert'
+        self.change(author.save)
+        self.assertEqual(self.search('patrick'), ['Dune'])
+
+        self.change(author.books.clear)
+        self.assertEqual(self.search('herbert'), [])
+
+        genre = Genre.objects.create(name='Space Opera')
+        self.change(lambda: genre.books.add(dune))
+        self.assertEqual(self.search('space opera'), ['Dune'])
+        self.change(genre.delete)
+        self.assertEqual(self.search('space opera'), [])
+
+    def test_deleted_book_and_rebuild(self):
+        Book.objects.get(title='Dune').delete()
+        self.assertEqual(self.search('dune'), ['Children of Dune Messiah'])
+        self.assertEqual(rebuild_search_index(), Book.objects.count())
+        self.assertEqual(self.search('dune'), ['Children of Dune Messiah'])
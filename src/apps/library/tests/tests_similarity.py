@@ -0,0 +1,121 @@
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+
+from apps.library.models import Book, Genre, BookMinHash, BookLSHBand, UserBookInstance
+from apps.library.utils.similarity_utils import compute_signatures, compute_buckets, find_similar_books, \
+    LSH_BANDS, MINHASH_PERMUTATIONS
+from utils.tests.utils import create_book_in_db
+
+
+class MinHashTestCase(SimpleTestCase):
+
+    def test_signatures_estimate_jaccard(self):
+        features = {f'feature {i}' for i in range(200)}
+        half = {f'feature {i}' for i in range(100)} | {f'other {i}' for i in range(100)}
+        signatures = compute_signatures([features, set(features), half, {'unrelated'}])
+        self.assertEqual(signatures.shape, (4, MINHASH_PERMUTATIONS))
+        self.assertTrue((signatures[0] == signatures[1]).all())
+        # the jaccard similarity of the first and the half set is 1/3
+        self.assertAlmostEqual((signatures[0] == signatures[2]).mean(), 1 / 3, delta=0.15)
+        self.assertLess((signatures[0] == signatures[3]).mean(), 0.1)
+
+        buckets = compute_buckets(signatures)
+        self.assertEqual(buckets.shape, (4, LSH_BANDS))
+        self.assertTrue((buckets[0] == buckets[1]).all())
+        self.assertEqual(buckets.dtype, np.int64)
+
+
+class SimilarBooksTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='Ancient Dragon Tales', year_of_publication=1995)
+        create_book_in_db(title='Ancient Dragon Tales Returns', year_of_publication=1997)
+        create_book_in_db(title='Kitchen Recipes', year_of_publication=2020)
+        self.books = {book.title: book for book in Book.objects.all()}
+        recipes = self.books['Kitchen Recipes']
+        recipes.authors.clear()
+        recipes.genre.set([Genre.objects.create(name='Cooking')])
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def test_books_are_indexed_on_change(self):
+        self.assertEqual(BookMinHash.objects.count(), Book.objects.count())
+        self.assertEqual(BookLSHBand.objects.count(), Book.objects.count() * LSH_BANDS)
+
+        tales = self.books['Ancient Dragon Tales']
+        similar = find_similar_books(tales.pk)
+        self.assertEqual(similar[0][0], self.books['Ancient Dragon Tales Returns'].pk)
+        self.assertGreater(similar[0][1], 0.5)
+        self.assertNotIn(self.books['Kitchen Recipes'].pk, [book_id for book_id, _ in similar])
+
+        signature = BookMinHash.objects.get(book=tales).signature
+        tales.title = 'Modern Kitchen Recipes'
+        tales.save()
+        self.assertNotEqual(BookMinHash.objects.get(book=tales).signature, signature)
+
+        tales.delete()
+        self.assertFalse(BookLSHBand.objects.filter(book_id=tales.pk).exists())
+
+    def test_candidates_ranked_before_limit(self):
+        tales = self.books['Ancient Dragon Tales']
+        returns = self.books['Ancient Dragon Tales Returns']
+        # the only candidate kept is the book sharing most buckets, not the one with the lowest id
+        with mock.patch('apps.library.utils.similarity_utils.SIMILAR_CANDIDATES', 1):
+            self.assertEqual([book_id for book_id, _ in find_similar_books(tales.pk)], [returns.pk])
+
+    def test_large_buckets_are_skipped(self):
+        tales = self.books['Ancient Dragon Tales']
+        self.assertTrue(find_similar_books(tales.pk))
+        # every bucket shared with another book is over the limit
+        with mock.patch('apps.library.utils.similarity_utils.SIMILAR_BUCKET_LIMIT', 1):
+            self.assertEqual(find_similar_books(tales.pk), [])
+
+    def test_rebuild_similarity_index(self):
+        BookMinHash.objects.all().delete()
+        BookLSHBand.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_similarity_index', stdout=out)
+        self.assertIn(f'Indexed {Book.objects.count()} books', out.getvalue())
+        self.assertEqual(BookLSHBand.objects.count(), Book.objects.count() * LSH_BANDS)
+
+        out = StringIO()
+        call_command('benchmark_similar_books', '--samples', 3, stdout=out)
+        self.assertIn('recall@10', out.getvalue())
+
+    def test_similar_books_view(self):
+        tales = self.books['Ancient Dragon Tales']
+        url = reverse('library:similar_books', kwargs={'id': tales.pk})
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        returns = self.books['Ancient Dragon Tales Returns']
+        self.assertEqual(response.json()['book_id'], tales.pk)
+        self.assertEqual([(book['id'], book['slug']) for book in response.json()['similar']],
+                         [(returns.pk, returns.slug)])
+
+        # the response is cached until the similar books index changes, not on the changes of the libraries
+        with self.assertNumQueries(0):
+            self.client.get(url, {'limit': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            UserBookInstance.objects.create(user_id=1, book=returns)
+        with self.assertNumQueries(0):
+            self.client.get(url, {'limit': 1})
+        returns.title = 'Ancient Dragon Tales Strike Back'
+        with self.captureOnCommitCallbacks(execute=True):
+            returns.save()
+        self.assertEqual(self.client.get(url, {'limit': 1}).json()['similar'][0]['title'], returns.title)
+
+        self.assertEqual(self.client.get(url, {'limit': 'many'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('library:similar_books', kwargs={'id': 0})).status_code, 404)
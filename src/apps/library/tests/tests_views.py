@@ -1,20 +1,33 @@
-from django.core.exceptions import ValidationError
 from django.db.models import QuerySet
 from django.template.response import TemplateResponse
+from django.db import connection
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 
 from apps.library.models import Book, UserBookInstance
 from utils.tests.utils import create_book_in_db, get_mock_file
 
 
+def get_instance_writes(context: CaptureQueriesContext) -> list[str]:
+    """
+    Return the captured statements that insert or delete book instances.
+    """
+    table = UserBookInstance._meta.db_table
+    return [query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('INSERT') and f'INTO "{table}"' in query['sql']
+            or query['sql'].startswith(f'DELETE FROM "{table}"')]
+
+
 class TestViews(TestCase):
     fixtures = ['test_data.json']
 
     def setUp(self):
         self.factory = RequestFactory()
-        create_book_in_db(title='New Book')
+        with self.captureOnCommitCallbacks(execute=True):
+            create_book_in_db(title='New Book')
         self.book = Book.objects.get(title='New Book')
         self.user = get_user_model().objects.get(id=1)
 
@@ -23,6 +36,7 @@ class TestViews(TestCase):
         books = Book.objects.all()
         for book in books:
             book.delete()
+        cache.clear()
 
     def test_add_book_to_user_library(self):
         url = reverse('library:add_book_to_user_library', args=[self.book.id])
@@ -38,8 +52,10 @@ class TestViews(TestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, 302)
         self.assertTrue(UserBookInstance.objects.filter(user=self.user, book=self.book).exists())
-        with self.assertRaises(ValidationError):
-            self.client.post(url)
+        # adding twice is a no-op
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(UserBookInstance.objects.filter(user=self.user, book=self.book).count(), 1)
 
         wrong_book_id = 1000
         url = reverse('library:add_book_to_user_library', args=[wrong_book_id])
@@ -75,6 +91,42 @@ class TestViews(TestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, 404)
 
+    def test_add_and_remove_books_in_user_library(self):
+        add_url = reverse('library:add_books_to_user_library')
+        remove_url = reverse('library:remove_books_from_user_library')
+        second_book = Book.objects.get(title='Book Title 1')
+        instances = UserBookInstance.objects.filter(user=self.user)
+        self.assertEqual(list(instances.values_list('book_id', flat=True)), [second_book.id])
+
+        response = self.client.post(add_url, {'book_id': [self.book.id]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(instances.count(), 1)
+
+        self.client.force_login(self.user)
+        response = self.client.get(add_url)
+        self.assertEqual(response.status_code, 405)
+
+        # books already in the library and missing books are skipped
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(add_url, {'book_id': [self.book.id, second_book.id, 1000]})
+        self.assertEqual(len(get_instance_writes(context)), 1)
+        self.assertEqual(response.json(), {'added': 1})
+        self.assertEqual(set(instances.values_list('book_id', flat=True)), {self.book.id, second_book.id})
+        self.assertFalse(instances.get(book=self.book).is_read)
+        response = self.client.post(add_url, {'book_id': [self.book.id]})
+        self.assertEqual(response.json(), {'added': 0})
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(remove_url, {'book_id': [self.book.id, second_book.id, 1000]})
+        self.assertEqual(len(get_instance_writes(context)), 1)
+        self.assertEqual(response.json(), {'removed': 2})
+        self.assertFalse(instances.exists())
+        response = self.client.post(remove_url, {'book_id': [self.book.id]})
+        self.assertEqual(response.json(), {'removed': 0})
+
+        response = self.client.post(remove_url, {'book_id': []})
+        self.assertEqual(response.status_code, 400)
+
     def test_change_book_read_status(self):
         url = reverse('library:change_book_read_status', args=[self.book.id])
         user_book_instance = UserBookInstance.objects.create(user=self.user, book=self.book)
@@ -90,17 +142,55 @@ class TestViews(TestCase):
         self.assertFalse(UserBookInstance.objects.get(id=user_book_instance.id).is_read)
         response = self.client.post(url)
         self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_read'])
+        self.assertContains(response, 'checked')
         self.assertTrue(UserBookInstance.objects.get(id=user_book_instance.id).is_read)
         response = self.client.post(url)
         self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['is_read'])
+        self.assertNotContains(response, 'checked')
         self.assertFalse(UserBookInstance.objects.get(id=user_book_instance.id).is_read)
 
+        # the book is not in the user library
+        user_book_instance.delete()
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 404)
+
         wrong_book_id = 1000
         url = reverse('library:change_book_read_status', args=[wrong_book_id])
         self.assertFalse(UserBookInstance.objects.filter(id=wrong_book_id).exists())
         response = self.client.post(url)
         self.assertEqual(response.status_code, 404)
 
+    def test_change_books_read_status(self):
+        url = reverse('library:change_books_read_status')
+        second_book = Book.objects.get(title='Book Title 1')
+        UserBookInstance.objects.create(user=self.user, book=self.book)
+        read_ids = UserBookInstance.objects.filter(user=self.user, is_read=True)
+
+        response = self.client.post(url, {'book_id': [self.book.id, second_book.id], 'is_read': 'true'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(read_ids.exists())
+
+        self.client.force_login(self.user)
+        response = self.client.post(url, {'book_id': [self.book.id, second_book.id], 'is_read': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'is_read': True, 'updated': 2})
+        self.assertEqual(read_ids.count(), 2)
+
+        # already read books are not counted, books outside the library are ignored
+        response = self.client.post(url, {'book_id': [self.book.id, 1000], 'is_read': 'true'})
+        self.assertEqual(response.json(), {'is_read': True, 'updated': 0})
+
+        response = self.client.post(url, {'book_id': [self.book.id], 'is_read': 'false'})
+        self.assertEqual(response.json(), {'is_read': False, 'updated': 1})
+        self.assertEqual(list(read_ids.values_list('book_id', flat=True)), [second_book.id])
+
+        response = self.client.post(url, {'book_id': ['x'], 'is_read': 'true'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {'book_id': [self.book.id], 'is_read': 'maybe'})
+        self.assertEqual(response.status_code, 400)
+
     def test_book_view(self):
         url = reverse('library:book', kwargs={'slug': self.book.slug})
         response = self.client.get(url)
@@ -128,6 +218,56 @@ class TestViews(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
 
+    def test_book_view_conditional_get(self):
+        url = reverse('library:book', kwargs={'slug': self.book.slug})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Cookie', response['Vary'])
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('library:add_book_to_user_library', args=[self.book.id]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.genre.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        url = reverse('library:book', kwargs={'slug': 'wrong-slug'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+    def test_library_view_conditional_get(self):
+        url = reverse('library:library') + '?q=new&sorted=title'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        other_url = reverse('library:library_search') + '?q=new&sorted=title'
+        self.assertEqual(self.client.get(other_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_book_in_db(title='Second New Book')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
     def test_library_view(self):
         def q_attribute_checker(url: str, equal_query: QuerySet):
             """
@@ -216,7 +356,7 @@ class TestViews(TestCase):
         read_books = list(
             UserBookInstance.objects.filter(user=self.user, is_read=True)
             .values_list('book_id', flat=True).order_by('book_id'))
-        books = list(Book.objects.all().values_list('id', flat=True))
+        books = list(Book.objects.all().order_by('id').values_list('id', flat=True))
         # move read_books to start of the list
         for i in read_books[::-1]:
             if i in books:
@@ -240,6 +380,31 @@ class TestViews(TestCase):
             Book.objects.filter(title__icontains='new').order_by('year_of_publication')
         )
 
+    def test_library_read_flag_from_read_set(self):
+        create_book_in_db(title='Second New Book')
+        second_book = Book.objects.get(title='Second New Book')
+        UserBookInstance.objects.create(user=self.user, book=self.book, is_read=True)
+        UserBookInstance.objects.create(user=self.user, book=second_book)
+        self.client.force_login(self.user)
+
+        url = reverse('library:library_search') + '?q=New+Book&sorted=title'
+        response = self.client.get(url)
+        self.assertEqual({book.title: book.read for book in response.context_data['books']},
+                         {'New Book': True, 'Second New Book': False})
+        self.assertNotIn('read', response.context_data['books'].query.annotations)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('library:change_book_read_status', args=[second_book.id]))
+        response = self.client.get(url)
+        self.assertEqual({book.title: book.read for book in response.context_data['books']},
+                         {'New Book': True, 'Second New Book': True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('library:remove_book_from_user_library', args=[self.book.id]))
+        response = self.client.get(url)
+        self.assertEqual({book.title: book.read for book in response.context_data['books']},
+                         {'New Book': False, 'Second New Book': True})
+
     def test_library_search_view(self):
         url = reverse('library:library_search') + '?q=new&sorted=year_of_publication'
         response = self.client.get(url)
@@ -0,0 +1,335 @@
+import contextvars
+import logging
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+import django
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Book, Author, Genre, UserBookInstance, ReadingEvent
+
+SORT_MODES = ['latest', 'title', 'year_of_publication', 'relevance', 'read']
+LIBRARY_FILTERS = ['', 'read', 'unread']
+ACTIVITY_PERIODS = ['day', 'week', 'month']
+PERCENTILES = (50, 95, 99)
+# books whose slugs and title words the simulated users pick from
+SAMPLE_BOOKS = 1000
+# the debug toolbar is shown to the internal ips, the simulated users come from a documentation address
+CLIENT_ADDRESS = '192.0.2.1'
+
+# the query counter of the current request, shared with the threads of async views
+_query_counter = contextvars.ContextVar('benchmark_query_counter', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def add_query_counter(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+@dataclass
+class BenchmarkData:
+    """
+    Books and search terms picked by the simulated users, loaded once before the run.
+    """
+    book_ids: list[int]
+    slugs: list[str]
+    search_terms: list[str]
+
+
+@dataclass
+class VirtualUser:
+    client: Client
+    rng: random.Random
+    # the books of the user library before the run, the writes are rolled back so it does not change
+    library: set[int]
+
+
+@dataclass(frozen=True)
+class Sample:
+    label: str
+    seconds: float
+    queries: int
+    status: int
+
+
+def get_server_name() -> str:
+    # the requests have to pass the host validation of the site
+    return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+
+
+def load_benchmark_data(seed: int) -> BenchmarkData:
+    rng = random.Random(seed)
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+    sample = rng.sample(book_ids, min(SAMPLE_BOOKS, len(book_ids)))
+    books = list(Book.objects.filter(pk__in=sample).order_by('id').values_list('slug', 'title', 'year_of_publication'))
+    terms = {word for _, title, _ in books for word in re.findall(r'\w{3,}', title.lower())}
+    terms.update(Book.authors.through.objects.filter(book_id__in=sample[:100]).values_list(
+        'author__last_name', flat=True))
+    terms.update(str(year) for _, _, year in books[:20])
+    return BenchmarkData(book_ids=book_ids, slugs=[slug for slug, _, _ in books], search_terms=sorted(terms))
+
+
+def library_request(user: VirtualUser, data: BenchmarkData):
+    return 'library', 'get', reverse('library:library'), {}
+
+
+def library_search_request(user: VirtualUser, data: BenchmarkData):
+    sort = user.rng.choice(SORT_MODES)
+    return f'library_search:{sort}', 'get', reverse('library:library_search'), {
+        'q': user.rng.choice(data.search_terms), 'sorted': sort}
+
+
+def book_request(user: VirtualUser, data: BenchmarkData):
+    return 'book', 'get', reverse('library:book', kwargs={'slug': user.rng.choice(data.slugs)}), {}
+
+
+def similar_books_request(user: VirtualUser, data: BenchmarkData):
+    return 'similar_books', 'get', reverse('library:similar_books', kwargs={'id': user.rng.choice(data.book_ids)}), {}
+
+
+def user_books_filter_request(user: VirtualUser, data: BenchmarkData):
+    book_filter = user.rng.choice(LIBRARY_FILTERS)
+    return f'user_books_filter:{book_filter or "all"}', 'get', reverse('library:user_books_filter'), (
+        {'filter': book_filter} if book_filter else {})
+
+
+def add_book_request(user: VirtualUser, data: BenchmarkData):
+    book_id = user.rng.choice(data.book_ids)
+    return 'add_book_to_user_library', 'post', reverse('library:add_book_to_user_library', kwargs={'id': book_id}), {}
+
+
+def remove_book_request(user: VirtualUser, data: BenchmarkData):
+    if not user.library:
+        return add_book_request(user, data)
+    book_id = user.rng.choice(sorted(user.library))
+    return 'remove_book_from_user_library', 'post', reverse(
+        'library:remove_book_from_user_library', kwargs={'id': book_id}), {}
+
+
+def change_read_status_request(user: VirtualUser, data: BenchmarkData):
+    if not user.library:
+        return add_book_request(user, data)
+    book_id = user.rng.choice(sorted(user.library))
+    return 'change_book_read_status', 'post', reverse('library:change_book_read_status', kwargs={'id': book_id}), {}
+
+
+def statistic_request(name: str, params: Callable[[random.Random], dict] = lambda rng: {}):
+    def make_request(user: VirtualUser, data: BenchmarkData):
+        return f'statistic:{name}', 'get', reverse(f'statistic:{name}'), params(user.rng)
+    return make_request
+
+
+# name: (weight, request factory), the weights follow the share of the pages in the traffic
+ENDPOINTS = {
+    'library': (10, library_request),
+    'library_search': (20, library_search_request),
+    'book': (20, book_request),
+    'similar_books': (5, similar_books_request),
+    'user_books_filter': (8, user_books_filter_request),
+    'add_book_to_user_library': (3, add_book_request),
+    'remove_book_from_user_library': (2, remove_book_request),
+    'change_book_read_status': (4, change_read_status_request),
+    'statistic': (1, statistic_request('statistic')),
+    'genres_statistic': (1, statistic_request('genres_statistic')),
+    'fig_genres_statistic': (1, statistic_request('fig_genres_statistic', lambda rng: {
+        'start_year': rng.choice([1900, 1950, 2000]), 'top': rng.choice([5, 10, 20])})),
+    'authors_statistic': (1, statistic_request('authors_statistic')),
+    'books_read_statistic': (1, statistic_request('books_read_statistic')),
+    'general_statistics': (2, statistic_request('general_statistics')),
+    'reading_activity_statistic': (1, statistic_request('reading_activity_statistic', lambda rng: {
+        'period': rng.choice(ACTIVITY_PERIODS)})),
+}
+
+
+def run_virtual_user(user_id: int, seed: str, data: BenchmarkData, endpoints: list[str], requests: int,
+                     warmup: int, samples: list[Sample]) -> None:
+    """
+    Send requests to the randomly picked endpoints as the user, like a browser session does.
+    """
+    client = Client(REMOTE_ADDR=CLIENT_ADDRESS, SERVER_NAME=get_server_name(), raise_request_exception=False)
+    try:
+        client.force_login(get_user_model().objects.get(pk=user_id))
+        user = VirtualUser(client=client, rng=random.Random(seed), library=set(
+            UserBookInstance.objects.filter(user_id=user_id).values_list('book_id', flat=True)))
+        weights = [ENDPOINTS[name][0] for name in endpoints]
+        for i in range(warmup + requests):
+            name = user.rng.choices(endpoints, weights)[0]
+            label, method, path, params = ENDPOINTS[name][1](user, data)
+            counter = [0]
+            token = _query_counter.set(counter)
+            start = time.perf_counter()
+            try:
+                if method == 'get':
+                    response = client.get(path, params)
+                else:
+                    # the views run in this thread, the writes are rolled back to leave the dataset as it was
+                    with transaction.atomic():
+                        response = getattr(client, method)(path, params)
+                        transaction.set_rollback(True)
+            finally:
+                seconds = time.perf_counter() - start
+                _query_counter.reset(token)
+            if i >= warmup:
+                samples.append(Sample(label, seconds, counter[0], response.status_code))
+    finally:
+        connections.close_all()
+
+
+def summarize(samples: list[Sample], seconds: float) -> dict:
+    """
+    Return the throughput, latency percentiles in milliseconds and query counts of the samples.
+    """
+    latencies = np.array([sample.seconds for sample in samples]) * 1000
+    queries = np.array([sample.queries for sample in samples])
+    summary = {
+        'requests': len(samples),
+        'errors': sum(sample.status >= 400 for sample in samples),
+        'throughput': len(samples) / seconds if seconds else 0.0,
+    }
+    for percentile, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+        summary[f'p{percentile}_ms'] = float(value)
+    summary.update({
+        'mean_ms': float(latencies.mean()),
+        'max_ms': float(latencies.max()),
+        'mean_queries': float(queries.mean()),
+        'max_queries': int(queries.max()),
+    })
+    return summary
+
+
+@dataclass
+class BenchmarkOptions:
+    users: int = 10
+    concurrency: int = 4
+    requests: int = 100
+    warmup: int = 5
+    seed: int = 0
+    endpoints: list[str] = field(default_factory=lambda: list(ENDPOINTS))
+
+
+def get_dataset_fingerprint(seed: int) -> dict:
+    """
+    Return the row counts of the dataset and the seed of the benchmark, runs are comparable only when they match.
+    """
+    return {
+        'seed': seed,
+        'books': Book.objects.count(),
+        'authors': Author.objects.count(),
+        'genres': Genre.objects.count(),
+        'users': get_user_model().objects.count(),
+        'book_instances': UserBookInstance.objects.count(),
+        'reading_events': ReadingEvent.objects.count(),
+    }
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(options: BenchmarkOptions) -> dict:
+    """
+    Run the simulated users concurrently, concurrency of them at a time, and return the results by endpoint.
+    Every user sends warmup requests that are not measured, then requests measured ones.
+    """
+    user_ids = list(get_user_model().objects.filter(is_superuser=False).order_by('id').values_list(
+        'id', flat=True)[:options.users])
+    data = load_benchmark_data(options.seed)
+    fingerprint = get_dataset_fingerprint(options.seed)
+    samples = []
+    connection_created.connect(add_query_counter)
+    add_query_counter(None, connection)
+    # client errors are counted in the results, server errors are still logged
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        start = time.perf_counter()
+        pending = list(enumerate(user_ids))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    i, user_id = pending.pop(0)
+                run_virtual_user(user_id, f'{options.seed}-{i}', data, options.endpoints, options.requests,
+                                 options.warmup, samples)
+
+        threads = [threading.Thread(target=worker) for _ in range(min(options.concurrency, len(user_ids)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+    finally:
+        request_logger.setLevel(level)
+        connection_created.disconnect(add_query_counter)
+        if count_queries in connection.execute_wrappers:
+            connection.execute_wrappers.remove(count_queries)
+
+    by_label = {}
+    for sample in samples:
+        by_label.setdefault(sample.label, []).append(sample)
+    return {
+        'meta': {
+            'commit': get_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': sys.version.split()[0],
+            'django': django.get_version(),
+            'dataset': fingerprint,
+            'books': len(data.book_ids),
+            'users': len(user_ids),
+            'options': {'users': options.users, 'concurrency': options.concurrency, 'requests': options.requests,
+                        'warmup': options.warmup, 'seed': options.seed, 'endpoints': options.endpoints},
+        },
+        'total': summarize(samples, seconds) if samples else {},
+        'endpoints': {label: summarize(by_label[label], seconds) for label in sorted(by_label)},
+    }
+
+
+def compare_results(previous: dict, current: dict, threshold: float = 0.2) -> list[tuple[str, str, float, float]]:
+    """
+    Return (endpoint, metric, previous, current) of the endpoints whose p95 latency grew by more than
+    the threshold share, or whose mean number of queries grew.
+    Raise ValueError if the runs were made on different datasets or with different seeds.
+    """
+    previous_dataset = previous.get('meta', {}).get('dataset')
+    if previous_dataset is None or previous_dataset != current.get('meta', {}).get('dataset'):
+        raise ValueError(f'The runs were made on different datasets: {previous_dataset} and '
+                         f'{current.get("meta", {}).get("dataset")}')
+    regressions = []
+    for label, summary in current['endpoints'].items():
+        old = previous['endpoints'].get(label)
+        if old is None:
+            continue
+        if summary['p95_ms'] > old['p95_ms'] * (1 + threshold):
+            regressions.append((label, 'p95_ms', old['p95_ms'], summary['p95_ms']))
+        if summary['mean_queries'] > old['mean_queries'] + 0.5:
+            regressions.append((label, 'mean_queries', old['mean_queries'], summary['mean_queries']))
+    return regressions
@@ -0,0 +1,228 @@
+import hashlib
+import secrets
+import time
+from array import array
+from functools import wraps
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import models
+from django.db.models import Count, Q
+from django.utils import timezone
+
+READ_SET_TIMEOUT = 60 * 60 * 24
+CATALOG_CACHE_TIMEOUT = 60 * 60
+CATALOG_VERSION_KEY = 'library:catalog:version'
+RECOMMENDATIONS_VERSION_KEY = 'library:recommendations:version'
+SIMILARITY_VERSION_KEY = 'library:similarity:version'
+BOOK_GENRES_VERSION_KEY = 'library:book-genres:version'
+
+_missing = object()
+
+
+def get_version(key: str) -> int:
+    """
+    Return the version stored under the key.
+    """
+    version = cache.get(key)
+    if version is None:
+        # start from the current time, so an evicted version never repeats an old one
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key: str) -> None:
+    """
+    Replace the version stored under the key with a new random one and remember the time of the change.
+    A single set is atomic on every backend, unlike incr which reads and writes the file backend
+    separately, so two concurrent bumps never collapse into one version.
+    """
+    cache.set(key, secrets.randbits(63), timeout=None)
+    cache.set(f'{key}:modified', timezone.now(), timeout=None)
+
+
+def get_modified(key: str):
+    """
+    Return the time of the last change of the version stored under the key, or None if unknown.
+    """
+    return cache.get(f'{key}:modified')
+
+
+def get_user_library_version_key(user_id) -> str:
+    return f'library:user:{user_id}:version'
+
+
+def get_user_library_version(user_id) -> int:
+    """
+    Return the version of the user's library, it changes on every change of the user's book instances.
+    """
+    return get_version(get_user_library_version_key(user_id))
+
+
+def get_user_library_modified(user_id):
+    return get_modified(get_user_library_version_key(user_id))
+
+
+def bump_user_library_version(user_id) -> None:
+    """
+    Invalidate everything cached for the user's library.
+    """
+    bump_version(get_user_library_version_key(user_id))
+
+
+def get_catalog_version() -> int:
+    """
+    Return the version of the catalog, it changes on every change of books, authors, genres and book instances.
+    """
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def get_catalog_modified():
+    return get_modified(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version() -> None:
+    """
+    Invalidate everything cached for the catalog.
+    """
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def get_recommendations_version() -> int:
+    """
+    Return the version of the book recommendations, it changes when they are rebuilt or a book is deleted.
+    """
+    return get_version(RECOMMENDATIONS_VERSION_KEY)
+
+
+def get_recommendations_modified():
+    return get_modified(RECOMMENDATIONS_VERSION_KEY)
+
+
+def bump_recommendations_version() -> None:
+    bump_version(RECOMMENDATIONS_VERSION_KEY)
+
+
+def get_similarity_version() -> int:
+    """
+    Return the version of the similar books index, it changes when books are indexed or deleted,
+    not on the changes of the user libraries.
+    """
+    return get_version(SIMILARITY_VERSION_KEY)
+
+
+def bump_similarity_version() -> None:
+    bump_version(SIMILARITY_VERSION_KEY)
+
+
+def get_book_genres_version() -> int:
+    """
+    Return the version of the books and their genres, it changes on the changes of books, genres
+    and the genres of books, not on the changes of the user libraries.
+    """
+    return get_version(BOOK_GENRES_VERSION_KEY)
+
+
+def bump_book_genres_version() -> None:
+    bump_version(BOOK_GENRES_VERSION_KEY)
+
+
+def make_catalog_key(prefix: str, *parts) -> str:
+    """
+    Build a cache key from the current catalog version and the given parts.
+    """
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'catalog:{get_catalog_version()}:{prefix}:{digest}'
+
+
+def get_read_book_ids(user) -> array:
+    """
+    Return sorted ids of the books read by the user, cached per library version.
+    """
+    key = f'library:user:{user.pk}:read-set:{get_user_library_version(user.pk)}'
+    read_book_ids = cache.get(key)
+    if read_book_ids is None:
+        read_book_ids = array('q', user.books.filter(is_read=True).order_by('book_id')
+                              .values_list('book_id', flat=True))
+        cache.set(key, read_book_ids, READ_SET_TIMEOUT)
+    return read_book_ids
+
+
+def get_user_library_counts(user) -> dict[str, int]:
+    """
+    Return total, read and unread counts of the user's books from one aggregate query, cached per library version.
+    """
+    key = f'library:user:{user.pk}:counts:{get_user_library_version(user.pk)}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = user.books.aggregate(total=Count('id'), read=Count('id', filter=Q(is_read=True)))
+        counts['unread'] = counts['total'] - counts['read']
+        cache.set(key, counts, READ_SET_TIMEOUT)
+    return counts
+
+
+def cache_by_catalog(timeout: int = CATALOG_CACHE_TIMEOUT):
+    """
+    Decorator caching the result of a function per catalog version and arguments.
+    Arguments must have a stable repr.
+    """
+    def decorator(func):
+        prefix = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_catalog_key(prefix, args, sorted(kwargs.items()))
+            result = cache.get(key, _missing)
+            if result is _missing:
+                result = func(*args, **kwargs)
+                cache.set(key, result, timeout)
+            return result
+        return wrapper
+    return decorator
+
+
+class CatalogCachedQuerySet(models.QuerySet):
+    """
+    Queryset which results can be cached per catalog version, keyed by the compiled sql of the query.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._catalog_cache_timeout = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._catalog_cache_timeout = self._catalog_cache_timeout
+        return clone
+
+    def cache_by_catalog(self, timeout: int = CATALOG_CACHE_TIMEOUT):
+        """
+        Cache fetched results (with prefetched relations) until the catalog changes.
+        """
+        clone = self._chain()
+        clone._catalog_cache_timeout = timeout
+        return clone
+
+    def get_catalog_cache_key(self) -> str | None:
+        try:
+            sql, params = self.query.sql_with_params()
+        except EmptyResultSet:
+            return None
+        lookups = [str(lookup) for lookup in self._prefetch_related_lookups]
+        return make_catalog_key(self.model._meta.label, self.db, sql, params, lookups,
+                                self._iterable_class.__name__, self._fields)
+
+    def _fetch_all(self):
+        if self._result_cache is not None or self._catalog_cache_timeout is None:
+            return super()._fetch_all()
+        key = self.get_catalog_cache_key()
+        if key is None:
+            return super()._fetch_all()
+        result = cache.get(key)
+        if result is not None:
+            self._result_cache = result
+            self._prefetch_done = True
+            return
+        super()._fetch_all()
+        cache.set(key, self._result_cache, self._catalog_cache_timeout)
@@ -0,0 +1,270 @@
+import datetime
+from dataclasses import dataclass
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import transaction, connections, DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from utils.utils import get_minimal_book_year, get_maximal_book_year, get_default_book_image
+from ..models import Country, Author, Genre, Book, UserBookInstance, ReadingEvent
+from .import_utils import insert_rows, chunked
+
+# the draws don't depend on the size of the written chunks, every chunk has its own generator
+DATASET_CHUNK_SIZE = 10_000
+# rows per executemany, bounds the memory of the parameters
+INSERT_BATCH_SIZE = 5_000
+
+SYLLABLES = ['an', 'bel', 'cor', 'da', 'el', 'fin', 'gar', 'hal', 'is', 'jor', 'ka', 'lin', 'mar', 'nor',
+             'o', 'per', 'quin', 'ros', 'sel', 'tor', 'u', 'val', 'wen', 'xa', 'yor', 'zel']
+TITLE_WORDS = ['the', 'night', 'river', 'house', 'secret', 'garden', 'war', 'love', 'shadow', 'city', 'king',
+               'sea', 'winter', 'silent', 'last', 'stone', 'fire', 'road', 'dark', 'light', 'empire', 'child',
+               'dream', 'glass', 'island', 'memory', 'mountain', 'journey', 'storm', 'letters', 'queen',
+               'forest', 'summer', 'hidden', 'golden', 'broken', 'lost', 'star', 'wolf', 'tale', 'song',
+               'history', 'time', 'stranger', 'mirror', 'bridge', 'crown', 'harbor', 'ghost', 'path']
+AUTHORS_PER_BOOK = ([1, 2, 3], [0.85, 0.12, 0.03])
+GENRES_PER_BOOK = ([1, 2, 3], [0.6, 0.3, 0.1])
+# share of books spread over all years, the others are mostly recent
+CLASSIC_SHARE = 0.1
+RECENT_YEARS_SCALE = 25
+# the library sizes are lognormal, a few users have most of the books
+LIBRARY_SIZE_SIGMA = 1.0
+MAX_LIBRARY_SIZE = 5_000
+READ_SHARE = 0.4
+# mean days between adding and reading a book
+READ_DELAY_DAYS = 14
+
+
+@dataclass(frozen=True)
+class DatasetOptions:
+    books: int
+    authors: int
+    genres: int
+    countries: int
+    users: int
+    books_per_user: float
+    seed: int = 0
+    zipf: float = 1.1
+    history_days: int = 365
+    until: datetime.datetime | None = None
+    password: str = 'password'
+
+
+@dataclass
+class DatasetReport:
+    countries: int = 0
+    genres: int = 0
+    authors: int = 0
+    books: int = 0
+    users: int = 0
+    instances: int = 0
+    events: int = 0
+
+
+def get_rng(seed: int, *key: int) -> np.random.Generator:
+    """
+    Return an independent generator for a stage and a chunk of the dataset.
+    """
+    return np.random.default_rng([seed, *key])
+
+
+def get_zipf_cdf(n: int, exponent: float) -> np.ndarray:
+    """
+    Return the cumulative distribution of ranks 0..n-1 with probabilities proportional to 1 / (rank + 1) ** exponent.
+    """
+    weights = 1 / np.arange(1, n + 1, dtype=np.float64) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def sample_zipf(rng: np.random.Generator, cdf: np.ndarray, popularity: np.ndarray, size: int) -> np.ndarray:
+    """
+    Draw indexes of items, popularity maps ranks to items so popular items are spread over the ids.
+    """
+    ranks = np.minimum(np.searchsorted(cdf, rng.random(size), side='right'), len(cdf) - 1)
+    return popularity[ranks]
+
+
+def make_names(rng: np.random.Generator, n: int, min_syllables: int = 2, max_syllables: int = 3) -> list[str]:
+    counts = rng.integers(min_syllables, max_syllables + 1, n)
+    syllables = rng.integers(0, len(SYLLABLES), counts.sum())
+    names = []
+    start = 0
+    for count in counts:
+        names.append(''.join(SYLLABLES[i] for i in syllables[start:start + count]).capitalize())
+        start += count
+    return names
+
+
+def get_years(rng: np.random.Generator, size: int, until_year: int) -> np.ndarray:
+    """
+    Draw publication years, mostly recent with a long tail of classics.
+    """
+    minimal_year, maximal_year = get_minimal_book_year(), min(get_maximal_book_year(), until_year)
+    recent = maximal_year - np.floor(rng.exponential(RECENT_YEARS_SCALE, size)).astype(np.int64)
+    classic = rng.integers(minimal_year, maximal_year + 1, size)
+    return np.clip(np.where(rng.random(size) < CLASSIC_SHARE, classic, recent), minimal_year, maximal_year)
+
+
+def get_relation_pairs(rng: np.random.Generator, book_ids: np.ndarray, counts: tuple[list, list],
+                       cdf: np.ndarray, popularity: np.ndarray) -> np.ndarray:
+    """
+    Draw distinct (book_id, related index) pairs, the number of related items per book from counts.
+    """
+    sizes = rng.choice(counts[0], len(book_ids), p=counts[1])
+    related = sample_zipf(rng, cdf, popularity, int(sizes.sum()))
+    pairs = np.column_stack((np.repeat(book_ids, sizes), related))
+    return np.unique(pairs, axis=0)
+
+
+def get_start_id(model, using: str) -> int:
+    return (model.objects.using(using).aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+def reset_sequences(models: list, using: str) -> None:
+    """
+    Move the id sequences past the explicitly inserted ids.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def insert_batches(model, columns: tuple[str, ...], rows: list[tuple], using: str) -> None:
+    for batch in chunked(rows, INSERT_BATCH_SIZE):
+        insert_rows(model, columns, batch, using)
+
+
+def generate_dataset(options: DatasetOptions, using: str = DEFAULT_DB_ALIAS, progress=None) -> DatasetReport:
+    """
+    Write a synthetic catalog with users libraries and reading history, with Zipfian popularity of
+    authors, genres, title words and books. The same options give the same dataset.
+    The rows are written with bulk inserts and send no signals, the indexes and rollups are not updated.
+    progress is called with the report after every chunk.
+    """
+    report = DatasetReport()
+    connection = connections[using]
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+    until = options.until or timezone.now()
+    updated_at = adapt_datetime(until)
+    seed = options.seed
+
+    with transaction.atomic(using=using):
+        rng = get_rng(seed, 0)
+        country_id = get_start_id(Country, using)
+        Country.objects.using(using).bulk_create([
+            Country(id=country_id + i, name=name, slug=f'{slugify(name)}-{country_id + i}')
+            for i, name in enumerate(make_names(rng, options.countries))
+        ], batch_size=INSERT_BATCH_SIZE)
+        report.countries = options.countries
+
+        genre_id = get_start_id(Genre, using)
+        Genre.objects.using(using).bulk_create([
+            Genre(id=genre_id + i, name=name, slug=f'{slugify(name)}-{genre_id + i}')
+            for i, name in enumerate(make_names(rng, options.genres, 2, 4))
+        ], batch_size=INSERT_BATCH_SIZE)
+        report.genres = options.genres
+
+        author_id = get_start_id(Author, using)
+        first_names = make_names(rng, options.authors)
+        last_names = make_names(rng, options.authors, 2, 4)
+        author_countries = [None] * options.authors
+        if options.countries:
+            author_countries = [country_id + int(i) for i in sample_zipf(
+                rng, get_zipf_cdf(options.countries, options.zipf), rng.permutation(options.countries),
+                options.authors)]
+        authors = []
+        for i, (first_name, last_name) in enumerate(zip(first_names, last_names)):
+            full_name = f'{first_name} {last_name}'
+            authors.append(Author(id=author_id + i, first_name=first_name, last_name=last_name,
+                                  full_name=full_name, slug=f'{slugify(full_name)}-{author_id + i}',
+                                  country_id=author_countries[i]))
+        Author.objects.using(using).bulk_create(authors, batch_size=INSERT_BATCH_SIZE)
+        report.authors = options.authors
+
+        user_model = get_user_model()
+        user_id = get_start_id(user_model, using)
+        password = make_password(options.password)
+        user_model.objects.using(using).bulk_create([
+            user_model(id=user_id + i, username=f'reader{user_id + i}', password=password, date_joined=until)
+            for i in range(options.users)
+        ], batch_size=INSERT_BATCH_SIZE)
+        report.users = options.users
+    if progress:
+        progress(report)
+
+    book_id = get_start_id(Book, using)
+    author_cdf, author_popularity = get_zipf_cdf(options.authors, options.zipf), rng.permutation(options.authors)
+    genre_cdf, genre_popularity = get_zipf_cdf(options.genres, options.zipf), rng.permutation(options.genres)
+    word_cdf, word_popularity = get_zipf_cdf(len(TITLE_WORDS), options.zipf), np.arange(len(TITLE_WORDS))
+    image = get_default_book_image()
+    for chunk, start in enumerate(range(0, options.books, DATASET_CHUNK_SIZE)):
+        rng = get_rng(seed, 1, chunk)
+        size = min(DATASET_CHUNK_SIZE, options.books - start)
+        book_ids = np.arange(book_id + start, book_id + start + size)
+        word_counts = rng.integers(1, 5, size)
+        words = sample_zipf(rng, word_cdf, word_popularity, int(word_counts.sum()))
+        years = get_years(rng, size, until.year)
+        rows = []
+        word_start = 0
+        for i, count in enumerate(word_counts):
+            title = ' '.join(TITLE_WORDS[word] for word in words[word_start:word_start + count]).capitalize()
+            word_start += count
+            rows.append((int(book_ids[i]), title, f'{slugify(title)}-{book_ids[i]}', int(years[i]),
+                         image, '', updated_at))
+        book_authors = get_relation_pairs(rng, book_ids, AUTHORS_PER_BOOK, author_cdf, author_popularity)
+        book_genres = get_relation_pairs(rng, book_ids, GENRES_PER_BOOK, genre_cdf, genre_popularity)
+        with transaction.atomic(using=using):
+            insert_batches(Book, ('id', 'title', 'slug', 'year_of_publication', 'image', 'file', 'updated_at'),
+                           rows, using)
+            insert_batches(Book.authors.through, ('book_id', 'author_id'),
+                           [(int(book), author_id + int(author)) for book, author in book_authors], using)
+            insert_batches(Book.genre.through, ('book_id', 'genre_id'),
+                           [(int(book), genre_id + int(genre)) for book, genre in book_genres], using)
+        report.books += size
+        if progress:
+            progress(report)
+
+    if not options.books:
+        return report
+    rng = get_rng(seed, 2)
+    book_cdf, book_popularity = get_zipf_cdf(options.books, options.zipf), rng.permutation(options.books)
+    mean = np.log(max(options.books_per_user, 1)) - LIBRARY_SIZE_SIGMA ** 2 / 2
+    history = datetime.timedelta(days=options.history_days).total_seconds()
+    for chunk, start in enumerate(range(0, options.users, DATASET_CHUNK_SIZE)):
+        rng = get_rng(seed, 3, chunk)
+        size = min(DATASET_CHUNK_SIZE, options.users - start)
+        library_sizes = np.clip(np.floor(rng.lognormal(mean, LIBRARY_SIZE_SIGMA, size)).astype(np.int64),
+                                0, min(MAX_LIBRARY_SIZE, options.books))
+        users = np.repeat(np.arange(size), library_sizes)
+        books = sample_zipf(rng, book_cdf, book_popularity, len(users))
+        # a user owns a book once
+        codes = np.unique(users * options.books + books)
+        users, books = user_id + start + codes // options.books, book_id + codes % options.books
+        is_read = rng.random(len(codes)) < READ_SHARE
+        added_ago = rng.random(len(codes)) * history
+        read_ago = np.maximum(added_ago - rng.exponential(READ_DELAY_DAYS * 86400, len(codes)), 0)
+
+        events = [(int(user), int(book), ReadingEvent.Action.ADD,
+                   adapt_datetime(until - datetime.timedelta(seconds=float(ago))))
+                  for user, book, ago in zip(users, books, added_ago)]
+        events += [(int(user), int(book), ReadingEvent.Action.READ,
+                    adapt_datetime(until - datetime.timedelta(seconds=float(ago))))
+                   for user, book, ago in zip(users[is_read], books[is_read], read_ago[is_read])]
+        with transaction.atomic(using=using):
+            insert_batches(UserBookInstance, ('user_id', 'book_id', 'is_read'),
+                           [(int(user), int(book), bool(read)) for user, book, read in zip(users, books, is_read)],
+                           using)
+            insert_batches(ReadingEvent, ('user_id', 'book_id', 'action', 'created_at'), events, using)
+        report.instances += len(codes)
+        report.events += len(events)
+        if progress:
+            progress(report)
+
+    reset_sequences([Country, Genre, Author, Book, get_user_model()], using)
+    return report
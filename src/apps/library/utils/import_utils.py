@@ -0,0 +1,345 @@
+import csv
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.core.exceptions import ValidationError
+from django.db import transaction, connections, DEFAULT_DB_ALIAS
+from django.db.models.constants import OnConflict
+from django.utils.text import slugify as django_slugify
+
+from ..models import Country, Author, Genre, Book
+from ..signals import books_imported
+from .cache_utils import bump_catalog_version, bump_book_genres_version
+from .search_utils import index_books
+from .similarity_utils import index_similar_books
+
+IMPORT_BATCH_SIZE = 1000
+
+# the same author, genre and country names repeat across the whole input
+slugify = lru_cache(maxsize=2 ** 16)(django_slugify)
+
+# sqlite limits the number of variables in a statement
+QUERY_CHUNK_SIZE = 500
+
+# the fields that are not checked per row: slugs are allocated in bulk, files are not imported,
+# relations are resolved by the import
+BOOK_CLEAN_EXCLUDE = ['slug', 'image', 'file', 'authors', 'genre', 'added_by', 'updated_at']
+AUTHOR_CLEAN_EXCLUDE = ['slug', 'country']
+GENRE_CLEAN_EXCLUDE = ['slug']
+COUNTRY_CLEAN_EXCLUDE = ['slug']
+
+
+@dataclass
+class ImportRow:
+    """
+    A book parsed from the input, authors are (first_name, last_name, country name or None) tuples.
+    A line that could not be parsed has the error instead.
+    """
+    line: int
+    title: str
+    year_of_publication: int | str | None
+    description: str | None = None
+    authors: list[tuple[str, str, str | None]] = field(default_factory=list)
+    genres: list[str] = field(default_factory=list)
+    error: str | None = None
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    errors: list[tuple[int, str]] = field(default_factory=list)
+
+
+def split_list(value) -> list[str]:
+    """
+    Split a ';' separated string (or take a list) into stripped non-empty items.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    return [item.strip() for item in value if item and item.strip()]
+
+
+def parse_author(value, country: str | None = None) -> tuple[str, str, str | None]:
+    """
+    Parse an author from 'First Last' or {'first_name', 'last_name', 'country'}.
+    """
+    if isinstance(value, dict):
+        return value.get('first_name', '').strip(), value.get('last_name', '').strip(), value.get('country', country)
+    first_name, _, last_name = value.strip().rpartition(' ')
+    return first_name, last_name, country
+
+
+def get_full_name(first_name: str, last_name: str) -> str:
+    return ' '.join(name for name in (first_name, last_name) if name)
+
+
+def make_row(line: int, data: dict) -> ImportRow:
+    country = (data.get('country') or '').strip() or None
+    authors = data.get('authors')
+    if isinstance(authors, str):
+        authors = split_list(authors)
+    return ImportRow(
+        line=line,
+        title=(data.get('title') or '').strip(),
+        year_of_publication=data.get('year_of_publication'),
+        description=data.get('description') or None,
+        authors=[parse_author(author, country) for author in authors or []],
+        genres=split_list(data.get('genres', data.get('genre'))),
+    )
+
+
+def parse_csv(stream) -> Iterator[ImportRow]:
+    """
+    Read books from csv with the columns: title, year_of_publication, description,
+    authors and genres (';' separated) and an optional country of the authors.
+    """
+    for line, data in enumerate(csv.DictReader(stream), start=2):
+        yield make_row(line, data)
+
+
+def make_invalid_row(line: int, error: str) -> ImportRow:
+    return ImportRow(line=line, title='', year_of_publication=None, error=error)
+
+
+def parse_jsonl(stream) -> Iterator[ImportRow]:
+    """
+    Read books from json lines with the same keys as csv, authors and genres can be lists.
+    Lines that are not json objects are reported like invalid rows.
+    """
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            yield make_invalid_row(line, f'Invalid JSON: {e}')
+            continue
+        if not isinstance(data, dict):
+            yield make_invalid_row(line, 'Line should be a JSON object')
+            continue
+        try:
+            row = make_row(line, data)
+        except (AttributeError, TypeError):
+            row = make_invalid_row(line, 'Invalid value types, authors and genres should be strings or lists')
+        yield row
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def chunked(values: list, size: int = QUERY_CHUNK_SIZE) -> Iterator[list]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def allocate_unique_slugs(model, slugs: list[str], using: str = DEFAULT_DB_ALIAS) -> list[str]:
+    """
+    Make the slugs unique among themselves and the stored rows by adding '-2', '-3'... suffixes.
+    Costs a query per round of collisions instead of a query per row.
+    """
+    max_length = model._meta.get_field('slug').max_length
+    bases = [slug[:max_length] for slug in slugs]
+    result = list(bases)
+    suffixes = {}
+    taken = set()
+    pending = list(range(len(result)))
+    while pending:
+        candidates = list({result[i] for i in pending})
+        existing = set()
+        for chunk in chunked(candidates):
+            existing.update(model.objects.using(using).filter(slug__in=chunk).values_list('slug', flat=True))
+        collided = []
+        for i in pending:
+            if result[i] in existing or result[i] in taken:
+                base = bases[i]
+                suffixes[base] = suffixes.get(base, 1) + 1
+                suffix = f'-{suffixes[base]}'
+                result[i] = base[:max_length - len(suffix)] + suffix
+                collided.append(i)
+            else:
+                taken.add(result[i])
+        pending = collided
+    return result
+
+
+def get_ids_by_slug(model, slugs: list[str], using: str = DEFAULT_DB_ALIAS) -> dict[str, int]:
+    ids = {}
+    for chunk in chunked(slugs):
+        ids.update(model.objects.using(using).filter(slug__in=chunk).values_list('slug', 'id'))
+    return ids
+
+
+def upsert_by_slug(model, values: dict[str, dict], using: str = DEFAULT_DB_ALIAS) -> dict[str, int]:
+    """
+    Insert the rows (field values by slug) that don't exist yet and return ids of all of them by slug.
+    """
+    ids = get_ids_by_slug(model, list(values), using)
+    missing = [model(slug=slug, **values[slug]) for slug in values if slug not in ids]
+    if missing:
+        # conflicts come only from concurrent imports, the existing rows are kept
+        model.objects.using(using).bulk_create(missing, ignore_conflicts=True, batch_size=QUERY_CHUNK_SIZE)
+        ids.update(get_ids_by_slug(model, [obj.slug for obj in missing], using))
+    return ids
+
+
+def insert_rows(model, columns: tuple[str, ...], rows: list[tuple], using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Insert rows of values of the columns into the table of the model with a single executemany,
+    skipping rows that violate a unique constraint. Avoids building a model instance per row like bulk_create does.
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    sql = (f"{connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} "
+           f"{quote_name(model._meta.db_table)} ({', '.join(quote_name(column) for column in columns)}) "
+           f"VALUES ({', '.join(['%s'] * len(columns))}) "
+           f"{connection.ops.on_conflict_suffix_sql([], OnConflict.IGNORE, None, None)}")
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def get_related_errors(model, instances: list[tuple[int, str, object]], exclude: list[str]) -> dict[int, list[str]]:
+    """
+    Validate the authors, genres or countries of the rows given as (row index, name, instance),
+    return the error messages by row index. Unique checks are left out, the import reuses the stored rows.
+    """
+    errors = model.bulk_full_clean([instance for _, _, instance in instances], exclude=exclude,
+                                   validate_unique=False)
+    messages = defaultdict(list)
+    for j, error in errors.items():
+        i, name, _ = instances[j]
+        details = '; '.join(f'{field_name}: {message}'
+                            for field_name, field_messages in error.message_dict.items() for message in field_messages)
+        messages[i].append(f'{model._meta.verbose_name.capitalize()} "{name}": {details}')
+    return messages
+
+
+def validate_rows(rows: list[ImportRow], report: ImportReport,
+                  using: str = DEFAULT_DB_ALIAS) -> list[tuple[ImportRow, Book]]:
+    """
+    Validate the rows without database queries, invalid rows are added to the report.
+    """
+    valid = []
+    books = [Book(title=row.title, year_of_publication=row.year_of_publication, description=row.description)
+             for row in rows]
+    book_errors = Book.bulk_full_clean(books, exclude=BOOK_CLEAN_EXCLUDE, using=using)
+    authors, genres, countries = [], [], []
+    for i, row in enumerate(rows):
+        for first_name, last_name, country in row.authors:
+            full_name = get_full_name(first_name, last_name)
+            authors.append((i, full_name, Author(first_name=first_name, last_name=last_name, full_name=full_name)))
+            if country:
+                countries.append((i, country, Country(name=country)))
+        genres += [(i, name, Genre(name=name)) for name in row.genres]
+    related_errors = defaultdict(list)
+    for model, instances, exclude in ((Author, authors, AUTHOR_CLEAN_EXCLUDE), (Genre, genres, GENRE_CLEAN_EXCLUDE),
+                                      (Country, countries, COUNTRY_CLEAN_EXCLUDE)):
+        for i, messages in get_related_errors(model, instances, exclude).items():
+            related_errors[i] += messages
+
+    for i, (row, book) in enumerate(zip(rows, books)):
+        try:
+            if row.error:
+                raise ValidationError(row.error)
+            if i in book_errors:
+                raise book_errors[i]
+            if not row.authors:
+                raise ValidationError('Book should have at least one author')
+            if not row.genres:
+                raise ValidationError('Book should have at least one genre')
+            if i in related_errors:
+                raise ValidationError(related_errors[i])
+            # the related rows are looked up by slug
+            if not all(slugify(get_full_name(first_name, last_name)) for first_name, last_name, _ in row.authors):
+                raise ValidationError('Author name should not be empty')
+            if not all(slugify(name) for name in row.genres):
+                raise ValidationError('Genre name should not be empty')
+            if not all(slugify(country) for _, _, country in row.authors if country):
+                raise ValidationError('Country name should not be empty')
+        except ValidationError as e:
+            report.errors.append((row.line, '; '.join(e.messages)))
+            continue
+        valid.append((row, book))
+    return valid
+
+
+def import_batch(rows: list[ImportRow], report: ImportReport, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Validate and write a batch of books with their authors, genres and countries in one transaction.
+    """
+    valid = validate_rows(rows, report, using)
+    if not valid:
+        return
+
+    with transaction.atomic(using=using):
+        countries = {slugify(name): {'name': name} for row, _ in valid for _, _, name in row.authors if name}
+        country_ids = upsert_by_slug(Country, countries, using)
+
+        genres = {slugify(name): {'name': name} for row, _ in valid for name in row.genres}
+        genre_ids = upsert_by_slug(Genre, genres, using)
+
+        authors = {}
+        for row, _ in valid:
+            for first_name, last_name, country in row.authors:
+                full_name = get_full_name(first_name, last_name)
+                if slugify(full_name) in authors and not country:
+                    continue
+                authors[slugify(full_name)] = {
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'full_name': full_name,
+                    'country_id': country_ids.get(slugify(country)) if country else None,
+                }
+        author_ids = upsert_by_slug(Author, authors, using)
+
+        books = [book for _, book in valid]
+        slugs = allocate_unique_slugs(Book, [slugify(book.title) or 'book' for book in books], using)
+        for book, slug in zip(books, slugs):
+            book.slug = slug
+        books = Book.objects.using(using).bulk_create(books, batch_size=QUERY_CHUNK_SIZE)
+        if any(book.pk is None for book in books):
+            # the backend can't return ids of inserted rows
+            ids = get_ids_by_slug(Book, slugs, using)
+            for book in books:
+                book.pk = ids[book.slug]
+
+        book_authors = []
+        book_genres = []
+        for (row, _), book in zip(valid, books):
+            book_authors += [(book.pk, author_ids[slugify(get_full_name(first_name, last_name))])
+                             for first_name, last_name, _ in row.authors]
+            book_genres += [(book.pk, genre_ids[slugify(name)]) for name in row.genres]
+        insert_rows(Book.authors.through, ('book_id', 'author_id'), book_authors, using)
+        insert_rows(Book.genre.through, ('book_id', 'genre_id'), book_genres, using)
+
+        # bulk writes send no signals, keep the search and similar books indexes in sync here
+        index_books([book.pk for book in books], using)
+        index_similar_books([book.pk for book in books], using)
+        books_imported.send(sender=Book, book_ids=[book.pk for book in books])
+        # the books are visible from the commit of the batch, not from the end of the import
+        transaction.on_commit(bump_catalog_version, using=using)
+        transaction.on_commit(bump_book_genres_version, using=using)
+
+    report.imported += len(books)
+
+
+def import_books(rows: Iterable[ImportRow], batch_size: int = IMPORT_BATCH_SIZE,
+                 using: str = DEFAULT_DB_ALIAS, progress=None) -> ImportReport:
+    """
+    Import books from parsed rows in batches, memory use is bounded by the batch size.
+    progress is called with the report after every batch.
+    """
+    report = ImportReport()
+    for batch in batched(rows, batch_size):
+        import_batch(batch, report, using)
+        if progress:
+            progress(report)
+    return report
@@ -1,6 +1,12 @@
-from django.core.exceptions import ValidationError
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
+from django.db.models import Q
 from django.db.models.fields.files import FieldFile
 
+# sqlite limits the number of variables in a statement
+UNIQUE_CHECK_CHUNK_SIZE = 500
+
 
 def validate_file_size(size_in_mb, file: FieldFile):
     """
@@ -42,6 +48,40 @@ def validate_book_size(file):
     validate_file_size(max_size, file)
 
 
+def get_unique_errors(instances: list, unique_checks,
+                      using: str | None = None) -> dict[int, dict[str, list[ValidationError]]]:
+    """
+    Find unique violations of the instances among themselves and the stored rows of the given database,
+    with a query per chunk of values instead of a query per instance.
+    """
+    errors = defaultdict(lambda: defaultdict(list))
+    for model_class, unique_check in unique_checks:
+        # the same keys as Model.validate_unique uses
+        key_name = unique_check[0] if len(unique_check) == 1 else NON_FIELD_ERRORS
+        attnames = [model_class._meta.get_field(name).attname for name in unique_check]
+        keys = {}
+        for i, instance in enumerate(instances):
+            key = tuple(getattr(instance, attname) for attname in attnames)
+            if None in key:
+                continue
+            if key in keys:
+                errors[i][key_name].append(instance.unique_error_message(model_class, unique_check))
+            else:
+                keys[key] = i
+        key_list = list(keys)
+        chunk_size = UNIQUE_CHECK_CHUNK_SIZE // len(attnames)
+        for start in range(0, len(key_list), chunk_size):
+            query = Q()
+            for key in key_list[start:start + chunk_size]:
+                query |= Q(**dict(zip(attnames, key)))
+            stored = model_class._default_manager.using(using).filter(query).values_list(*attnames, 'pk')
+            for *key, pk in stored:
+                i = keys[tuple(key)]
+                if instances[i].pk != pk:
+                    errors[i][key_name].append(instances[i].unique_error_message(model_class, unique_check))
+    return errors
+
+
 class FullCleanBeforeSaveMixin:
     """
     A mixin that ensures full cleaning before saving a model instance.
@@ -50,6 +90,35 @@ class FullCleanBeforeSaveMixin:
     def save(self, *args, **kwargs):
         """
         Overrides the save method to perform full cleaning before saving the model instance.
+        With update_fields only the updated fields are validated, they may be given by name or attname.
         """
-        self.full_clean()
+        exclude = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            updated = {self._meta.get_field(name).name for name in update_fields}
+            exclude = {field.name for field in self._meta.fields} - updated
+        self.full_clean(exclude=exclude)
         super().save(*args, **kwargs)
+
+    @classmethod
+    def bulk_full_clean(cls, instances, exclude=None, validate_unique=True,
+                        using: str | None = None) -> dict[int, ValidationError]:
+        """
+        Validate many instances at once, unique checks cost a query per chunk of instances
+        on the given database (the routed one when None).
+        Return errors by the index of the invalid instance.
+        """
+        instances = list(instances)
+        exclude = set(exclude or ())
+        errors = defaultdict(dict)
+        for i, instance in enumerate(instances):
+            try:
+                instance.clean_fields(exclude=exclude)
+                instance.clean()
+            except ValidationError as e:
+                errors[i] = e.update_error_dict(errors[i])
+        if validate_unique and instances:
+            unique_checks, _ = instances[0]._get_unique_checks(exclude=exclude)
+            for i, unique_errors in get_unique_errors(instances, unique_checks, using).items():
+                errors[i] = ValidationError(unique_errors).update_error_dict(errors[i])
+        return {i: ValidationError(error_dict) for i, error_dict in errors.items() if error_dict}
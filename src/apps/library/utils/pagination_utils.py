@@ -0,0 +1,94 @@
+from django.core import signing
+from django.core.exceptions import BadRequest
+from django.db.models import QuerySet, Q
+
+CURSOR_SALT = 'library.keyset-cursor'
+
+
+def get_ordering_keys(queryset: QuerySet) -> list[str]:
+    """
+    Return the ordering of the queryset as a list of field names ('-' prefix for descending),
+    with the primary key appended as a tiebreaker to make the ordering unique.
+    """
+    pk_name = queryset.model._meta.pk.name
+    keys = [key for key in queryset.query.order_by if isinstance(key, str)]
+    if not {key.lstrip('-') for key in keys} & {pk_name, 'pk'}:
+        keys.append(pk_name)
+    return keys
+
+
+def encode_cursor(obj, keys: list[str]) -> str:
+    """
+    Encode the position of the object in the ordering as an opaque token.
+    """
+    values = [getattr(obj, key.lstrip('-')) for key in keys]
+    return signing.dumps({'keys': keys, 'values': values}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token: str, keys: list[str]) -> list:
+    """
+    Decode a cursor token created for the same ordering, or raise BadRequest.
+    """
+    try:
+        cursor = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise BadRequest('Invalid cursor')
+    if cursor.get('keys') != keys:
+        raise BadRequest('Cursor does not match the ordering')
+    return cursor['values']
+
+
+def filter_after_cursor(queryset: QuerySet, keys: list[str], values: list) -> QuerySet:
+    """
+    Filter the queryset to the rows placed after the cursor values in the given ordering:
+    a >= x AND ((a > x) OR (a = x AND b > y) OR ...), the bound of the first key makes the page
+    a range scan of the (a, b, ...) index instead of a scan from its start.
+    """
+    keyset_q = Q()
+    equal_q = Q()
+    for key, value in zip(keys, values):
+        field = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        keyset_q |= equal_q & Q(**{f'{field}__{lookup}': value})
+        equal_q &= Q(**{field: value})
+    if keys:
+        first_key = keys[0]
+        first_lookup = 'lte' if first_key.startswith('-') else 'gte'
+        keyset_q &= Q(**{f'{first_key.lstrip("-")}__{first_lookup}': values[0]})
+    return queryset.filter(keyset_q)
+
+
+class KeysetPaginationMixin:
+    """
+    Keyset (cursor) pagination for list views. Every page costs the same index range scan,
+    the position is passed in the 'cursor' request parameter and the next one is put in context.
+    Next pages are rendered with page_template_name if it is set.
+    """
+    page_size = 24
+    cursor_kwarg = 'cursor'
+    page_template_name = None
+
+    def paginate_keyset(self, queryset: QuerySet) -> QuerySet:
+        """
+        Return the page of the queryset that follows the cursor from the request.
+        """
+        self.ordering_keys = get_ordering_keys(queryset)
+        queryset = queryset.order_by(*self.ordering_keys)
+        token = self.request.GET.get(self.cursor_kwarg)
+        if token:
+            values = decode_cursor(token, self.ordering_keys)
+            queryset = filter_after_cursor(queryset, self.ordering_keys, values)
+        return queryset[:self.page_size]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = list(self.object_list)
+        context['next_cursor'] = None
+        if len(page) == self.page_size:
+            context['next_cursor'] = encode_cursor(page[-1], self.ordering_keys)
+        return context
+
+    def get_template_names(self):
+        if self.page_template_name and self.request.GET.get(self.cursor_kwarg):
+            return [self.page_template_name]
+        return super().get_template_names()
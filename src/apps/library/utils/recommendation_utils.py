@@ -0,0 +1,116 @@
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import Book, BookNeighbor, UserBookInstance
+from .cache_utils import bump_recommendations_version, get_recommendations_version, make_catalog_key, \
+    CATALOG_CACHE_TIMEOUT
+
+RECOMMENDATIONS_TOP = 10
+RECOMMENDATIONS_PAGE_LIMIT = 5
+# libraries with more books say little about each of them and cost k^2 pairs
+MAX_USER_BOOKS = 1000
+# limits the memory of the pairs expanded at once
+PAIR_CHUNK_SIZE = 5_000_000
+NEIGHBOR_BATCH_SIZE = 1000
+
+
+def get_group_pairs(starts: np.ndarray, sizes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return positions of all ordered pairs of distinct entries within every group of consecutive entries.
+    """
+    pair_counts = sizes * sizes
+    offsets = np.arange(pair_counts.sum()) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+    group_sizes = np.repeat(sizes, pair_counts)
+    group_starts = np.repeat(starts, pair_counts)
+    left = group_starts + offsets // group_sizes
+    right = group_starts + offsets % group_sizes
+    distinct = left != right
+    return left[distinct], right[distinct]
+
+
+def count_cooccurrences(user_ids: np.ndarray, book_indexes: np.ndarray, books: int,
+                        max_user_books: int = MAX_USER_BOOKS) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Count common readers of every pair of books from the entries of the sparse user x book matrix.
+    Return the pairs as codes (book index * books + other book index) with their counts,
+    and the number of readers of every book.
+    """
+    order = np.argsort(user_ids, kind='stable')
+    book_indexes = book_indexes[order]
+    _, starts, sizes = np.unique(user_ids[order], return_index=True, return_counts=True)
+    used = (sizes > 1) & (sizes <= max_user_books)
+    readers = np.bincount(book_indexes[np.repeat(used, sizes)], minlength=books)
+    starts, sizes = starts[used], sizes[used]
+
+    pair_totals = np.cumsum(sizes * sizes)
+    codes, counts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    chunk_start = 0
+    while chunk_start < len(sizes):
+        done = pair_totals[chunk_start - 1] if chunk_start else 0
+        chunk_end = max(int(np.searchsorted(pair_totals, done + PAIR_CHUNK_SIZE, 'right')), chunk_start + 1)
+        left, right = get_group_pairs(starts[chunk_start:chunk_end], sizes[chunk_start:chunk_end])
+        chunk_codes, chunk_counts = np.unique(book_indexes[left] * books + book_indexes[right], return_counts=True)
+        codes.append(chunk_codes)
+        counts.append(chunk_counts)
+        chunk_start = chunk_end
+    codes, inverse = np.unique(np.concatenate(codes), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(codes)).astype(np.int64)
+    return codes, counts, readers
+
+
+def compute_book_neighbors(user_ids: np.ndarray, book_ids: np.ndarray, top: int = RECOMMENDATIONS_TOP,
+                           min_common: int = 1, max_user_books: int = MAX_USER_BOOKS) -> np.ndarray:
+    """
+    Rank the books of every book by the cosine similarity of their reader sets,
+    common readers / sqrt(readers of the book * readers of the other book).
+    Return rows of (book_id, neighbor_id, rank, score) with at most top neighbors per book.
+    """
+    ids, book_indexes = np.unique(book_ids, return_inverse=True)
+    codes, counts, readers = count_cooccurrences(user_ids, book_indexes, len(ids), max_user_books)
+    common = counts >= min_common
+    codes, counts = codes[common], counts[common]
+    left, right = codes // len(ids), codes % len(ids)
+    scores = counts / np.sqrt(readers[left] * readers[right])
+
+    order = np.lexsort((right, -scores, left))
+    left, right, scores = left[order], right[order], scores[order]
+    _, group_starts, group_sizes = np.unique(left, return_index=True, return_counts=True)
+    ranks = np.arange(len(left)) - np.repeat(group_starts, group_sizes)
+    kept = ranks < top
+    return np.rec.fromarrays([ids[left[kept]], ids[right[kept]], ranks[kept], scores[kept]],
+                             names='book_id,neighbor_id,rank,score')
+
+
+def build_recommendations(top: int = RECOMMENDATIONS_TOP, min_common: int = 1,
+                          max_user_books: int = MAX_USER_BOOKS) -> int:
+    """
+    Recompute the neighbors of all books from the users libraries and replace the stored ones.
+    Return the number of stored neighbors.
+    """
+    instances = np.array(list(UserBookInstance.objects.values_list('user_id', 'book_id')),
+                         dtype=np.int64).reshape(-1, 2)
+    rows = compute_book_neighbors(instances[:, 0], instances[:, 1], top, min_common, max_user_books)
+    with transaction.atomic():
+        BookNeighbor.objects.all().delete()
+        BookNeighbor.objects.bulk_create([
+            BookNeighbor(book_id=int(row.book_id), neighbor_id=int(row.neighbor_id), rank=int(row.rank),
+                         score=float(row.score))
+            for row in rows
+        ], batch_size=NEIGHBOR_BATCH_SIZE)
+    bump_recommendations_version()
+    return len(rows)
+
+
+def get_book_neighbors(book, limit: int = RECOMMENDATIONS_PAGE_LIMIT) -> list[Book]:
+    """
+    Return the books read by the readers of the book, from one lookup of the (book, rank) index,
+    cached until the recommendations are rebuilt or the catalog changes.
+    """
+    key = make_catalog_key('library:recommendations', get_recommendations_version(), book.pk, limit)
+    neighbors = cache.get(key)
+    if neighbors is None:
+        neighbors = [neighbor.neighbor for neighbor in BookNeighbor.objects.filter(
+            book=book, rank__lt=limit).select_related('neighbor').order_by('rank')]
+        cache.set(key, neighbors, CATALOG_CACHE_TIMEOUT)
+    return neighbors
@@ -0,0 +1,144 @@
+import re
+from collections import defaultdict
+from functools import cache
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from ..models import Book
+
+SEARCH_TABLE = 'library_book_search'
+
+# bm25 weights for the title, authors and genres columns
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+# keeps the number of sql parameters per statement below the sqlite limit
+SEARCH_INDEX_CHUNK_SIZE = 500
+
+
+@cache
+def is_search_index_supported(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Check that the database can hold the full-text search index (sqlite compiled with fts5).
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Create the full-text search table. Return True if the table was created.
+    """
+    connection = connections[using]
+    if SEARCH_TABLE in connection.introspection.table_names():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            f"title, authors, genres, tokenize='unicode61 remove_diacritics 2')"
+        )
+    return True
+
+
+def get_search_documents(book_ids, using: str = DEFAULT_DB_ALIAS) -> list[tuple[int, str, str, str]]:
+    """
+    Build search documents (id, title, authors, genres) for the given books.
+    """
+    titles = dict(Book.objects.using(using).filter(pk__in=book_ids).values_list('id', 'title'))
+    authors = defaultdict(list)
+    genres = defaultdict(list)
+    author_rows = Book.authors.through.objects.using(using).filter(
+        book_id__in=titles).values_list('book_id', 'author__full_name')
+    genre_rows = Book.genre.through.objects.using(using).filter(
+        book_id__in=titles).values_list('book_id', 'genre__name')
+    for book_id, full_name in author_rows:
+        authors[book_id].append(full_name)
+    for book_id, name in genre_rows:
+        genres[book_id].append(name)
+    return [
+        (book_id, title, ' '.join(authors[book_id]), ' '.join(genres[book_id]))
+        for book_id, title in titles.items()
+    ]
+
+
+def remove_books_from_search_index(book_ids, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Remove the given books from the search index.
+    """
+    if not is_search_index_supported(using):
+        return
+    book_ids = list(book_ids)
+    with connections[using].cursor() as cursor:
+        for i in range(0, len(book_ids), SEARCH_INDEX_CHUNK_SIZE):
+            chunk = book_ids[i:i + SEARCH_INDEX_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", chunk)
+
+
+def index_books(book_ids, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Add or refresh the given books in the search index.
+    """
+    if not is_search_index_supported(using):
+        return
+    book_ids = list(book_ids)
+    remove_books_from_search_index(book_ids, using)
+    with connections[using].cursor() as cursor:
+        for i in range(0, len(book_ids), SEARCH_INDEX_CHUNK_SIZE):
+            documents = get_search_documents(book_ids[i:i + SEARCH_INDEX_CHUNK_SIZE], using)
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, authors, genres) VALUES (%s, %s, %s, %s)",
+                documents,
+            )
+
+
+def rebuild_search_index(using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Rebuild the search index from scratch. Return the number of indexed books.
+    """
+    if not is_search_index_supported(using):
+        return 0
+    create_search_index(using)
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        book_ids = list(Book.objects.using(using).values_list('id', flat=True))
+        index_books(book_ids, using)
+    return len(book_ids)
+
+
+def build_match_expression(query: str) -> str | None:
+    """
+    Convert a user query into a fts5 phrase where every token is matched as a prefix,
+    e.g. 'new boo' -> '"new"* + "boo"*'.
+    """
+    tokens = re.findall(r'\w+', query.lower())
+    if not tokens:
+        return None
+    return ' + '.join(f'"{token}"*' for token in tokens)
+
+
+def match_book_ids(match_expression: str) -> RawSQL:
+    """
+    Subquery selecting ids of the books matching the fts5 expression.
+    """
+    return RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", (match_expression,))
+
+
+def search_rank(match_expression: str) -> RawSQL:
+    """
+    Bm25 rank of a book for the fts5 expression, lower is more relevant.
+    Books that don't match the expression get rank 0, after all matching books.
+    """
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    return RawSQL(
+        f"COALESCE((SELECT bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND rowid = {Book._meta.db_table}.id), 0.0)",
+        (match_expression,),
+        output_field=FloatField(),
+    )
@@ -0,0 +1,197 @@
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.http import Http404
+
+from ..models import Book, BookMinHash, BookLSHBand
+from .cache_utils import get_similarity_version, bump_similarity_version, CATALOG_CACHE_TIMEOUT
+
+# changing the permutations or the bands requires `manage.py rebuild_similarity_index`
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+MINHASH_SEED = 20240301
+# mersenne prime of the universal hashes (a * x + b) % p, the products fit in 64 bits
+MINHASH_PRIME = (1 << 31) - 1
+# bands of 4 rows make books with a jaccard similarity from about 0.4 candidates and keep the buckets small
+# candidates sharing most buckets ranked by their signatures
+SIMILAR_CANDIDATES = 200
+# larger buckets are skipped, they are shared by too many books to tell the similar ones apart
+# and reading them whole would make the lookup grow with the catalog
+SIMILAR_BUCKET_LIMIT = 200
+SIMILAR_BOOKS_LIMIT = 10
+MAX_SIMILAR_BOOKS_LIMIT = 50
+# keeps the number of sql parameters per statement below the sqlite limit
+SIMILARITY_INDEX_CHUNK_SIZE = 500
+
+_rng = np.random.default_rng(MINHASH_SEED)
+HASH_A = _rng.integers(1, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+HASH_B = _rng.integers(0, MINHASH_PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+BookGenre = Book.genre.through
+BookAuthor = Book.authors.through
+
+
+def get_title_tokens(title: str) -> set[str]:
+    return {token for token in re.findall(r'\w+', title.lower()) if len(token) > 2}
+
+
+def get_book_features(book_ids: list[int], using: str = DEFAULT_DB_ALIAS) -> dict[int, set[str]]:
+    """
+    Return the features of the books: authors, genres, decade of publication and title words.
+    """
+    features = defaultdict(set)
+    for book_id, title, year in Book.objects.using(using).filter(pk__in=book_ids).values_list(
+            'id', 'title', 'year_of_publication'):
+        features[book_id].add(f'y:{year // 10}')
+        features[book_id].update(f't:{token}' for token in get_title_tokens(title))
+    for book_id, author_id in BookAuthor.objects.using(using).filter(book_id__in=book_ids).values_list(
+            'book_id', 'author_id'):
+        features[book_id].add(f'a:{author_id}')
+    for book_id, genre_id in BookGenre.objects.using(using).filter(book_id__in=book_ids).values_list(
+            'book_id', 'genre_id'):
+        features[book_id].add(f'g:{genre_id}')
+    return features
+
+
+def compute_signatures(feature_sets: list[set[str]]) -> np.ndarray:
+    """
+    Return the MinHash signatures of the feature sets, one row of MINHASH_PERMUTATIONS values per set.
+    """
+    sizes = np.array([len(features) for features in feature_sets])
+    hashes = np.fromiter((zlib.crc32(feature.encode()) % MINHASH_PRIME
+                          for features in feature_sets for feature in sorted(features)),
+                         dtype=np.uint64, count=int(sizes.sum()))
+    values = (hashes[:, None] * HASH_A + HASH_B) % MINHASH_PRIME
+    starts = np.cumsum(sizes) - sizes
+    return np.minimum.reduceat(values, starts, axis=0).astype(np.uint32)
+
+
+def compute_buckets(signatures: np.ndarray) -> np.ndarray:
+    """
+    Hash every band of LSH_ROWS signature values to a bucket, one row of LSH_BANDS buckets per signature.
+    """
+    bands = signatures.astype(np.uint64).reshape(len(signatures), LSH_BANDS, LSH_ROWS)
+    buckets = np.zeros(bands.shape[:2], dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for row in range(LSH_ROWS):
+            buckets = buckets * BAND_MULTIPLIER + bands[:, :, row]
+    return buckets.view(np.int64)
+
+
+def index_similar_books(book_ids, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Add or refresh the signatures and buckets of the given books in the similar books index.
+    """
+    book_ids = list(book_ids)
+    quote_name = connections[using].ops.quote_name
+    minhash_table, band_table = quote_name(BookMinHash._meta.db_table), quote_name(BookLSHBand._meta.db_table)
+    for i in range(0, len(book_ids), SIMILARITY_INDEX_CHUNK_SIZE):
+        chunk = book_ids[i:i + SIMILARITY_INDEX_CHUNK_SIZE]
+        features = get_book_features(chunk, using)
+        indexed_ids = list(features)
+        placeholders = ', '.join(['%s'] * len(chunk))
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {minhash_table} WHERE book_id IN ({placeholders})", chunk)
+            cursor.execute(f"DELETE FROM {band_table} WHERE book_id IN ({placeholders})", chunk)
+            if not indexed_ids:
+                continue
+            signatures = compute_signatures([features[book_id] for book_id in indexed_ids])
+            buckets = compute_buckets(signatures)
+            cursor.executemany(
+                f"INSERT INTO {minhash_table} (book_id, signature) VALUES (%s, %s)",
+                [(book_id, signature.tobytes()) for book_id, signature in zip(indexed_ids, signatures)],
+            )
+            cursor.executemany(
+                f"INSERT INTO {band_table} (book_id, band, bucket) VALUES (%s, %s, %s)",
+                [(book_id, band, bucket) for book_id, book_buckets in zip(indexed_ids, buckets.tolist())
+                 for band, bucket in enumerate(book_buckets)],
+            )
+        transaction.on_commit(bump_similarity_version, using=using)
+
+
+def rebuild_similarity_index(using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Rebuild the similar books index from scratch. Return the number of indexed books.
+    """
+    with transaction.atomic(using=using):
+        BookMinHash.objects.using(using).all().delete()
+        BookLSHBand.objects.using(using).all().delete()
+        book_ids = list(Book.objects.using(using).values_list('id', flat=True))
+        index_similar_books(book_ids, using)
+    return len(book_ids)
+
+
+def get_candidates_sql(bands: int, using: str = DEFAULT_DB_ALIAS) -> str:
+    """
+    Return the sql selecting the signatures of the books sharing most buckets with the book.
+    Every bucket is read from the covering (band, bucket, book) index up to SIMILAR_BUCKET_LIMIT + 1 books,
+    the buckets over the limit are skipped and the books of the others are ranked by the number
+    of shared buckets before the candidates are limited.
+    """
+    quote_name = connections[using].ops.quote_name
+    band_table, minhash_table = quote_name(BookLSHBand._meta.db_table), quote_name(BookMinHash._meta.db_table)
+    bucket_sql = (f"SELECT book_id, COUNT(*) OVER () AS size FROM "
+                  f"(SELECT book_id FROM {band_table} WHERE band = %s AND bucket = %s LIMIT %s) bucket")
+    buckets_sql = ' UNION ALL '.join([bucket_sql] * bands)
+    candidates_sql = (f"SELECT book_id, COUNT(*) AS shared FROM ({buckets_sql}) buckets "
+                      f"WHERE size <= %s AND book_id != %s GROUP BY book_id ORDER BY shared DESC, book_id LIMIT %s")
+    return (f"SELECT candidate.book_id, minhash.signature FROM ({candidates_sql}) candidate "
+            f"JOIN {minhash_table} minhash ON minhash.book_id = candidate.book_id")
+
+
+def find_similar_books(book_id: int, limit: int = SIMILAR_BOOKS_LIMIT,
+                       using: str = DEFAULT_DB_ALIAS) -> list[tuple[int, float]]:
+    """
+    Return up to limit (book_id, estimated jaccard similarity) of the books most similar to the book.
+    Candidates share an LSH bucket with the book, they are ranked by the agreement
+    of their signatures with the signature of the book.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        # a raw query, building a queryset costs as much as running it
+        cursor.execute(f"SELECT signature FROM {connection.ops.quote_name(BookMinHash._meta.db_table)} "
+                       f"WHERE book_id = %s", [book_id])
+        row = cursor.fetchone()
+        if row is None:
+            return []
+        signature = np.frombuffer(bytes(row[0]), dtype=np.uint32)
+        if len(signature) != MINHASH_PERMUTATIONS:
+            # indexed with other parameters, the index has to be rebuilt
+            return []
+        params = []
+        for band, bucket in enumerate(compute_buckets(signature[None, :])[0].tolist()):
+            params += [band, bucket, SIMILAR_BUCKET_LIMIT + 1]
+        cursor.execute(get_candidates_sql(LSH_BANDS, using),
+                       [*params, SIMILAR_BUCKET_LIMIT, book_id, SIMILAR_CANDIDATES])
+        rows = cursor.fetchall()
+    if not rows:
+        return []
+    candidate_ids = [candidate_id for candidate_id, _ in rows]
+    candidates = np.frombuffer(b''.join(bytes(candidate_signature) for _, candidate_signature in rows),
+                               dtype=np.uint32).reshape(-1, MINHASH_PERMUTATIONS)
+    scores = (candidates == signature).mean(axis=1)
+    order = np.lexsort((candidate_ids, -scores))[:limit]
+    return [(candidate_ids[i], float(scores[i])) for i in order]
+
+
+def get_similar_books(book_id: int, limit: int = SIMILAR_BOOKS_LIMIT) -> list[dict]:
+    """
+    Return the books similar to the book with their titles, cached until the similar books index changes, or 404.
+    """
+    key = f'library:similar:{get_similarity_version()}:{book_id}:{limit}'
+    similar = cache.get(key)
+    if similar is None:
+        if not Book.objects.filter(pk=book_id).exists():
+            raise Http404('No book found')
+        scores = find_similar_books(book_id, limit)
+        books = Book.objects.in_bulk([similar_id for similar_id, _ in scores])
+        similar = [{'id': similar_id, 'title': books[similar_id].title, 'slug': books[similar_id].slug,
+                    'score': score} for similar_id, score in scores if similar_id in books]
+        cache.set(key, similar, CATALOG_CACHE_TIMEOUT)
+    return similar
@@ -1,17 +1,100 @@
+import hashlib
+
+from django.conf import settings
 from django.core.exceptions import BadRequest
-from django.db.models import QuerySet, Case, When, BooleanField, Q
+from django.db import transaction, connections
+from django.db.models import QuerySet, Case, When, BooleanField, Q, Value
+from django.db.models.constants import OnConflict
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils.text import slugify
 
 from utils.orm import parse_int_or_none
-from ..models import UserBookInstance
+from ..models import Book, UserBookInstance, ReadingEvent
+from .cache_utils import (
+    get_read_book_ids,
+    get_catalog_version,
+    get_catalog_modified,
+    get_user_library_version,
+    get_user_library_modified,
+    get_recommendations_version,
+    get_recommendations_modified,
+)
+from ..signals import book_instances_changed
+from .search_utils import is_search_index_supported, build_match_expression, match_book_ids, search_rank
+from .similarity_utils import SIMILAR_BOOKS_LIMIT, MAX_SIMILAR_BOOKS_LIMIT
+
+# limits batch requests, ids are passed as sql parameters
+MAX_BOOKS_PER_REQUEST = 500
 
 
 def create_book_instance(book, user) -> None:
     """
-    Create a book instance for a given user.
+    Create a book instance for a given user, does nothing if the book is already in the user's library.
+    """
+    add_books_to_user_library([book.pk], user)
+
+
+def add_books_to_user_library(book_ids: list[int], user) -> int:
+    """
+    Add the existing books to the user's library with a single INSERT, skipping books already there.
+    Return the number of added books.
+    """
+    connection = connections[UserBookInstance.objects.db]
+    quote_name = connection.ops.quote_name
+    meta = UserBookInstance._meta
+    columns = ', '.join(quote_name(meta.get_field(name).column) for name in ('user', 'book', 'is_read'))
+    book_id = quote_name(Book._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    returning = can_return_from_update(connection)
+    with transaction.atomic(using=connection.alias):
+        if not returning:
+            added_ids = list(Book.objects.using(connection.alias).filter(pk__in=book_ids).exclude(
+                instances__user=user).values_list('pk', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} {quote_name(meta.db_table)} "
+                f"({columns}) SELECT %s, {book_id}, %s FROM {quote_name(Book._meta.db_table)} "
+                f"WHERE {book_id} IN ({placeholders}) "
+                f"{connection.ops.on_conflict_suffix_sql([], OnConflict.IGNORE, None, None)}"
+                f"{get_returning_book_id_sql(connection) if returning else ''}",
+                (user.pk, False, *book_ids),
+            )
+            if returning:
+                added_ids = [row[0] for row in cursor.fetchall()]
+    if added_ids:
+        book_instances_changed.send(sender=UserBookInstance, user_id=user.pk, book_ids=added_ids,
+                                    action=ReadingEvent.Action.ADD)
+    return len(added_ids)
+
+
+def remove_books_from_user_library(book_ids: list[int], user) -> int:
+    """
+    Remove the books from the user's library with a single DELETE. Return the number of removed books.
     """
-    UserBookInstance.objects.create(book=book, user=user)
+    connection = connections[UserBookInstance.objects.db]
+    quote_name = connection.ops.quote_name
+    meta = UserBookInstance._meta
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    returning = can_return_from_update(connection)
+    with transaction.atomic(using=connection.alias):
+        if not returning:
+            removed_ids = list(UserBookInstance.objects.using(connection.alias).filter(
+                user=user, book_id__in=book_ids).values_list('book_id', flat=True))
+        with connection.cursor() as cursor:
+            # a queryset delete would fetch the rows first to send the delete signals
+            cursor.execute(
+                f"DELETE FROM {quote_name(meta.db_table)} WHERE {quote_name(meta.get_field('user').column)} = %s "
+                f"AND {quote_name(meta.get_field('book').column)} IN ({placeholders})"
+                f"{get_returning_book_id_sql(connection) if returning else ''}",
+                (user.pk, *book_ids),
+            )
+            if returning:
+                removed_ids = [row[0] for row in cursor.fetchall()]
+    if removed_ids:
+        book_instances_changed.send(sender=UserBookInstance, user_id=user.pk, book_ids=removed_ids,
+                                    action=ReadingEvent.Action.REMOVE)
+    return len(removed_ids)
 
 
 def get_book_instance(book, user) -> UserBookInstance:
@@ -21,9 +104,178 @@ def get_book_instance(book, user) -> UserBookInstance:
     return get_object_or_404(UserBookInstance, user=user, book=book)
 
 
+def can_return_from_update(connection) -> bool:
+    # mariadb returns columns from INSERT and DELETE, but not from UPDATE
+    return connection.features.can_return_columns_from_insert and connection.vendor != 'mysql'
+
+
+def get_returning_book_id_sql(connection) -> str:
+    return f" RETURNING {connection.ops.quote_name(UserBookInstance._meta.get_field('book').column)}"
+
+
+def toggle_book_read_status(book_id, user) -> bool:
+    """
+    Flip the read status of a book in the user's library with a single UPDATE
+    and return the new status, or 404 if the book is not in the library.
+    """
+    queryset = UserBookInstance.objects.filter(user=user, book_id=book_id)
+    connection = connections[queryset.db]
+    if can_return_from_update(connection):
+        meta = UserBookInstance._meta
+        quote_name = connection.ops.quote_name
+        is_read = quote_name(meta.get_field('is_read').column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {quote_name(meta.db_table)} SET {is_read} = NOT {is_read} "
+                f"WHERE {quote_name(meta.get_field('user').column)} = %s "
+                f"AND {quote_name(meta.get_field('book').column)} = %s RETURNING {is_read}",
+                (user.pk, book_id),
+            )
+            row = cursor.fetchone()
+    else:
+        with transaction.atomic(using=queryset.db):
+            updated = queryset.update(is_read=Case(When(is_read=True, then=Value(False)), default=Value(True)))
+            row = queryset.values_list('is_read').first() if updated else None
+    if row is None:
+        raise Http404('No book in the user library')
+    is_read = bool(row[0])
+    book_instances_changed.send(sender=UserBookInstance, user_id=user.pk, book_ids=[int(book_id)],
+                                action=ReadingEvent.Action.READ if is_read else ReadingEvent.Action.UNREAD)
+    return is_read
+
+
+def set_books_read_status(book_ids: list[int], user, is_read: bool) -> int:
+    """
+    Mark the books in the user's library read or unread in one transaction.
+    Return the number of books which status changed.
+    """
+    instances = UserBookInstance.objects.filter(user=user)
+    with transaction.atomic():
+        changed_ids = list(instances.select_for_update().filter(book_id__in=book_ids).exclude(
+            is_read=is_read).values_list('book_id', flat=True))
+        if changed_ids:
+            instances.filter(book_id__in=changed_ids).update(is_read=is_read)
+    if changed_ids:
+        book_instances_changed.send(sender=UserBookInstance, user_id=user.pk, book_ids=changed_ids,
+                                    action=ReadingEvent.Action.READ if is_read else ReadingEvent.Action.UNREAD)
+    return len(changed_ids)
+
+
+def parse_book_ids(request) -> list[int]:
+    """
+    Get book ids from the 'book_id' parameters of the request, or raise BadRequest.
+    """
+    book_ids = {parse_int_or_none(value) for value in request.POST.getlist('book_id')}
+    if not book_ids or None in book_ids:
+        raise BadRequest('Invalid book ids')
+    if len(book_ids) > MAX_BOOKS_PER_REQUEST:
+        raise BadRequest(f'No more than {MAX_BOOKS_PER_REQUEST} books per request')
+    return sorted(book_ids)
+
+
+def parse_read_status(request) -> bool:
+    """
+    Get the read status from the 'is_read' parameter of the request, or raise BadRequest.
+    """
+    match request.POST.get('is_read'):
+        case 'true' | '1':
+            return True
+        case 'false' | '0':
+            return False
+    raise BadRequest('Invalid read status')
+
+
+def parse_similar_books_limit(request) -> int:
+    """
+    Get the number of similar books from the 'limit' GET parameter.
+    """
+    value = request.GET.get('limit')
+    if value is None:
+        return SIMILAR_BOOKS_LIMIT
+    limit = parse_int_or_none(value)
+    if limit is None or not 0 < limit <= MAX_SIMILAR_BOOKS_LIMIT:
+        raise BadRequest(f'limit must be a number from 1 to {MAX_SIMILAR_BOOKS_LIMIT}')
+    return limit
+
+
+def get_book_queryset() -> QuerySet:
+    """
+    Queryset of books for the book page, cached until the catalog changes.
+    """
+    return Book.objects.prefetch_related('authors', 'genre').cache_by_catalog()
+
+
+def get_book_by_slug(slug) -> Book | None:
+    """
+    Get a book for the book page by slug, or None.
+    """
+    try:
+        return get_book_queryset().filter(slug=slug).get()
+    except Book.DoesNotExist:
+        return None
+
+
+def make_etag(*parts) -> str:
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def get_user_etag_parts(request) -> tuple:
+    """
+    Parts of an ETag that depend on the user: the user's library version and the csrf cookie,
+    so pages with forms are refetched after the csrf token rotates on login.
+    """
+    user = request.user
+    if user.is_authenticated:
+        return user.pk, get_user_library_version(user.pk), request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    return None, None, None
+
+
+def get_last_modified(request, *dates):
+    """
+    Return the latest of the given dates and the user's library modification time,
+    or None if any of them is unknown.
+    """
+    if request.user.is_authenticated:
+        dates += (get_user_library_modified(request.user.pk),)
+    if None in dates:
+        return None
+    return max(dates)
+
+
+def library_etag(request, *args, **kwargs) -> str:
+    """
+    ETag of a library listing page, computed without database queries.
+    """
+    return make_etag('library', request.get_full_path(), get_catalog_version(), *get_user_etag_parts(request))
+
+
+def library_last_modified(request, *args, **kwargs):
+    return get_last_modified(request, get_catalog_modified())
+
+
+def book_etag(request, slug) -> str | None:
+    """
+    ETag of a book page, computed from the cached book.
+    """
+    book = get_book_by_slug(slug)
+    if book is None:
+        return None
+    return make_etag('book', book.pk, book.updated_at, get_recommendations_version(), *get_user_etag_parts(request))
+
+
+def book_last_modified(request, slug):
+    book = get_book_by_slug(slug)
+    if book is None:
+        return None
+    # recommendations may never have been built
+    dates = [date for date in (book.updated_at, get_recommendations_modified()) if date is not None]
+    return get_last_modified(request, *dates)
+
+
 def annotate_books_with_read_flag(queryset, user) -> QuerySet:
     """
     Annotate books in the queryset with a read flag indicating whether the user has read them.
+    Needed only to sort by the flag, otherwise use flag_books_with_read_set.
     Work only for authenticated users!
     """
     if user.is_authenticated:
@@ -38,19 +290,40 @@ def annotate_books_with_read_flag(queryset, user) -> QuerySet:
     return queryset
 
 
-def search_books(queryset: QuerySet, query: str | None) -> QuerySet:
+def flag_books_with_read_set(queryset, user) -> QuerySet:
+    """
+    Flag fetched books with `read` from the cached read set of the user, the query doesn't depend on the user.
+    Work only for authenticated users!
+    """
+    if user.is_authenticated:
+        queryset = queryset.flag_read(get_read_book_ids(user))
+    return queryset
+
+
+def search_books(queryset: QuerySet, query: str | None, rank: bool = False) -> QuerySet:
     """
     Search books in the queryset based on the given query.
+    Titles, authors and genres are looked up in the full-text search index, books are annotated with
+    a search rank when rank is set, it costs a bm25 subquery per book. Fall back to a slug scan
+    if the database has no search index.
     """
     if query:
-        query = slugify(query.strip())
-        multi_q = Q(
-            Q(slug__icontains=query) |
-            Q(authors__slug__icontains=query) |
-            Q(genre__slug__icontains=query) |
-            Q(year_of_publication__exact=parse_int_or_none(query))
-        )
-        queryset = queryset.filter(multi_q)
+        year_q = Q(year_of_publication__exact=parse_int_or_none(query))
+        if is_search_index_supported(queryset.db):
+            match_expression = build_match_expression(query)
+            if match_expression:
+                if rank:
+                    queryset = queryset.annotate(search_rank=search_rank(match_expression))
+                queryset = queryset.filter(Q(pk__in=match_book_ids(match_expression)) | year_q)
+        else:
+            query = slugify(query.strip())
+            multi_q = Q(
+                Q(slug__icontains=query) |
+                Q(authors__slug__icontains=query) |
+                Q(genre__slug__icontains=query) |
+                year_q
+            )
+            queryset = queryset.filter(multi_q).distinct()
     return queryset
 
 
@@ -67,6 +340,8 @@ def sort_books(queryset: QuerySet, sort_by) -> QuerySet:
             queryset = queryset.order_by('year_of_publication')
         case 'read':
             queryset = queryset.order_by('-read')
+        case 'relevance' if 'search_rank' in queryset.query.annotations:
+            queryset = queryset.order_by('search_rank', '-id')
         case _:
             queryset = queryset.order_by('-id')
     return queryset
@@ -76,7 +351,7 @@ def books_dependency_query(queryset: QuerySet) -> QuerySet:
     """
     Perform dependency queries on the book queryset
     """
-    return queryset.prefetch_related('authors', 'genre').distinct()
+    return queryset.prefetch_related('authors', 'genre')
 
 
 class UserBookFilterMixin:
@@ -99,15 +374,18 @@ class SearchBookMixin:
         """
         Perform book search based on request parameters:
         - q: search query
-        - sorted: sort by title, year_of_publication, latest, read, (default: latest)
+        - sorted: sort by title, year_of_publication, latest, read, relevance (default: latest)
         """
         get_q = self.request.GET.get('q')
         get_sorted = self.request.GET.get('sorted')
         if get_sorted == 'read' and not self.request.user.is_authenticated:
             raise BadRequest("Authentication required")
 
-        queryset = annotate_books_with_read_flag(queryset, self.request.user)
-        queryset = search_books(queryset, get_q)
+        if get_sorted == 'read':
+            queryset = annotate_books_with_read_flag(queryset, self.request.user)
+        else:
+            queryset = flag_books_with_read_set(queryset, self.request.user)
+        queryset = search_books(queryset, get_q, rank=get_sorted == 'relevance')
         queryset = sort_books(queryset, get_sorted)
         queryset = books_dependency_query(queryset)
         return queryset
@@ -1,18 +1,37 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import HttpResponse
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse_lazy
-from django.views.decorators.http import require_POST
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST, condition
+from django.views.decorators.vary import vary_on_cookie
 from django.views.generic import FormView, ListView, DetailView
 
 from .forms import BookForm
 from .models import Book, UserBookInstance
+from .utils.cache_utils import get_user_library_counts
+from .utils.pagination_utils import KeysetPaginationMixin
+from .utils.recommendation_utils import get_book_neighbors
+from .utils.similarity_utils import get_similar_books
 from .utils.views_utils import (
     SearchBookMixin,
     UserBookFilterMixin,
     create_book_instance, get_book_instance,
+    add_books_to_user_library,
+    remove_books_from_user_library,
+    toggle_book_read_status,
+    set_books_read_status,
+    parse_book_ids,
+    parse_read_status,
+    parse_similar_books_limit,
+    get_book_queryset,
+    library_etag,
+    library_last_modified,
+    book_etag,
+    book_last_modified,
 )
 
 
@@ -43,50 +62,103 @@ def remove_book_from_user_library_view(request: WSGIRequest, id):
     return redirect('library:book', slug=book.slug)
 
 
+@require_POST
+@login_required
+def add_books_to_user_library_view(request: WSGIRequest):
+    """
+    Add many books to the user's library, takes 'book_id' list parameter.
+    """
+    added = add_books_to_user_library(parse_book_ids(request), request.user)
+    return JsonResponse({'added': added})
+
+
+def similar_books_view(request: WSGIRequest, id: int):
+    """
+    Return the books similar to the book by authors, genres, decade and title words,
+    takes optional 'limit' parameter.
+    """
+    limit = parse_similar_books_limit(request)
+    return JsonResponse({'book_id': id, 'similar': get_similar_books(id, limit)})
+
+
+@require_POST
+@login_required
+def remove_books_from_user_library_view(request: WSGIRequest):
+    """
+    Remove many books from the user's library, takes 'book_id' list parameter.
+    """
+    removed = remove_books_from_user_library(parse_book_ids(request), request.user)
+    return JsonResponse({'removed': removed})
+
+
 @require_POST
 @login_required
 def change_book_read_status_view(request: WSGIRequest, id):
     """
-    Change the read status of a book in the user's library.
+    Change the read status of a book in the user's library, respond with the checkbox in the new state.
     """
-    book = get_object_or_404(Book, id=id)
-    user_book_instance = get_book_instance(book, request.user)
-    user_book_instance.is_read = not user_book_instance.is_read
-    user_book_instance.save()
-    return HttpResponse(status=200)
+    is_read = toggle_book_read_status(id, request.user)
+    return render(request, 'library/read_status_checkbox.html', {'book_id': id, 'is_read': is_read})
+
+
+@require_POST
+@login_required
+def change_books_read_status_view(request: WSGIRequest):
+    """
+    Mark many books in the user's library read or unread, takes 'book_id' list and 'is_read' parameters.
+    """
+    book_ids = parse_book_ids(request)
+    is_read = parse_read_status(request)
+    updated = set_books_read_status(book_ids, request.user, is_read)
+    return JsonResponse({'is_read': is_read, 'updated': updated})
 
 
+@method_decorator(condition(etag_func=book_etag, last_modified_func=book_last_modified), name='dispatch')
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(vary_on_cookie, name='dispatch')
 class BookView(DetailView):
     """
     View for displaying details of a book, in the book page.
+    Support conditional GET, repeat visits get 304 while the book and the user's library are unchanged.
     """
     model = Book
     template_name = 'library/book.html'
     context_object_name = 'book'
 
+    def get_queryset(self):
+        return get_book_queryset()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        book = context.get('book')
+        context['also_read'] = get_book_neighbors(book)
         user = self.request.user
         if user.is_authenticated:
-            book = context.get('book')
             user_book_instance = UserBookInstance.objects.filter(user=user, book=book).first()
             context['user_book_instance'] = user_book_instance
         return context
 
 
-class LibraryView(SearchBookMixin, ListView):
+@method_decorator(condition(etag_func=library_etag, last_modified_func=library_last_modified), name='dispatch')
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(vary_on_cookie, name='dispatch')
+class LibraryView(SearchBookMixin, KeysetPaginationMixin, ListView):
     """
     View for displaying a list of existing books on the library page,
     implementing search and sorting functionality, base on request query.
+    Books are paginated by cursor, next pages are loaded by the infinite scroll.
+    Support conditional GET, repeat visits get 304 while the catalog and the user's library are unchanged.
     """
     model = Book
     template_name = 'library/library.html'
+    page_template_name = 'library/book_list_page.html'
     context_object_name = 'books'
 
     def get_queryset(self):
         queryset = super().get_queryset()
         queryset = self.search_book(queryset)
-        return queryset
+        queryset = self.paginate_keyset(queryset)
+        return queryset.cache_by_catalog()
 
 
 class LibrarySearchView(LibraryView):
@@ -96,20 +168,28 @@ class LibrarySearchView(LibraryView):
     template_name = 'library/book_list.html'
 
 
-class UserLibraryView(LoginRequiredMixin, UserBookFilterMixin, ListView):
+class UserLibraryView(LoginRequiredMixin, UserBookFilterMixin, KeysetPaginationMixin, ListView):
     """
     View for displaying list books in user library, full page. Implementing filtering functionality.
+    Books are paginated by cursor, the latest added first.
     """
     model = UserBookInstance
     template_name = 'library/user_library.html'
+    page_template_name = 'library/user_book_list_page.html'
     context_object_name = 'user_books'
 
     def get_queryset(self):
         queryset = super().get_queryset()
         queryset = queryset.select_related('book')
         queryset = self.user_book_filter(queryset)
+        queryset = self.paginate_keyset(queryset.order_by('-id'))
         return queryset
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['library_counts'] = get_user_library_counts(self.request.user)
+        return context
+
 
 class UserLibraryFilterView(UserLibraryView):
     """
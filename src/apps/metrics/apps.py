@@ -0,0 +1,15 @@
+import atexit
+
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class MetricsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.metrics'
+
+    def ready(self):
+        from .utils import add_query_recorder, add_query_capture, flush_metrics
+        connection_created.connect(add_query_recorder)
+        connection_created.connect(add_query_capture)
+        atexit.register(flush_metrics)
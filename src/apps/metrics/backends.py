@@ -0,0 +1,36 @@
+import time
+
+from django.template.backends import django as django_backend
+
+from .utils import get_request_metrics
+
+
+class Template(django_backend.Template):
+    """
+    Template adding its render time to the metrics of the request.
+    """
+
+    def render(self, context=None, request=None):
+        metrics = get_request_metrics()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.add_template(time.perf_counter() - start)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    The django templates backend, recording the render time of the templates in the request metrics.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django_backend.TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,70 @@
+import time
+
+from .utils import (
+    track_request_metrics,
+    exclude_from_request_metrics,
+    record_request,
+    is_profiling_requested,
+    profile_request,
+    save_profile,
+)
+
+# label of the requests matching no url, the paths themselves would make a label value each
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+def get_view_name(request) -> str:
+    resolver_match = getattr(request, 'resolver_match', None)
+    return resolver_match.view_name if resolver_match else UNRESOLVED_VIEW
+
+
+def get_response_size(response) -> int | None:
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """
+    Record by url name the requests, their latency, response size, SQL queries and template render time.
+    Put it first, so the latency covers the other middlewares.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with track_request_metrics() as metrics:
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start - metrics.excluded_seconds
+        record_request(get_view_name(request), request.method, response.status_code, seconds,
+                       get_response_size(response), metrics)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile the requests of staff users sent with the X-Profile header or the _profile query parameter,
+    the profile is saved to PROFILES_DIR and its name returned in the X-Profile-Id header.
+    Put it after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_profiling_requested(request):
+            return self.get_response(request)
+        start = time.perf_counter()
+        with profile_request() as (profile, profiler):
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+        if profiler is None:
+            # another profiler is active in the thread
+            return response
+        # the explained queries and the written files are not part of the request
+        with exclude_from_request_metrics():
+            response['X-Profile-Id'] = save_profile(request, response, profile, profiler, seconds)
+        return response
@@ -0,0 +1,141 @@
+import re
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from apps.library.models import Book
+from apps.metrics.utils import collect_metrics, render_metrics
+from apps.metrics.utils.registry import MetricsRegistry, REQUESTS, REQUEST_DURATION
+from utils.tests.utils import create_book_in_db
+
+
+def get_sample(text: str, name: str, view: str, suffix: str = '') -> float | None:
+    """
+    Return the value of the sample of the metric for the view, the first one when it has more labels.
+    """
+    match = re.search(rf'^{name}{suffix}{{[^}}]*view="{re.escape(view)}"[^}}]*}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+class MetricsMiddlewareTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='Metrics Book', year_of_publication=1990)
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(METRICS_DIR=self.directory.name, METRICS_FLUSH_INTERVAL=60)
+        self.settings.enable()
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+        self.settings.disable()
+        self.directory.cleanup()
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics(self):
+        self.client.force_login(get_user_model().objects.get(id=1))
+        responses = [self.client.get(reverse('library:library')) for _ in range(2)]
+        self.client.get('/missing/page/')
+
+        response = self.client.get(reverse('metrics:metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE django_http_request_duration_seconds histogram', text)
+        self.assertIn('django_http_requests_total{method="GET",status="200",view="library:library"} 2.0', text)
+        self.assertIn('django_http_requests_total{method="GET",status="404",view="<unresolved>"} 1.0', text)
+        self.assertEqual(get_sample(text, 'django_http_request_duration_seconds', 'library:library', '_count'), 2)
+        self.assertEqual(get_sample(text, 'django_http_response_size_bytes', 'library:library', '_sum'),
+                         sum(len(response.content) for response in responses))
+        self.assertGreater(get_sample(text, 'django_db_queries_per_request', 'library:library', '_sum'), 0)
+        self.assertGreater(get_sample(text, 'django_db_query_duration_seconds_total', 'library:library'), 0)
+        self.assertGreater(get_sample(text, 'django_template_render_duration_seconds_total', 'library:library'), 0)
+
+        # the metrics are written to the file of the process
+        self.assertEqual(len(list(Path(self.directory.name).glob('metrics-*.json'))), 1)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN='secret')
+    def test_metrics_access(self):
+        url = reverse('metrics:metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer other').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'], METRICS_TOKEN=None):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer None').status_code, 403)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_closed_by_default(self):
+        # the local address is the address of a reverse proxy on the same host
+        self.assertEqual(self.client.get(reverse('metrics:metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+
+class MetricsRegistryTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_registry(self, pid: int) -> MetricsRegistry:
+        registry = MetricsRegistry(self.path, flush_interval=60)
+        registry.pid = pid
+        registry.check_process = lambda: None
+        return registry
+
+    def test_processes_are_summed(self):
+        labels = (('view', 'library:book'),)
+        for pid, seconds in [(1, [0.003, 0.2]), (2, [0.02])]:
+            registry = self.get_registry(pid)
+            for value in seconds:
+                registry.inc(REQUESTS, labels)
+                registry.observe(REQUEST_DURATION, labels, value)
+            registry.flush()
+        # an unreadable file is skipped
+        (self.path / 'metrics-3.json').write_text('{"count')
+
+        text = render_metrics(*collect_metrics(self.path))
+        self.assertIn('django_http_requests_total{view="library:book"} 3.0', text)
+        self.assertIn('django_http_request_duration_seconds_bucket{view="library:book",le="0.005"} 1.0', text)
+        self.assertIn('django_http_request_duration_seconds_bucket{view="library:book",le="0.025"} 2.0', text)
+        self.assertIn('django_http_request_duration_seconds_bucket{view="library:book",le="+Inf"} 3.0', text)
+        self.assertAlmostEqual(get_sample(text, 'django_http_request_duration_seconds', 'library:book', '_sum'), 0.223)
+
+    def test_exited_processes_are_merged(self):
+        labels = (('view', 'library:book'),)
+        for pid in [1, 2, 3]:
+            registry = self.get_registry(pid)
+            registry.inc(REQUESTS, labels)
+            registry.observe(REQUEST_DURATION, labels, 0.003)
+            registry.flush()
+
+        for exited in [{2}, {1, 2, 3}]:
+            with mock.patch('apps.metrics.utils.registry.is_process_alive', lambda pid: pid not in exited):
+                text = render_metrics(*collect_metrics(self.path))
+            self.assertIn('django_http_requests_total{view="library:book"} 3.0', text)
+            self.assertIn('django_http_request_duration_seconds_count{view="library:book"} 3.0', text)
+        self.assertEqual([path.name for path in self.path.glob('metrics-*.json')], ['metrics-exited.json'])
+
+    def test_forked_process_starts_from_zero(self):
+        registry = MetricsRegistry(self.path, flush_interval=60)
+        registry.inc(REQUESTS, (('view', 'library:book'),))
+        registry.pid = -1
+        registry.inc(REQUESTS, (('view', 'library:library'),))
+        self.assertEqual(registry.dump()['counters'], [[REQUESTS.name, (('view', 'library:library'),), 1.0]])
+
+    def test_label_values_are_escaped(self):
+        text = render_metrics({(REQUESTS.name, (('view', 'a"b\\c\nd'),)): 1}, {})
+        self.assertIn(r'django_http_requests_total{view="a\"b\\c\nd"} 1.0', text)
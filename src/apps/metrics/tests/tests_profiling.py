@@ -0,0 +1,99 @@
+import json
+import re
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.library.models import Book
+from apps.metrics.utils import get_registry
+from apps.metrics.utils.registry import QUERIES
+from utils.tests.utils import create_book_in_db
+
+PROFILE_FILES = {'profile.prof', 'profile.folded', 'profile.txt', 'queries.json', 'request.json'}
+
+
+class ProfilingMiddlewareTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='Profiled Book', year_of_publication=1990)
+        self.user = get_user_model().objects.get(id=1)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+        self.metrics_directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(PROFILES_DIR=self.directory.name, METRICS_DIR=self.metrics_directory.name,
+                                          METRICS_FLUSH_INTERVAL=60)
+        self.settings.enable()
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+        self.settings.disable()
+        self.directory.cleanup()
+        self.metrics_directory.cleanup()
+
+    def assertProfileSaved(self, response) -> Path:
+        self.assertEqual(response.status_code, 200)
+        directory = self.path / response['X-Profile-Id']
+        self.assertEqual({path.name for path in directory.iterdir()}, PROFILE_FILES)
+        return directory
+
+    def test_profile_not_in_request_metrics(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('library:library'), {'_profile': '1'})
+        self.assertProfileSaved(response)
+        # the explain queries of the saved profile are left out of the metrics of the request
+        explained = [query for query in captured if query['sql'].startswith('EXPLAIN')]
+        self.assertTrue(explained)
+        _, queries, _ = get_registry().histograms[QUERIES.name, (('view', 'library:library'),)]
+        self.assertEqual(queries, len(captured) - len(explained))
+
+    def test_query_parameter(self):
+        response = self.client.get(reverse('library:library'), {'_profile': '1'})
+        directory = self.assertProfileSaved(response)
+
+        info = json.loads((directory / 'request.json').read_text())
+        self.assertEqual(info['view'], 'library:library')
+        self.assertEqual(info['user'], self.user.username)
+        self.assertGreater(info['queries'], 0)
+
+        queries = json.loads((directory / 'queries.json').read_text())
+        self.assertEqual(len(queries), info['queries'])
+        selects = [query for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        self.assertTrue(all(query['plan'] for query in selects))
+
+        folded = (directory / 'profile.folded').read_text().splitlines()
+        self.assertTrue(folded)
+        self.assertTrue(all(re.fullmatch(r'\S.* \d+', line) for line in folded))
+        self.assertTrue(any('get (' in line for line in folded))
+
+    def test_header(self):
+        response = self.client.get(reverse('library:book', args=['profiled-book']), HTTP_X_PROFILE='1')
+        self.assertProfileSaved(response)
+
+    def test_not_profiled(self):
+        response = self.client.get(reverse('library:library'))
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(reverse('library:library'), {'_profile': '1'}, HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.client.logout()
+        response = self.client.get(reverse('library:library'), {'_profile': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(list(self.path.iterdir()), [])
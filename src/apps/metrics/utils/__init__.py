@@ -0,0 +1,13 @@
+from .registry import (
+    get_registry,
+    get_request_metrics,
+    track_request_metrics,
+    exclude_from_request_metrics,
+    record_request,
+    add_query_recorder,
+    flush_metrics,
+    collect_metrics,
+    RequestMetrics,
+)
+from .exposition import render_metrics, CONTENT_TYPE
+from .profiling import is_profiling_requested, profile_request, save_profile, add_query_capture
@@ -0,0 +1,50 @@
+from .registry import METRICS, Labels
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label_value(value)}"' for key, value in labels) + '}'
+
+
+def format_value(value: float) -> str:
+    return repr(float(value))
+
+
+def format_bound(bound: float) -> str:
+    return format_value(bound) if bound != float('inf') else '+Inf'
+
+
+def render_metrics(counters: dict, histograms: dict) -> str:
+    """
+    Render the metrics in the prometheus text exposition format.
+    """
+    lines = []
+    for metric in METRICS.values():
+        if metric.type == 'counter':
+            samples = sorted((labels, value) for (name, labels), value in counters.items() if name == metric.name)
+        else:
+            samples = sorted((labels, value) for (name, labels), value in histograms.items() if name == metric.name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for labels, value in samples:
+            if metric.type == 'counter':
+                lines.append(f'{metric.name}{format_labels(labels)} {format_value(value)}')
+                continue
+            buckets, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip([*metric.buckets, float('inf')], buckets):
+                cumulative += bucket_count
+                bucket_labels = (*labels, ('le', format_bound(bound)))
+                lines.append(f'{metric.name}_bucket{format_labels(bucket_labels)} {format_value(cumulative)}')
+            lines.append(f'{metric.name}_sum{format_labels(labels)} {format_value(total)}')
+            lines.append(f'{metric.name}_count{format_labels(labels)} {format_value(count)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,223 @@
+import contextvars
+import cProfile
+import io
+import json
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, DatabaseError, NotSupportedError
+from django.utils import timezone
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAMETER = '_profile'
+# plans of the first unique queries only, a profiled page may run hundreds of them
+MAX_EXPLAINED_QUERIES = 50
+MAX_STACK_DEPTH = 200
+# the stacks taking less are left out of the flamegraph, a call graph has too many paths to walk them all
+MIN_STACK_SECONDS = 0.00005
+STATS_LINES = 60
+
+
+@dataclass(frozen=True)
+class CapturedQuery:
+    alias: str
+    sql: str
+    params: object
+    many: bool
+    seconds: float
+
+
+@dataclass
+class RequestProfile:
+    queries: list[CapturedQuery] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add_query(self, query: CapturedQuery):
+        with self.lock:
+            self.queries.append(query)
+
+
+# the profile of the request being handled, copied to the threads it starts
+_request_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+def capture_query(execute, sql, params, many, context):
+    profile = _request_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(CapturedQuery(context['connection'].alias, sql, params, many,
+                                        time.perf_counter() - start))
+
+
+def add_query_capture(sender, connection, **kwargs):
+    if capture_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture_query)
+
+
+def is_profiling_requested(request) -> bool:
+    """
+    Profiling is asked for by the X-Profile header or the _profile query parameter, staff users only.
+    """
+    if not (request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAMETER)):
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+@contextmanager
+def profile_request():
+    """
+    Run the block under cProfile capturing its queries, yield the profile and the profiler,
+    None when another profiler is active in the thread.
+    The profiler covers the current thread, the queries the threads started by the block run are captured as well,
+    but not their calls: the work run in sync_to_async(thread_sensitive=False) threads, like the concurrent
+    sections of the async general statistics, is missing from the profile and counts in the duration only.
+    """
+    profile = RequestProfile()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        profiler = None
+    token = _request_profile.set(profile)
+    try:
+        yield profile, profiler
+    finally:
+        _request_profile.reset(token)
+        if profiler is not None:
+            profiler.disable()
+
+
+def get_function_name(func: tuple) -> str:
+    filename, line, name = func
+    if filename == '~':
+        # built-in functions
+        return name
+    return f'{name} ({Path(filename).name}:{line})'
+
+
+def get_folded_stacks(stats: pstats.Stats) -> list[str]:
+    """
+    Return the profile as collapsed stacks ('root;child;leaf microseconds' lines) for flamegraph tools.
+    cProfile records caller and callee pairs only, the time of a function called from several stacks is split
+    between them in proportion to the time of the calls from each caller.
+    """
+    children = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, caller_ct) in callers.items():
+            children.setdefault(caller, []).append((func, caller_ct))
+    roots = [func for func, (_, _, _, _, callers) in stats.stats.items() if not callers]
+    # the profiler is enabled inside the middleware chain, the outer middlewares call each other and none
+    # of them is without callers, the function with the most time is where the request starts
+    entry = max(stats.stats, key=lambda func: stats.stats[func][3], default=None)
+    if entry is not None and entry not in roots:
+        roots.append(entry)
+
+    folded = {}
+
+    def walk(func, stack, fraction):
+        _, _, tt, ct, _ = stats.stats[func]
+        if ct * fraction < MIN_STACK_SECONDS:
+            return
+        stack = (*stack, get_function_name(func))
+        folded[stack] = folded.get(stack, 0.0) + tt * fraction
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for child, child_ct in children.get(func, []):
+            total_ct = stats.stats[child][3]
+            # the recursive calls are counted in the time of the outer call
+            if not total_ct or get_function_name(child) in stack:
+                continue
+            walk(child, stack, fraction * child_ct / total_ct)
+
+    for root in roots:
+        walk(root, (), 1.0)
+    return [f'{";".join(stack)} {round(seconds * 1_000_000)}'
+            for stack, seconds in folded.items() if round(seconds * 1_000_000) > 0]
+
+
+def is_explainable(sql: str) -> bool:
+    return bool(re.match(r'\s*(SELECT|WITH)\b', sql, re.IGNORECASE))
+
+
+def explain_queries(queries: list[CapturedQuery]) -> list[dict]:
+    """
+    Return the captured queries with the plans of the first unique SELECT queries.
+    """
+    explained = {}
+    result = []
+    for query in queries:
+        plan = None
+        if not query.many and is_explainable(query.sql):
+            key = query.alias, query.sql
+            if key not in explained and len(explained) < MAX_EXPLAINED_QUERIES:
+                explained[key] = explain_query(query)
+            plan = explained.get(key)
+        result.append({
+            'alias': query.alias,
+            'sql': query.sql,
+            'params': repr(query.params),
+            'duration_ms': query.seconds * 1000,
+            'plan': plan,
+        })
+    return result
+
+
+def explain_query(query: CapturedQuery) -> list | None:
+    connection = connections[query.alias]
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {query.sql}', query.params)
+            return [list(row) for row in cursor.fetchall()]
+    except (DatabaseError, NotSupportedError):
+        return None
+
+
+def save_profile(request, response, profile: RequestProfile, profiler: cProfile.Profile, seconds: float) -> str:
+    """
+    Write the profile of the request to a directory of its own in PROFILES_DIR and return its name:
+    profile.prof for pstats and snakeviz, profile.folded for flamegraph.pl and speedscope, profile.txt
+    with the functions by cumulative time, queries.json with the captured queries and their plans
+    and request.json.
+    """
+    resolver_match = getattr(request, 'resolver_match', None)
+    view = resolver_match.view_name if resolver_match else ''
+    created_at = timezone.now()
+    label = re.sub(r'[^\w-]', '_', view) or 'unresolved'
+    name = f'{created_at:%Y%m%d-%H%M%S}-{label}-{uuid.uuid4().hex[:8]}'
+    directory = Path(settings.PROFILES_DIR) / name
+    directory.mkdir(parents=True)
+
+    profiler.dump_stats(directory / 'profile.prof')
+    stats = pstats.Stats(profiler)
+    (directory / 'profile.folded').write_text('\n'.join(get_folded_stacks(stats)) + '\n')
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(STATS_LINES)
+    (directory / 'profile.txt').write_text(text.getvalue())
+
+    queries = explain_queries(profile.queries)
+    (directory / 'queries.json').write_text(json.dumps(queries, indent=2, default=str))
+    (directory / 'request.json').write_text(json.dumps({
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': view,
+        'status': response.status_code,
+        'user': request.user.get_username(),
+        'created_at': created_at.isoformat(),
+        'duration_ms': seconds * 1000,
+        'queries': len(queries),
+        'queries_ms': sum(query['duration_ms'] for query in queries),
+    }, indent=2))
+    return name
@@ -0,0 +1,321 @@
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+
+FILE_PREFIX = 'metrics-'
+# the metrics of the exited processes merged into one file
+EXITED_FILE_NAME = f'{FILE_PREFIX}exited.json'
+LOCK_FILE_NAME = '.lock'
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    type: str
+    help: str
+    buckets: tuple[float, ...] = ()
+
+
+REQUESTS = Metric('django_http_requests_total', 'counter', 'Requests by view, method and status.')
+REQUEST_DURATION = Metric('django_http_request_duration_seconds', 'histogram', 'Request latency by view.',
+                          (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+RESPONSE_SIZE = Metric('django_http_response_size_bytes', 'histogram', 'Response body size by view.',
+                       (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+QUERIES = Metric('django_db_queries_per_request', 'histogram', 'SQL queries run by a request by view.',
+                 (0, 1, 2, 5, 10, 20, 50, 100, 200))
+QUERY_DURATION = Metric('django_db_query_duration_seconds_total', 'counter', 'Time spent in SQL queries by view.')
+TEMPLATE_DURATION = Metric('django_template_render_duration_seconds_total', 'counter',
+                           'Time spent rendering templates by view.')
+METRICS = {metric.name: metric for metric in
+           [REQUESTS, REQUEST_DURATION, RESPONSE_SIZE, QUERIES, QUERY_DURATION, TEMPLATE_DURATION]}
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Queries and template renders of the current request, the async views add to them from other threads.
+    """
+    queries: int = 0
+    query_seconds: float = 0.0
+    template_seconds: float = 0.0
+    # time of the work done for the request that is not part of it, like saving its profile
+    excluded_seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add_query(self, seconds: float):
+        with self.lock:
+            self.queries += 1
+            self.query_seconds += seconds
+
+    def add_template(self, seconds: float):
+        with self.lock:
+            self.template_seconds += seconds
+
+
+# the metrics of the request being handled, copied to the threads it starts
+_request_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+def get_request_metrics() -> RequestMetrics | None:
+    return _request_metrics.get()
+
+
+@contextmanager
+def track_request_metrics():
+    metrics = RequestMetrics()
+    token = _request_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+
+@contextmanager
+def exclude_from_request_metrics():
+    """
+    Leave the queries, template renders and time of the block out of the metrics of the request.
+    """
+    metrics = _request_metrics.get()
+    token = _request_metrics.set(None)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _request_metrics.reset(token)
+        if metrics is not None:
+            metrics.excluded_seconds += time.perf_counter() - start
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+
+def add_query_recorder(sender, connection, **kwargs):
+    """
+    Install the query recorder as an execute wrapper of every new connection,
+    so the queries of the threads a request starts are recorded as well.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms of the process. They are written to a file of the process in the directory,
+    at most every flush_interval seconds, and the files of all the worker processes are summed on collection.
+    """
+
+    def __init__(self, directory: Path, flush_interval: float):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.counters: dict[tuple[str, Labels], float] = {}
+        # bucket counts, the last one for +Inf, sum and count
+        self.histograms: dict[tuple[str, Labels], list] = {}
+        self.flushed_at = 0.0
+
+    def check_process(self):
+        # a forked worker starts with the counts of its parent, which reports them itself
+        if self.pid != os.getpid():
+            self.reset()
+
+    @property
+    def path(self) -> Path:
+        return self.directory / f'{FILE_PREFIX}{self.pid}.json'
+
+    def inc(self, metric: Metric, labels: Labels, value: float = 1.0):
+        with self.lock:
+            self.check_process()
+            key = metric.name, labels
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, metric: Metric, labels: Labels, value: float):
+        with self.lock:
+            self.check_process()
+            key = metric.name, labels
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(metric.buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(metric.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def dump(self) -> dict:
+        with self.lock:
+            self.check_process()
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, buckets.copy(), total, count]
+                               for (name, labels), (buckets, total, count) in self.histograms.items()],
+            }
+
+    def flush(self, force: bool = False):
+        """
+        Write the metrics to the file of the process, replaced at once so that readers never see it partially.
+        """
+        now = time.monotonic()
+        if not force and now - self.flushed_at < self.flush_interval:
+            return
+        self.flushed_at = now
+        data = self.dump()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_file(self.path, data)
+
+
+def write_file(path: Path, data: dict):
+    """
+    Replace the file at once so that readers never see it partially.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    global _registry
+    directory = Path(settings.METRICS_DIR)
+    with _registry_lock:
+        if _registry is None or _registry.directory != directory:
+            _registry = MetricsRegistry(directory, settings.METRICS_FLUSH_INTERVAL)
+        return _registry
+
+
+def record_request(view: str, method: str, status: int, seconds: float, size: int | None,
+                   metrics: RequestMetrics):
+    """
+    Add the request to the metrics of the process, and write them out if they were not for flush_interval.
+    """
+    registry = get_registry()
+    labels = (('view', view),)
+    registry.inc(REQUESTS, (('method', method), ('status', str(status)), *labels))
+    registry.observe(REQUEST_DURATION, labels, seconds)
+    if size is not None:
+        registry.observe(RESPONSE_SIZE, labels, size)
+    registry.observe(QUERIES, labels, metrics.queries)
+    registry.inc(QUERY_DURATION, labels, metrics.query_seconds)
+    registry.inc(TEMPLATE_DURATION, labels, metrics.template_seconds)
+    registry.flush()
+
+
+def flush_metrics():
+    if _registry is not None:
+        _registry.flush(force=True)
+
+
+def to_labels(labels: list) -> Labels:
+    return tuple((str(key), str(value)) for key, value in labels)
+
+
+def get_file_pid(path: Path) -> int | None:
+    try:
+        return int(path.stem.removeprefix(FILE_PREFIX))
+    except ValueError:
+        return None
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists but belongs to another user
+        return True
+    return True
+
+
+def merge_exited_processes(directory: Path):
+    """
+    Merge the files of the exited processes into one, so that the directory doesn't grow with every restarted
+    worker and the counters keep their values. The processes are looked up on this host, POSIX only.
+    """
+    if os.name != 'posix':
+        return
+    import fcntl
+
+    exited = [path for path in directory.glob(f'{FILE_PREFIX}*.json')
+              if (pid := get_file_pid(path)) is not None and not is_process_alive(pid)]
+    if not exited:
+        return
+    with open(directory / LOCK_FILE_NAME, 'w') as lock:
+        # concurrent collections must not merge a file twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = [path for path in exited if path.exists()]
+        if not exited:
+            return
+        counters, histograms = read_metrics([directory / EXITED_FILE_NAME, *exited])
+        write_file(directory / EXITED_FILE_NAME, {
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [[name, labels, buckets, total, count]
+                           for (name, labels), (buckets, total, count) in histograms.items()],
+        })
+        for path in exited:
+            path.unlink(missing_ok=True)
+
+
+def collect_metrics(directory: Path) -> tuple[dict, dict]:
+    """
+    Return the counters and the histograms summed over the files of all the processes.
+    """
+    if directory.is_dir():
+        merge_exited_processes(directory)
+    return read_metrics(sorted(directory.glob(f'{FILE_PREFIX}*.json')))
+
+
+def read_metrics(paths: list[Path]) -> tuple[dict, dict]:
+    """
+    Return the counters and the histograms summed over the files.
+    """
+    counters, histograms = {}, {}
+    for path in paths:
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            # removed meanwhile
+            continue
+        for name, labels, value in data['counters']:
+            if name in METRICS:
+                key = name, to_labels(labels)
+                counters[key] = counters.get(key, 0.0) + value
+        for name, labels, buckets, total, count in data['histograms']:
+            metric = METRICS.get(name)
+            # the buckets changed since the file was written
+            if metric is None or len(buckets) != len(metric.buckets) + 1:
+                continue
+            key = name, to_labels(labels)
+            histogram = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+            histogram[1] += total
+            histogram[2] += count
+    return counters, histograms
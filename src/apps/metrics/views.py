@@ -0,0 +1,33 @@
+import hmac
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.views.decorators.cache import never_cache
+
+from .utils import get_registry, collect_metrics, render_metrics, CONTENT_TYPE
+
+
+def is_metrics_allowed(request) -> bool:
+    """
+    The metrics are served to the addresses of METRICS_ALLOWED_IPS and to the bearer of METRICS_TOKEN.
+    The addresses are trusted only when the clients connect directly, not through a proxy.
+    """
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+
+
+@never_cache
+def metrics_view(request):
+    """
+    Expose the metrics of all the worker processes in the prometheus text format.
+    """
+    if not is_metrics_allowed(request):
+        raise PermissionDenied
+    get_registry().flush(force=True)
+    counters, histograms = collect_metrics(Path(settings.METRICS_DIR))
+    return HttpResponse(render_metrics(counters, histograms), content_type=CONTENT_TYPE)
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+import plotly
+from django.contrib.staticfiles.finders import BaseFinder
+from django.core.files.storage import FileSystemStorage
+
+
+class PlotlyFinder(BaseFinder):
+    """
+    Static files finder for the plotly.js bundle shipped with the plotly package,
+    so the client always runs the version the figures are built for.
+    """
+    prefix = 'plotly'
+    filename = 'plotly.min.js'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage = FileSystemStorage(location=Path(plotly.__file__).parent / 'package_data')
+        # collectstatic puts the files of the storage under its prefix
+        self.storage.prefix = self.prefix
+
+    def find(self, path, all=False):
+        if path != f'{self.prefix}/{self.filename}':
+            return []
+        match = self.storage.path(self.filename)
+        return [match] if all else match
+
+    def list(self, ignore_patterns):
+        yield self.filename, self.storage
@@ -1,6 +1,29 @@
 from django import forms
 
 from utils.utils import get_minimal_book_year, get_maximal_book_year
+from .models import ReadingActivity
+
+
+DEFAULT_TOP = 10
+MAX_TOP = 50
+
+
+class TopFilterForm(forms.Form):
+    """
+    Form for limiting a chart to the top entries, the rest is shown as one slice.
+    """
+    top = forms.IntegerField(
+        label='Top',
+        required=False,
+        min_value=1,
+        max_value=MAX_TOP,
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('top') is None and 'top' not in self.errors:
+            cleaned_data['top'] = DEFAULT_TOP
+        return cleaned_data
 
 
 class YearFilterForm(forms.Form):
@@ -37,3 +60,26 @@ class YearFilterForm(forms.Form):
         if start_year is not None and end_year is not None and start_year > end_year:
             raise forms.ValidationError("Start year should not be greater than end year.")
         return cleaned_data
+
+
+class GenreFilterForm(YearFilterForm, TopFilterForm):
+    """
+    Form for filtering genres by book publication year range and limiting them to the top entries.
+    """
+
+
+class ActivityFilterForm(forms.Form):
+    """
+    Form for choosing the period of the reading activity buckets.
+    """
+    period = forms.ChoiceField(
+        label='Period',
+        required=False,
+        choices=ReadingActivity.Period.choices,
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('period') and 'period' not in self.errors:
+            cleaned_data['period'] = ReadingActivity.Period.WEEK
+        return cleaned_data
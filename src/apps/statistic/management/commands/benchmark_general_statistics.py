@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.urls import reverse
+
+from apps.library.utils.cache_utils import bump_catalog_version
+from apps.statistic.utils import render_general_statistic_view, arender_general_statistic_view
+from apps.statistic.utils.engine import clear_stats_engine
+
+TEMPLATE_NAME = 'statistic/general_statistics.html'
+
+
+class Command(BaseCommand):
+    help = ('Compare the latency of the sequential and the concurrent general statistics view. '
+            'The catalog cache and the statistics arrays of the process are cleared before every iteration.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=0,
+                            help='Simulated latency of every query in milliseconds, like of a remote database.')
+
+    def handle(self, *args, **options):
+        latency = options['latency'] / 1000
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        request = RequestFactory().get(reverse('statistic:general_statistics'))
+        request.user = AnonymousUser()
+        paths = {
+            'sync': lambda: render_general_statistic_view(request, TEMPLATE_NAME),
+            'async': lambda: async_to_sync(arender_general_statistic_view)(request, TEMPLATE_NAME),
+        }
+
+        if latency:
+            connection_created.connect(add_delay)
+            connection.execute_wrappers.append(delay)
+        try:
+            for name, render in paths.items():
+                render()  # warm up the connections and the figure cache
+                timings = []
+                for _ in range(options['iterations']):
+                    bump_catalog_version()
+                    clear_stats_engine()
+                    start = time.perf_counter()
+                    render()
+                    timings.append((time.perf_counter() - start) * 1000)
+                self.stdout.write(f'{name}: median {statistics.median(timings):.1f} ms, '
+                                  f'min {min(timings):.1f} ms, max {max(timings):.1f} ms')
+        finally:
+            connection_created.disconnect(add_delay)
+            if delay in connection.execute_wrappers:
+                connection.execute_wrappers.remove(delay)
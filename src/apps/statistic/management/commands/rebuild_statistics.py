@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.statistic.utils.rollups import rebuild_statistics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the statistics rollup tables from the catalog and the users libraries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        rebuild_statistics(options['database'])
+        self.stdout.write(self.style.SUCCESS('Statistics rebuilt.'))
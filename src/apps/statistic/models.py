@@ -1,3 +1,82 @@
+from django.contrib.auth import get_user_model
 from django.db import models
 
-# Create your models here.
+from apps.library.models import Author, Genre, Book
+
+
+class GenreYearStat(models.Model):
+    """
+    Rollup of the number of books of a genre published in a year.
+    """
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name='year_stats')
+    year = models.IntegerField()
+    book_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('genre', 'year')
+
+
+class GenreStat(models.Model):
+    """
+    Rollup of how many times books of a genre were added to users libraries and read.
+    """
+    genre = models.OneToOneField(Genre, on_delete=models.CASCADE, primary_key=True, related_name='stat')
+    add_count = models.IntegerField(default=0)
+    read_count = models.IntegerField(default=0)
+
+
+class AuthorStat(models.Model):
+    """
+    Rollup of the number of books of an author and how many times they were added to users libraries and read.
+    """
+    author = models.OneToOneField(Author, on_delete=models.CASCADE, primary_key=True, related_name='stat')
+    book_count = models.IntegerField(default=0, db_index=True)
+    add_count = models.IntegerField(default=0)
+    read_count = models.IntegerField(default=0)
+
+
+class BookStat(models.Model):
+    """
+    Rollup of how many times a book was added to users libraries and read.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='stat')
+    add_count = models.IntegerField(default=0)
+    read_count = models.IntegerField(default=0, db_index=True)
+
+
+class ReadingActivityBase(models.Model):
+    """
+    Rollup of the reading events in a day, a week (starting on Monday) or a month.
+    """
+    class Period(models.TextChoices):
+        DAY = 'day', 'Day'
+        WEEK = 'week', 'Week'
+        MONTH = 'month', 'Month'
+
+    period = models.CharField(max_length=5, choices=Period.choices)
+    start = models.DateField()
+    add_count = models.IntegerField(default=0)
+    remove_count = models.IntegerField(default=0)
+    read_count = models.IntegerField(default=0)
+    unread_count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class ReadingActivity(ReadingActivityBase):
+    """
+    Reading activity of all users.
+    """
+    class Meta:
+        unique_together = ('period', 'start')
+
+
+class UserReadingActivity(ReadingActivityBase):
+    """
+    Reading activity of a user.
+    """
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='reading_activity')
+
+    class Meta:
+        unique_together = ('user', 'period', 'start')
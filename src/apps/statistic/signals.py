@@ -0,0 +1,111 @@
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from apps.library.models import Book, UserBookInstance
+from apps.library.signals import (
+    book_instances_changed,
+    books_imported,
+    reading_events_logged,
+    get_stored_instance_values,
+)
+from .utils.rollups import (
+    BookGenre,
+    BookAuthor,
+    update_genre_stats,
+    update_author_stats,
+    update_book_year,
+    add_books_stats,
+    remove_books_stats,
+    refresh_book_instance_stats,
+    update_reading_activity,
+)
+
+RELATIONS = {
+    BookGenre: ('genre_id', update_genre_stats),
+    BookAuthor: ('author_id', update_author_stats),
+}
+
+
+def get_changed_pairs(through, related_field: str, instance, reverse: bool, pk_set) -> set[tuple[int, int]]:
+    """
+    Return the current (book_id, related_id) pairs touched by a many-to-many change from either side.
+    """
+    if reverse:
+        queryset = through.objects.filter(**{related_field: instance.pk})
+        if pk_set is not None:
+            queryset = queryset.filter(book_id__in=pk_set)
+    else:
+        queryset = through.objects.filter(book_id=instance.pk)
+        if pk_set is not None:
+            queryset = queryset.filter(**{f'{related_field}__in': pk_set})
+    return set(queryset.values_list('book_id', related_field))
+
+
+@receiver(m2m_changed, sender=BookGenre)
+@receiver(m2m_changed, sender=BookAuthor)
+def update_relation_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Count the books added to or removed from genres and authors, from either side of the relation.
+    The pairs are compared before and after the change, ids that were not added or removed are ignored.
+    """
+    related_field, update_stats = RELATIONS[sender]
+    attname = f'_rollup_{related_field}_pairs'
+    if action.startswith('pre_'):
+        setattr(instance, attname, get_changed_pairs(sender, related_field, instance, reverse, pk_set))
+        return
+    old_pairs = getattr(instance, attname, set())
+    new_pairs = get_changed_pairs(sender, related_field, instance, reverse, pk_set)
+    update_stats(new_pairs - old_pairs, 1)
+    update_stats(old_pairs - new_pairs, -1)
+
+
+@receiver(pre_save, sender=Book)
+def collect_book_year(sender, instance: Book, **kwargs):
+    instance._rollup_year = None
+    if not instance._state.adding:
+        instance._rollup_year = Book.objects.filter(pk=instance.pk).values_list(
+            'year_of_publication', flat=True).first()
+
+
+@receiver(post_save, sender=Book)
+def update_book_year_stats(sender, instance: Book, **kwargs):
+    old_year = getattr(instance, '_rollup_year', None)
+    if old_year is not None and old_year != instance.year_of_publication:
+        update_book_year(instance.pk, old_year, instance.year_of_publication)
+
+
+@receiver(pre_delete, sender=Book)
+def remove_book_stats(sender, instance: Book, **kwargs):
+    remove_books_stats([instance.pk])
+
+
+@receiver(books_imported)
+def add_imported_books_stats(sender, book_ids, **kwargs):
+    add_books_stats(book_ids)
+
+
+@receiver(post_save, sender=UserBookInstance)
+def update_saved_instance_stats(sender, instance: UserBookInstance, **kwargs):
+    # the book of the instance can be changed in the admin
+    stored_values = get_stored_instance_values(instance)
+    old_book_id = stored_values[0] if stored_values is not None else None
+    refresh_book_instance_stats({instance.book_id, old_book_id} - {None})
+
+
+@receiver(post_delete, sender=UserBookInstance)
+def update_deleted_instance_stats(sender, instance: UserBookInstance, origin=None, **kwargs):
+    # the stats of deleted books are removed before the delete
+    if isinstance(origin, Book) or isinstance(origin, QuerySet) and origin.model is Book:
+        return
+    refresh_book_instance_stats([instance.book_id])
+
+
+@receiver(book_instances_changed)
+def update_changed_instances_stats(sender, book_ids, **kwargs):
+    refresh_book_instance_stats(book_ids)
+
+
+@receiver(reading_events_logged)
+def update_logged_reading_activity(sender, events, **kwargs):
+    update_reading_activity(events)
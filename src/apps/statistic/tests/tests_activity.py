@@ -0,0 +1,107 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.library.models import Book, UserBookInstance, ReadingEvent
+from apps.library.utils.views_utils import (
+    add_books_to_user_library,
+    remove_books_from_user_library,
+    set_books_read_status,
+    toggle_book_read_status,
+)
+from apps.statistic.models import ReadingActivity, UserReadingActivity
+from apps.statistic.utils.rollups import get_period_starts, rebuild_reading_activity
+from utils.tests.utils import create_book_in_db
+
+Action = ReadingEvent.Action
+
+
+class ReadingActivityTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='First New Book', year_of_publication=1990)
+        create_book_in_db(title='Second New Book', year_of_publication=2000)
+        self.book_ids = list(Book.objects.filter(title__endswith='New Book').values_list('id', flat=True))
+        self.user = get_user_model().objects.get(id=1)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def get_actions(self) -> list[tuple[int, int]]:
+        return list(ReadingEvent.objects.order_by('id').values_list('book_id', 'action'))
+
+    def get_activity(self) -> set[tuple]:
+        counters = ('add_count', 'remove_count', 'read_count', 'unread_count')
+        return (set(ReadingActivity.objects.values_list('period', 'start', *counters))
+                | set(UserReadingActivity.objects.values_list('period', 'start', *counters)))
+
+    def test_reading_events(self):
+        first_id, second_id = self.book_ids
+        add_books_to_user_library([first_id, second_id, 1000], self.user)
+        add_books_to_user_library([first_id], self.user)
+        set_books_read_status([first_id, second_id], self.user, True)
+        set_books_read_status([first_id], self.user, True)
+        toggle_book_read_status(first_id, self.user)
+        remove_books_from_user_library([first_id, 1000], self.user)
+        instance = UserBookInstance.objects.get(book_id=second_id)
+        instance.is_read = False
+        with CaptureQueriesContext(connection) as queries:
+            instance.save()
+        # the reading log and the rollups share the load of the stored instance
+        stored_values_sql = UserBookInstance.objects.filter(pk=instance.pk).values_list(
+            'book_id', 'is_read').order_by('pk')[:1]
+        self.assertEqual([query['sql'] for query in queries.captured_queries].count(str(stored_values_sql.query)), 1)
+        instance.delete()
+        self.assertEqual(self.get_actions(), [
+            (first_id, Action.ADD), (second_id, Action.ADD),
+            (first_id, Action.READ), (second_id, Action.READ),
+            (first_id, Action.UNREAD),
+            (first_id, Action.REMOVE),
+            (second_id, Action.UNREAD),
+            (second_id, Action.REMOVE),
+        ])
+
+        # instances deleted with their book are not logged, the log keeps the events of the book
+        add_books_to_user_library([first_id], self.user)
+        Book.objects.get(pk=first_id).delete()
+        self.assertEqual(ReadingEvent.objects.filter(book=None).count(), 5)
+        self.assertEqual(ReadingEvent.objects.count(), 9)
+
+        today = timezone.localdate()
+        for period, start in get_period_starts(today).items():
+            activity = UserReadingActivity.objects.get(user=self.user, period=period, start=start)
+            self.assertEqual((activity.add_count, activity.remove_count, activity.read_count, activity.unread_count),
+                             (3, 2, 2, 2))
+        activity = self.get_activity()
+        rebuild_reading_activity()
+        self.assertEqual(activity, self.get_activity())
+
+    def test_period_starts(self):
+        self.assertEqual(get_period_starts(datetime.date(2024, 3, 14)), {
+            'day': datetime.date(2024, 3, 14),
+            'week': datetime.date(2024, 3, 11),
+            'month': datetime.date(2024, 3, 1),
+        })
+
+    def test_reading_activity_view(self):
+        add_books_to_user_library(self.book_ids, self.user)
+        self.client.force_login(self.user)
+        url = reverse('statistic:reading_activity_statistic')
+        for period in ('', 'day', 'month'):
+            with self.subTest(period=period):
+                response = self.client.get(url, {'period': period})
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'My reading activity')
+        response = self.client.get(url, {'period': 'year'})
+        self.assertContains(response, 'Select a valid choice.')
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.library.models import Author, Book
+from apps.statistic.utils.authors import get_authors_with_books_count
+from utils.tests.utils import create_book_in_db
+
+
+class AuthorStatisticTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='First New Book', year_of_publication=1990)
+        create_book_in_db(title='Second New Book', year_of_publication=2000)
+        author = Author.objects.create(first_name='Single', last_name='Author')
+        author.books.add(Book.objects.get(title='First New Book'))
+        self.user = get_user_model().objects.get(id=1)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def test_top_authors(self):
+        top_authors, other_count = get_authors_with_books_count(1)
+        self.assertEqual([item['book_count'] for item in top_authors], [3])
+        self.assertEqual(other_count, 4)
+        top_authors, other_count = get_authors_with_books_count(10)
+        self.assertEqual(len(top_authors), 3)
+        self.assertEqual(other_count, 0)
+
+    def test_authors_statistic_view(self):
+        self.client.force_login(self.user)
+        url = reverse('statistic:authors_statistic')
+        response = self.client.get(url, {'top': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '"Other"')
+        response = self.client.get(url, {'top': 0})
+        self.assertContains(response, 'Ensure this value is greater than or equal to 1.')
@@ -0,0 +1,93 @@
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.library.models import Author, Genre, Book, UserBookInstance
+from apps.statistic.models import GenreStat, AuthorStat, BookStat
+from apps.statistic.utils.engine import get_stats_engine, top_n
+from utils.tests.utils import create_book_in_db
+
+
+class StatsEngineTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        for i, year in enumerate([1990, 1990, 2000, 2010]):
+            create_book_in_db(title=f'New Book {i}', year_of_publication=year)
+        self.user = get_user_model().objects.get(id=1)
+        self.other_user = get_user_model().objects.create_user(username='other', password='password')
+        books = list(Book.objects.order_by('id'))
+        genre = Genre.objects.create(name='Other Genre', slug='other-genre')
+        books[2].genre.add(genre)
+        for book in books[1:4]:
+            UserBookInstance.objects.create(user=self.other_user, book=book, is_read=True)
+        UserBookInstance.objects.create(user=self.user, book=books[2], is_read=True)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def assertEngineMatchesDatabase(self):
+        engine = get_stats_engine()
+        self.assertEqual(engine.total_books, Book.objects.count())
+        self.assertEqual(engine.average_year, Book.objects.aggregate(avg=Avg('year_of_publication'))['avg'])
+        self.assertEqual(engine.get_popular_genres(2), list(GenreStat.objects.filter(add_count__gt=0).values(
+            'genre__name', 'add_count').order_by('-add_count', 'genre_id')[:2]))
+        self.assertEqual(engine.get_popular_authors(5), list(AuthorStat.objects.filter(add_count__gt=0).values(
+            'author__full_name', 'add_count').order_by('-add_count', 'author_id')[:5]))
+        self.assertEqual(engine.get_most_read_books(2), list(BookStat.objects.filter(read_count__gt=0).values(
+            'book__title', 'book__id', 'read_count').order_by('-read_count', 'book_id')[:2]))
+
+    def test_engine_statistics(self):
+        self.assertEngineMatchesDatabase()
+
+    def test_engine_refresh(self):
+        engine = get_stats_engine()
+        self.assertIs(get_stats_engine(), engine)
+
+        # a change of an instance which leaves the rollups unchanged reloads nothing
+        instance = UserBookInstance.objects.filter(user=self.user).latest('id')
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+        self.assertIs(get_stats_engine(), engine)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserBookInstance.objects.filter(user=self.other_user).first().delete()
+        refreshed = get_stats_engine()
+        self.assertIsNot(refreshed, engine)
+        # the catalog did not change, only the rollups are reloaded
+        self.assertIs(refreshed.catalog, engine.catalog)
+        self.assertIsNot(refreshed.rollups, engine.rollups)
+        self.assertEngineMatchesDatabase()
+
+        # the book instances are never scanned
+        instance.is_read = False
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+        with CaptureQueriesContext(connection) as queries:
+            get_stats_engine()
+        self.assertTrue(queries.captured_queries)
+        self.assertFalse([query for query in queries.captured_queries
+                          if UserBookInstance._meta.db_table in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Author.objects.get(first_name='Author First Name 2').books.remove(Book.objects.get(title='New Book 1'))
+        self.assertIsNot(get_stats_engine().catalog, engine.catalog)
+        self.assertEngineMatchesDatabase()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.get(title='New Book 2').delete()
+        self.assertEngineMatchesDatabase()
+
+    def test_top_n(self):
+        counts = np.array([0, 3, 1, 3, 2, 3])
+        self.assertEqual(top_n(counts, 2).tolist(), [1, 3])
+        self.assertEqual(top_n(counts, 5).tolist(), [1, 3, 5, 4, 2])
+        self.assertEqual(top_n(counts, 10).tolist(), [1, 3, 5, 4, 2])
+        self.assertEqual(top_n(np.zeros(3, dtype=np.int64), 2).tolist(), [])
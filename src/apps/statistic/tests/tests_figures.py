@@ -0,0 +1,66 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from plotly import express as px
+
+from apps.statistic.utils import figures
+from apps.statistic.utils.figures import get_figure_html
+
+
+class FigureCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.built = []
+
+    def tearDown(self):
+        cache.clear()
+
+    def build_figure(self, data: dict[str, int], title: str = ''):
+        self.built.append(data)
+        return px.bar(x=list(data.keys()), y=list(data.values()), title=title)
+
+    def slow_build_figure(self, data: dict[str, int]):
+        time.sleep(0.2)
+        return self.build_figure(data)
+
+    def test_figure_cached_by_data(self):
+        html = get_figure_html('test', {'a': 1}, self.build_figure, title='First')
+        self.assertIn('First', html)
+        self.assertEqual(get_figure_html('test', {'a': 1}, self.build_figure, title='First'), html)
+        self.assertEqual(len(self.built), 1)
+
+        # other params and other charts are cached separately
+        self.assertIn('Second', get_figure_html('test', {'a': 1}, self.build_figure, title='Second'))
+        get_figure_html('test', {'a': 1}, self.build_figure, slot=1, title='First')
+        self.assertEqual(len(self.built), 3)
+
+    def test_stale_figure_refreshed_in_background(self):
+        stale_html = get_figure_html('test', {'a': 1}, self.build_figure)
+        threads = []
+        refresh_in_background = figures.refresh_in_background
+        with mock.patch.object(figures, 'refresh_in_background',
+                               side_effect=lambda *args: threads.append(refresh_in_background(*args))):
+            # the stale figure is returned while the new one is rendered
+            self.assertEqual(get_figure_html('test', {'a': 2}, self.build_figure), stale_html)
+            self.assertEqual(len(threads), 1)
+            threads[0].join()
+            fresh_html = get_figure_html('test', {'a': 2}, self.build_figure)
+        self.assertNotEqual(fresh_html, stale_html)
+        self.assertEqual(self.built, [{'a': 1}, {'a': 2}])
+
+    def test_concurrent_misses_coalesced(self):
+        results = []
+
+        def get_html():
+            results.append(get_figure_html('test', {'a': 1}, self.slow_build_figure))
+
+        threads = [threading.Thread(target=get_html) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.built), 1)
+        self.assertEqual(len(set(results)), 1)
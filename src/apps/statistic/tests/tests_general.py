@@ -0,0 +1,46 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase, RequestFactory
+from django.urls import reverse
+
+from apps.library.models import Book, UserBookInstance
+from apps.statistic.utils import render_general_statistic_view, arender_general_statistic_view
+from utils.tests.utils import create_book_in_db
+
+
+class GeneralStatisticTestCase(TransactionTestCase):
+    # the async view queries from other threads, so the data has to be committed
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='Read New Book', year_of_publication=1990)
+        self.user = get_user_model().objects.get(id=1)
+        UserBookInstance.objects.create(user=self.user, book=Book.objects.get(title='Read New Book'), is_read=True)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def test_general_statistics_view(self):
+        url = reverse('statistic:general_statistics')
+        response = self.client.get(url)
+        self.assertRedirects(response, f'{reverse("account:login")}?next={url}', fetch_redirect_response=False)
+
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_books'], 2)
+        self.assertEqual(response.context['most_read_books'][0]['book__title'], 'Read New Book')
+        self.assertContains(response, 'Most Popular Genres')
+
+    async def test_async_render_matches_sync(self):
+        request = RequestFactory().get(reverse('statistic:general_statistics'))
+        request.user = self.user
+        template_name = 'statistic/general_statistics.html'
+        response = await arender_general_statistic_view(request, template_name)
+        # the figures are cached, so both paths render the same html
+        self.assertEqual(response.content, (await sync_to_async(render_general_statistic_view)(request, template_name)).content)
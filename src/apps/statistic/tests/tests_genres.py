@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.templatetags.static import static
+from django.test import TestCase
+from django.urls import reverse
+
+from apps.library.models import Genre, Book, UserBookInstance
+from apps.statistic.utils.genres import get_genre_statistics, get_genre_year_index
+from utils.tests.utils import create_book_in_db
+
+
+class GenreStatisticTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='First New Book', year_of_publication=-500)
+        create_book_in_db(title='Second New Book', year_of_publication=1990)
+        create_book_in_db(title='Third New Book', year_of_publication=1990)
+        Genre.objects.create(name='Empty Genre')
+        self.user = get_user_model().objects.get(id=1)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def count_books(self, start_year, end_year) -> dict[str, int]:
+        book_filter = Q(books__year_of_publication__gte=start_year, books__year_of_publication__lte=end_year)
+        return dict(Genre.objects.annotate(book_count=Count('books', filter=book_filter)).values_list(
+            'name', 'book_count'))
+
+    def test_genre_statistics(self):
+        ranges = [(-1000, 2024), (-500, -500), (-499, 1989), (1990, 1990), (1991, 2024), (2022, 2022), (3000, 3000)]
+        for start_year, end_year in ranges:
+            with self.subTest(start_year=start_year, end_year=end_year):
+                statistics = get_genre_statistics(start_year, end_year)
+                self.assertEqual(statistics, self.count_books(start_year, end_year))
+                self.assertEqual(list(statistics.values()), sorted(statistics.values(), reverse=True))
+
+    def test_top_genre_statistics(self):
+        statistics = get_genre_statistics(-1000, 2024, limit=1)
+        self.assertEqual(statistics, {'Genre Name 1': 4, 'Other': 4})
+        self.assertEqual(get_genre_statistics(-1000, 2024, limit=5), {'Genre Name 1': 4, 'Genre Name 2': 4})
+
+    def test_genre_statistics_follow_catalog(self):
+        self.assertEqual(get_genre_statistics(1990, 1990)['Genre Name 1'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.get(title='Third New Book').delete()
+        self.assertEqual(get_genre_statistics(1990, 1990)['Genre Name 1'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Genre.objects.get(name='Empty Genre').books.add(Book.objects.get(title='First New Book'))
+        self.assertEqual(get_genre_statistics(-1000, 0)['Empty Genre'], 1)
+
+    def test_genre_year_index_kept_on_library_changes(self):
+        index = get_genre_year_index()
+        book = Book.objects.get(title='Second New Book')
+        with self.captureOnCommitCallbacks(execute=True):
+            UserBookInstance.objects.create(user=self.user, book=book, is_read=True)
+        self.assertIs(get_genre_year_index(), index)
+
+        book.year_of_publication = 2000
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+        self.assertIsNot(get_genre_year_index(), index)
+        self.assertEqual(get_genre_statistics(2000, 2000)['Genre Name 1'], 1)
+
+    def test_fig_genres_statistic_view(self):
+        self.client.force_login(self.user)
+        url = reverse('statistic:fig_genres_statistic')
+        response = self.client.get(url, {'start_year': 1990, 'end_year': 2000})
+        self.assertEqual(response.status_code, 200)
+        # the figure is a fragment, plotly.js is loaded once by the statistic page
+        self.assertContains(response, 'Plotly.newPlot')
+        self.assertLess(len(response.content), 100 * 1024)
+        response = self.client.get(reverse('statistic:statistic'))
+        self.assertContains(response, static('plotly/plotly.min.js'))
+        response = self.client.get(url, {'start_year': 2000, 'end_year': 1990})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Start year should not be greater than end year.')
+        response = self.client.get(url, {'top': 1000})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Ensure this value is less than or equal to 50.')
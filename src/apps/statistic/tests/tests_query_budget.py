@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from apps.library.models import Book, UserBookInstance
+from apps.statistic import urls
+from utils.tests.utils import create_book_in_db, QueryBudgetMixin
+
+# url name: the most queries the view may run, whatever the number of books in the catalog and the user libraries,
+# the session and the user loading included
+QUERY_BUDGETS = {
+    'statistic:statistic': 2,
+    'statistic:genres_statistic': 4,
+    'statistic:fig_genres_statistic': 4,
+    'statistic:authors_statistic': 4,
+    # the catalog arrays are loaded once per catalog version, a query per table
+    'statistic:books_read_statistic': 7,
+    'statistic:general_statistics': 9,
+    'statistic:reading_activity_statistic': 4,
+}
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TransactionTestCase):
+    # the async view queries from other threads, so the data has to be committed
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        self.user = get_user_model().objects.get(id=1)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def grow_catalog(self, size: int):
+        """
+        Add books to the catalog up to the size, published over the years, every other one to the user library.
+        """
+        for i in range(Book.objects.count(), size):
+            create_book_in_db(title=f'Budget Book {i}', year_of_publication=1880 + 4 * i)
+            if i % 2 == 0:
+                UserBookInstance.objects.create(user=self.user, book=Book.objects.latest('id'), is_read=i % 4 == 0)
+
+    def assertGetBudget(self, name: str, params: dict | None = None):
+        self.assertViewBudget(QUERY_BUDGETS[name], name, lambda: lambda: self.client.get(reverse(name), params))
+
+    def test_budgets_cover_all_views(self):
+        self.assertEqual(set(QUERY_BUDGETS), {f'{urls.app_name}:{pattern.name}' for pattern in urls.urlpatterns})
+
+    def test_statistic(self):
+        self.assertGetBudget('statistic:statistic')
+
+    def test_genres_statistic(self):
+        self.assertGetBudget('statistic:genres_statistic')
+        self.assertGetBudget('statistic:fig_genres_statistic', {'start_year': 1950, 'end_year': 2000, 'top': 5})
+
+    def test_authors_statistic(self):
+        self.assertGetBudget('statistic:authors_statistic')
+
+    def test_books_read_statistic(self):
+        self.assertGetBudget('statistic:books_read_statistic')
+
+    def test_general_statistics(self):
+        self.assertGetBudget('statistic:general_statistics')
+
+    def test_reading_activity_statistic(self):
+        for period in ['day', 'week', 'month']:
+            self.assertGetBudget('statistic:reading_activity_statistic', {'period': period})
@@ -0,0 +1,152 @@
+import re
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.library.models import Author, Genre, Book, UserBookInstance
+from apps.library.utils.views_utils import (
+    add_books_to_user_library,
+    remove_books_from_user_library,
+    set_books_read_status,
+    toggle_book_read_status,
+)
+from apps.statistic.models import GenreYearStat, GenreStat, AuthorStat, BookStat, ReadingActivity, UserReadingActivity
+from apps.statistic.utils.rollups import rebuild_statistics, get_rollups_version
+from utils.tests.utils import create_book_in_db
+
+# key and counter fields of the rollup tables
+ROLLUPS = {
+    GenreYearStat: (('genre_id', 'year'), ('book_count',)),
+    GenreStat: (('genre_id',), ('add_count', 'read_count')),
+    AuthorStat: (('author_id',), ('book_count', 'add_count', 'read_count')),
+    BookStat: (('book_id',), ('add_count', 'read_count')),
+    ReadingActivity: (('period', 'start'), ('add_count', 'remove_count', 'read_count', 'unread_count')),
+    UserReadingActivity: (('user_id', 'period', 'start'), ('add_count', 'remove_count', 'read_count', 'unread_count')),
+}
+
+
+class RollupTestCase(TestCase):
+    fixtures = ['test_data.json']
+
+    def setUp(self):
+        create_book_in_db(title='First New Book', year_of_publication=1990)
+        create_book_in_db(title='Second New Book', year_of_publication=2000)
+        self.first_book = Book.objects.get(title='First New Book')
+        self.second_book = Book.objects.get(title='Second New Book')
+        self.user = get_user_model().objects.get(id=1)
+
+    def tearDown(self):
+        # called for remove created files
+        books = Book.objects.all()
+        for book in books:
+            book.delete()
+        cache.clear()
+
+    def get_rollups(self) -> dict:
+        """
+        Return the non-zero rows of the rollup tables, zero rows may be left by the incremental updates.
+        """
+        return {
+            model: {row for row in model.objects.values_list(*keys, *counters) if any(row[len(keys):])}
+            for model, (keys, counters) in ROLLUPS.items()
+        }
+
+    def assertRollupsRebuilt(self):
+        """
+        Check that the incrementally maintained rollups match the ones recomputed from scratch.
+        """
+        rollups = self.get_rollups()
+        rebuild_statistics()
+        self.assertEqual(rollups, self.get_rollups())
+
+    def test_relation_changes(self):
+        UserBookInstance.objects.create(user=self.user, book=self.first_book, is_read=True)
+        genre = Genre.objects.get(name='Genre Name 1')
+        author = Author.objects.get(first_name='Author First Name 1')
+        self.assertEqual(GenreYearStat.objects.get(genre=genre, year=1990).book_count, 1)
+        self.assertEqual(GenreStat.objects.get(genre=genre).read_count, 1)
+
+        self.first_book.genre.remove(genre)
+        self.first_book.genre.remove(genre)
+        self.assertEqual(GenreYearStat.objects.get(genre=genre, year=1990).book_count, 0)
+        self.assertEqual(GenreStat.objects.get(genre=genre).read_count, 0)
+        self.assertRollupsRebuilt()
+
+        genre.books.add(self.first_book, self.second_book)
+        self.assertRollupsRebuilt()
+        genre.books.clear()
+        self.assertRollupsRebuilt()
+        author.books.remove(self.second_book)
+        self.assertEqual(AuthorStat.objects.get(author=author).book_count, 2)
+        self.assertRollupsRebuilt()
+        self.second_book.authors.set([author])
+        self.assertRollupsRebuilt()
+
+    def test_book_changes(self):
+        UserBookInstance.objects.create(user=self.user, book=self.second_book, is_read=True)
+        self.second_book.year_of_publication = 1990
+        self.second_book.save()
+        genre = Genre.objects.get(name='Genre Name 1')
+        self.assertEqual(GenreYearStat.objects.get(genre=genre, year=1990).book_count, 2)
+        self.assertRollupsRebuilt()
+
+        self.second_book.delete()
+        self.assertEqual(GenreYearStat.objects.get(genre=genre, year=1990).book_count, 1)
+        self.assertEqual(GenreStat.objects.get(genre=genre).read_count, 0)
+        self.assertRollupsRebuilt()
+
+        Book.objects.filter(pk=self.first_book.pk).delete()
+        self.assertRollupsRebuilt()
+
+    def test_book_instance_changes(self):
+        instance = UserBookInstance.objects.create(user=self.user, book=self.first_book)
+        self.assertEqual(BookStat.objects.get(book=self.first_book).add_count, 1)
+        instance.is_read = True
+        instance.save()
+        self.assertEqual(BookStat.objects.get(book=self.first_book).read_count, 1)
+        self.assertRollupsRebuilt()
+        instance.delete()
+        self.assertRollupsRebuilt()
+
+        book_ids = [self.first_book.pk, self.second_book.pk]
+        add_books_to_user_library(book_ids, self.user)
+        self.assertRollupsRebuilt()
+        set_books_read_status(book_ids, self.user, True)
+        self.assertEqual(AuthorStat.objects.get(author__first_name='Author First Name 1').read_count, 2)
+        self.assertRollupsRebuilt()
+        toggle_book_read_status(self.first_book.pk, self.user)
+        self.assertEqual(BookStat.objects.get(book=self.first_book).read_count, 0)
+        self.assertRollupsRebuilt()
+        remove_books_from_user_library(book_ids, self.user)
+        self.assertEqual(BookStat.objects.get(book=self.second_book).add_count, 0)
+        self.assertRollupsRebuilt()
+
+    def test_book_instance_changes_without_upserts(self):
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.test_book_instance_changes()
+
+    def test_deltas_are_applied_by_one_statement(self):
+        UserBookInstance.objects.create(user=self.user, book=self.first_book)
+        with CaptureQueriesContext(connection) as queries:
+            toggle_book_read_status(self.first_book.pk, self.user)
+        for model in (BookStat, GenreStat, AuthorStat, ReadingActivity, UserReadingActivity):
+            writes = rf'(INSERT( OR IGNORE)? INTO|UPDATE) "{model._meta.db_table}" '
+            self.assertEqual(len([query for query in queries.captured_queries if re.match(writes, query['sql'])]), 1,
+                             model.__name__)
+        self.assertRollupsRebuilt()
+
+    def test_rebuild_command(self):
+        UserBookInstance.objects.create(user=self.user, book=self.first_book, is_read=True)
+        rollups = self.get_rollups()
+        BookStat.objects.all().delete()
+        version = get_rollups_version()
+        with self.captureOnCommitCallbacks(using=DEFAULT_DB_ALIAS, execute=True):
+            call_command('rebuild_statistics', database=DEFAULT_DB_ALIAS, stdout=StringIO())
+        self.assertEqual(rollups, self.get_rollups())
+        self.assertNotEqual(version, get_rollups_version())
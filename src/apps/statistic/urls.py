@@ -11,4 +11,5 @@ urlpatterns = [
     path('authors_statistic/', views.authors_statistic_view, name='authors_statistic'),
     path('books_read_statistic/', views.books_read_statistics_view, name='books_read_statistic'),
     path('general_statistics/', views.general_statistics_view, name='general_statistics'),
+    path('reading_activity_statistic/', views.reading_activity_statistics_view, name='reading_activity_statistic'),
 ]
@@ -1,4 +1,5 @@
 from .genres import render_genre_statistic_view
 from .authors import render_author_statistic_view
 from .books_read import render_read_book_statistic_view
-from .general import render_general_statistic_view
+from .general import render_general_statistic_view, arender_general_statistic_view
+from .activity import render_reading_activity_view
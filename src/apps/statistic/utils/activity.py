@@ -0,0 +1,60 @@
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import render
+from plotly import express as px
+
+from apps.statistic.forms import ActivityFilterForm
+from ..models import ReadingActivity, UserReadingActivity
+from .figures import get_figure_html
+
+# number of the last buckets shown for every period
+ACTIVITY_BUCKETS = {
+    ReadingActivity.Period.DAY: 90,
+    ReadingActivity.Period.WEEK: 52,
+    ReadingActivity.Period.MONTH: 36,
+}
+
+ACTIVITY_SERIES = {
+    'add_count': 'Added',
+    'remove_count': 'Removed',
+    'read_count': 'Read',
+    'unread_count': 'Unread',
+}
+
+
+def get_reading_activity(queryset, period: str) -> dict[str, list]:
+    """
+    Retrieve the last buckets of the reading activity rollup as chart columns.
+    """
+    rows = list(queryset.filter(period=period).order_by('-start').values_list(
+        'start', *ACTIVITY_SERIES)[:ACTIVITY_BUCKETS[period]])
+    rows.reverse()
+    columns = {'Start': [row[0].isoformat() for row in rows]}
+    for i, label in enumerate(ACTIVITY_SERIES.values(), start=1):
+        columns[label] = [row[i] for row in rows]
+    return columns
+
+
+def build_activity_figure(data: dict[str, list], title: str):
+    return px.line(data, x='Start', y=list(ACTIVITY_SERIES.values()), markers=True, title=title,
+                   labels={'value': 'Books', 'variable': 'Action'})
+
+
+def render_reading_activity_view(request: HttpRequest, template_name: str) -> HttpResponse:
+    """
+    Render a view displaying the reading activity over time of the current user and of all users.
+    """
+    form = ActivityFilterForm(request.GET)
+    if not form.is_valid():
+        return render(request, template_name, {'form': form})
+    period = form.cleaned_data['period']
+    user = request.user
+    user_activity = get_reading_activity(UserReadingActivity.objects.filter(user=user), period)
+    activity = get_reading_activity(ReadingActivity.objects.all(), period)
+    context = {
+        'form': form,
+        'user_fig': get_figure_html('user_activity', user_activity, build_activity_figure, slot=(user.pk, period),
+                                    title='My reading activity'),
+        'fig': get_figure_html('activity', activity, build_activity_figure, slot=period,
+                               title='Reading activity of all users'),
+    }
+    return render(request, template_name, context)
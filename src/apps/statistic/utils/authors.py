@@ -1,27 +1,45 @@
-from django.db.models import Count
+from django.db.models import F, Sum
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
 from plotly import express as px
 
-from apps.library.models import Author
+from apps.library.utils.cache_utils import cache_by_catalog
+from apps.statistic.forms import TopFilterForm
+from ..models import AuthorStat
+from .figures import get_figure_html
 
+OTHER_LABEL = 'Other'
 
-def get_authors_with_books_count():
+
+@cache_by_catalog()
+def get_authors_with_books_count(limit: int) -> tuple[list[dict], int]:
     """
-    Retrieve the count of books written by each author.
+    Retrieve the count of books written by the top authors and the count of books of all the other authors.
     """
-    return Author.objects.annotate(
-        book_count=Count('books')
-    ).values('full_name', 'book_count').order_by('-book_count')
+    authors = AuthorStat.objects.filter(book_count__gt=0)
+    top_authors = list(authors.values(
+        'book_count', full_name=F('author__full_name')
+    ).order_by('-book_count', 'author_id')[:limit])
+    total = authors.aggregate(total=Sum('book_count'))['total'] or 0
+    return top_authors, total - sum(item['book_count'] for item in top_authors)
+
+
+def build_author_figure(author_count_dict: dict[str, int]):
+    return px.pie(names=list(author_count_dict.keys()), values=list(author_count_dict.values()))
 
 
 def render_author_statistic_view(request: HttpRequest, template_name: str) -> HttpResponse:
     """
     Render a view displaying statistics about authors and the count of books they have written.
     """
-    authors_with_books_count = get_authors_with_books_count()
+    form = TopFilterForm(request.GET)
+    if not form.is_valid():
+        return render(request, template_name, {'form': form})
+    top = form.cleaned_data['top']
+    authors_with_books_count, other_count = get_authors_with_books_count(top)
     author_count_dict = {item['full_name']: item['book_count'] for item in authors_with_books_count}
-    fig = px.pie(names=list(author_count_dict.keys()), values=list(author_count_dict.values()))
-    plotly_html = fig.to_html()
-    context = {'fig': plotly_html}
+    if other_count:
+        author_count_dict[OTHER_LABEL] = other_count
+    plotly_html = get_figure_html('authors', author_count_dict, build_author_figure, slot=top)
+    context = {'form': form, 'fig': plotly_html}
     return render(request, template_name, context)
@@ -3,6 +3,8 @@ from django.shortcuts import render
 from plotly import express as px
 
 from apps.library.models import UserBookInstance
+from apps.library.utils.cache_utils import get_user_library_counts
+from .figures import get_figure_html
 from .generic import get_total_books_count
 
 
@@ -17,14 +19,18 @@ def get_user_books_count(user):
     """
     Get the count of book instances associated with a given user.
     """
-    return get_user_books(user).count()
+    return get_user_library_counts(user)['total']
 
 
 def get_read_books_count(user):
     """
     Get the count of read book instances associated with a given user.
     """
-    return get_user_books(user).filter(is_read=True).count()
+    return get_user_library_counts(user)['read']
+
+
+def build_read_book_figure(data: dict[str, list]):
+    return px.bar(data, x='Count', y='Status', orientation='h')
 
 
 def render_read_book_statistic_view(request: HttpRequest, template_name: str) -> HttpResponse:
@@ -40,7 +46,6 @@ def render_read_book_statistic_view(request: HttpRequest, template_name: str) ->
     data = {'Status': ['Total Books', 'Books in my library', 'Read Books'],
             'Count': [total_books, book_instances_count, read_book_instances_count]}
 
-    fig = px.bar(data, x='Count', y='Status', orientation='h')
-    plotly_html = fig.to_html()
+    plotly_html = get_figure_html('books_read', data, build_read_book_figure, slot=user.pk)
     context = {'fig': plotly_html}
     return render(request, template_name, context)
@@ -0,0 +1,210 @@
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+from django.db.models import Count, Max
+
+from apps.library.models import Author, Genre, Book
+from apps.library.utils.cache_utils import get_catalog_version
+from ..models import GenreStat, AuthorStat, BookStat
+from .rollups import get_rollups_version
+
+
+def load_rows(queryset, columns: int) -> np.ndarray:
+    return np.array(list(queryset), dtype=np.int64).reshape(-1, columns)
+
+
+def align_counts(catalog_ids: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Return the counts of (id, count) rollup rows by index into the sorted catalog ids,
+    the rows of ids missing from the catalog are dropped.
+    """
+    counts = np.zeros(len(catalog_ids), dtype=np.int64)
+    indexes = np.searchsorted(catalog_ids, rows[:, 0])
+    found = indexes < len(catalog_ids)
+    found[found] = catalog_ids[indexes[found]] == rows[found, 0]
+    counts[indexes[found]] = rows[found, 1]
+    return counts
+
+
+def top_n(counts: np.ndarray, n: int) -> np.ndarray:
+    """
+    Return indexes of the n largest positive counts, ordered by count descending and index ascending.
+    """
+    candidates = np.flatnonzero(counts > 0)
+    if len(candidates) > n:
+        kth = len(candidates) - n
+        threshold = np.partition(counts[candidates], kth)[kth]
+        # ties of the threshold are kept, the lexsort orders them by index
+        candidates = candidates[counts[candidates] >= threshold]
+    order = np.lexsort((candidates, -counts[candidates]))
+    return candidates[order][:n]
+
+
+@dataclass(frozen=True)
+class CatalogArrays:
+    """
+    Books, genres and authors sorted by id.
+    """
+    fingerprint: tuple
+    book_ids: np.ndarray
+    titles: list[str]
+    years: np.ndarray
+    genre_ids: np.ndarray
+    genre_names: list[str]
+    author_ids: np.ndarray
+    author_names: list[str]
+
+
+def get_catalog_fingerprint() -> tuple:
+    """
+    Every change of books and their relations changes the count or the last modification time of books.
+    """
+    return tuple(Book.objects.aggregate(count=Count('id'), updated_at=Max('updated_at')).values())
+
+
+def load_catalog_arrays(fingerprint: tuple) -> CatalogArrays:
+    books = list(Book.objects.order_by('id').values_list('id', 'year_of_publication', 'title'))
+    genres = list(Genre.objects.order_by('id').values_list('id', 'name'))
+    authors = list(Author.objects.order_by('id').values_list('id', 'full_name'))
+    return CatalogArrays(
+        fingerprint=fingerprint,
+        book_ids=np.array([book[0] for book in books], dtype=np.int64),
+        titles=[book[2] for book in books],
+        years=np.array([book[1] for book in books], dtype=np.int64),
+        genre_ids=np.array([genre_id for genre_id, _ in genres], dtype=np.int64),
+        genre_names=[name for _, name in genres],
+        author_ids=np.array([author_id for author_id, _ in authors], dtype=np.int64),
+        author_names=[name for _, name in authors],
+    )
+
+
+@dataclass(frozen=True)
+class RollupArrays:
+    """
+    Non-zero (id, count) rows of the library adds and reads rollups, sorted by id.
+    The rollups are kept up to date incrementally, so loading them never touches the book instances.
+    """
+    book_reads: np.ndarray
+    genre_adds: np.ndarray
+    author_adds: np.ndarray
+
+
+def load_rollup_arrays() -> RollupArrays:
+    return RollupArrays(
+        book_reads=load_rows(BookStat.objects.filter(read_count__gt=0).order_by('book_id').values_list(
+            'book_id', 'read_count'), 2),
+        genre_adds=load_rows(GenreStat.objects.filter(add_count__gt=0).order_by('genre_id').values_list(
+            'genre_id', 'add_count'), 2),
+        author_adds=load_rows(AuthorStat.objects.filter(add_count__gt=0).order_by('author_id').values_list(
+            'author_id', 'add_count'), 2),
+    )
+
+
+@dataclass(frozen=True)
+class StatsEngine:
+    """
+    Library statistics computed with vectorized operations over the catalog and the rollups arrays.
+    """
+    catalog: CatalogArrays
+    rollups: RollupArrays
+    book_read_counts: np.ndarray
+    genre_add_counts: np.ndarray
+    author_add_counts: np.ndarray
+
+    @property
+    def total_books(self) -> int:
+        return len(self.catalog.book_ids)
+
+    @property
+    def average_year(self) -> float | None:
+        return float(self.catalog.years.mean()) if self.total_books else None
+
+    def get_popular_genres(self, limit: int) -> list[dict]:
+        return [{'genre__name': self.catalog.genre_names[i], 'add_count': int(self.genre_add_counts[i])}
+                for i in top_n(self.genre_add_counts, limit)]
+
+    def get_popular_authors(self, limit: int) -> list[dict]:
+        return [{'author__full_name': self.catalog.author_names[i], 'add_count': int(self.author_add_counts[i])}
+                for i in top_n(self.author_add_counts, limit)]
+
+    def get_most_read_books(self, limit: int) -> list[dict]:
+        return [{'book__title': self.catalog.titles[i], 'book__id': int(self.catalog.book_ids[i]),
+                 'read_count': int(self.book_read_counts[i])}
+                for i in top_n(self.book_read_counts, limit)]
+
+
+def build_stats_engine(catalog: CatalogArrays, rollups: RollupArrays) -> StatsEngine:
+    """
+    Align the rollup counts to the catalog arrays.
+    """
+    return StatsEngine(
+        catalog=catalog,
+        rollups=rollups,
+        book_read_counts=align_counts(catalog.book_ids, rollups.book_reads),
+        genre_add_counts=align_counts(catalog.genre_ids, rollups.genre_adds),
+        author_add_counts=align_counts(catalog.author_ids, rollups.author_adds),
+    )
+
+
+_catalog_arrays: tuple[int, CatalogArrays] | None = None
+_catalog_arrays_lock = threading.Lock()
+_rollup_arrays: tuple[int, RollupArrays] | None = None
+_rollup_arrays_lock = threading.Lock()
+_stats_engine: StatsEngine | None = None
+_stats_engine_lock = threading.Lock()
+
+
+def get_catalog_arrays() -> CatalogArrays:
+    """
+    Return the catalog arrays for the current catalog version, they are kept in memory of the process.
+    The catalog version changes with library activity too, so the arrays are reloaded only
+    when the books and their relations changed.
+    """
+    global _catalog_arrays
+    version = get_catalog_version()
+    with _catalog_arrays_lock:
+        if _catalog_arrays is None or _catalog_arrays[0] != version:
+            catalog = _catalog_arrays[1] if _catalog_arrays is not None else None
+            fingerprint = get_catalog_fingerprint()
+            if catalog is None or catalog.fingerprint != fingerprint:
+                catalog = load_catalog_arrays(fingerprint)
+            _catalog_arrays = version, catalog
+        return _catalog_arrays[1]
+
+
+def get_rollup_arrays() -> RollupArrays:
+    """
+    Return the rollups arrays for the current rollups version, it changes only when library adds
+    or reads of books, genres or authors change.
+    """
+    global _rollup_arrays
+    version = get_rollups_version()
+    with _rollup_arrays_lock:
+        if _rollup_arrays is None or _rollup_arrays[0] != version:
+            _rollup_arrays = version, load_rollup_arrays()
+        return _rollup_arrays[1]
+
+
+def get_stats_engine(catalog: CatalogArrays | None = None, rollups: RollupArrays | None = None) -> StatsEngine:
+    """
+    Return the engine of the current catalog and rollups arrays, the ones already loaded can be passed.
+    """
+    global _stats_engine
+    if catalog is None:
+        catalog = get_catalog_arrays()
+    if rollups is None:
+        rollups = get_rollup_arrays()
+    with _stats_engine_lock:
+        if _stats_engine is None or _stats_engine.catalog is not catalog or _stats_engine.rollups is not rollups:
+            _stats_engine = build_stats_engine(catalog, rollups)
+        return _stats_engine
+
+
+def clear_stats_engine() -> None:
+    """
+    Forget the arrays kept in memory of the process, the next call loads them again.
+    """
+    global _catalog_arrays, _rollup_arrays, _stats_engine
+    with _catalog_arrays_lock, _rollup_arrays_lock, _stats_engine_lock:
+        _catalog_arrays = _rollup_arrays = _stats_engine = None
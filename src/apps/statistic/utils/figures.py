@@ -0,0 +1,76 @@
+import hashlib
+import threading
+import time
+from typing import Callable, Any
+
+# plotly express imports pandas lazily on the first figure, a concurrent first import
+# in another thread would see a partially initialized module
+import pandas  # noqa: F401
+from django.core.cache import cache
+from plotly.graph_objects import Figure
+
+from .generic import render_figure
+
+FIGURE_CACHE_TIMEOUT = 60 * 60 * 24
+# how long a rebuild may take before another process starts its own
+FIGURE_LOCK_TIMEOUT = 30
+FIGURE_WAIT_INTERVAL = 0.05
+
+
+def get_digest(*parts) -> str:
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def refresh_in_background(func: Callable, *args) -> threading.Thread:
+    thread = threading.Thread(target=func, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def build_figure_html(key: str, latest_key: str, lock_key: str, data, build_figure: Callable[..., Figure],
+                      params: dict) -> str:
+    """
+    Render the figure and store it as the figure of the data and as the latest figure of the chart.
+    """
+    try:
+        html = render_figure(build_figure(data, **params))
+        cache.set_many({key: html, latest_key: html}, FIGURE_CACHE_TIMEOUT)
+        return html
+    finally:
+        cache.delete(lock_key)
+
+
+def get_figure_html(name: str, data, build_figure: Callable[..., Figure], slot: Any = (), **params) -> str:
+    """
+    Return the html of the figure built by build_figure(data, **params), cached by the digest of the data.
+    The params and the slot identify the chart the figure is shown in (slot is e.g. a user or a year range).
+
+    When the data of the chart changed, the latest figure of the chart is returned at once and
+    rebuilt in a background thread. Concurrent misses are coalesced, only one of them renders the figure.
+    """
+    prefix = f'statistic:figure:{name}:{get_digest(slot, sorted(params.items()))}'
+    key = f'{prefix}:{get_digest(data)}'
+    latest_key = f'{prefix}:latest'
+    lock_key = f'{key}:lock'
+
+    cached = cache.get_many([key, latest_key])
+    if key in cached:
+        return cached[key]
+    acquired = cache.add(lock_key, True, FIGURE_LOCK_TIMEOUT)
+    if latest_key in cached:
+        if acquired:
+            refresh_in_background(build_figure_html, key, latest_key, lock_key, data, build_figure, params)
+        return cached[latest_key]
+    if acquired:
+        return build_figure_html(key, latest_key, lock_key, data, build_figure, params)
+
+    # another request renders the same figure, wait for it
+    deadline = time.monotonic() + FIGURE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(FIGURE_WAIT_INTERVAL)
+        html = cache.get(key)
+        if html is not None:
+            return html
+        if cache.add(lock_key, True, FIGURE_LOCK_TIMEOUT):
+            return build_figure_html(key, latest_key, lock_key, data, build_figure, params)
+    return render_figure(build_figure(data, **params))
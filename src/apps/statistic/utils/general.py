@@ -1,44 +1,58 @@
-from django.db.models import Avg, Count
+import asyncio
+
+import pandas as pd
+from asgiref.sync import sync_to_async
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
 from plotly import express as px
 
-from apps.library.models import Book, UserBookInstance
-from .generic import get_total_books_count
+from .engine import StatsEngine, get_stats_engine, get_catalog_arrays, get_rollup_arrays
+from .figures import get_figure_html
+from .generic import run_in_thread
 
 DESC_LIMIT = 5
 
 
-def get_average_age_of_books():
-    """
-    Calculate the average publication year of all books in the library
-    """
-    return Book.objects.aggregate(avg_age=Avg('year_of_publication'))['avg_age']
-
-
-def get_popular_genres(limit=DESC_LIMIT):
+def get_general_statistics(engine: StatsEngine, limit: int = DESC_LIMIT) -> tuple:
     """
-    Retrieve the most popular genres based on the number of books added to users library.
+    Return total books, average publication year, the most popular genres and authors based on the number of books
+    added to users library, and the most read books.
     """
-    popular_genres = UserBookInstance.objects.values('book__genre__name').annotate(
-        genre_count=Count('book__genre__name')).order_by('-genre_count')[:limit]
-    return popular_genres
+    return (engine.total_books, engine.average_year, engine.get_popular_genres(limit),
+            engine.get_popular_authors(limit), engine.get_most_read_books(limit))
 
 
-def get_popular_authors(limit=DESC_LIMIT):
-    """
-    Retrieve the most popular authors based on the number of books added to users library.
-    """
-    return UserBookInstance.objects.values('book__authors__full_name').annotate(
-        author_count=Count('book__authors__full_name')).order_by('-author_count')[:limit]
+def build_bar_figure(counts: list[tuple[str, int]], x_label: str, y_label: str, title: str):
+    # a data frame keeps the figure valid when there are no counts yet, plotly rejects two empty lists
+    return px.bar(pd.DataFrame(counts, columns=['x', 'y']), x='x', y='y',
+                  labels={'x': x_label, 'y': y_label}, title=title)
 
 
-def get_most_read_books(limit=DESC_LIMIT):
+def get_general_figure_specs(popular_genres, popular_authors, most_read_books) -> list[tuple]:
     """
-    Retrieve the most read books based on the number of times they have been added to users library and marked as read.
+    Return get_figure_html arguments of the general statistic figures.
     """
-    return UserBookInstance.objects.filter(is_read=True).values('book__title', 'book__id').annotate(
-        read_count=Count('book__id')).order_by('-read_count')[:limit]
+    genre_data = [(item['genre__name'], item['add_count']) for item in popular_genres]
+    author_data = [(item['author__full_name'], item['add_count']) for item in popular_authors]
+    most_read_books_data = [(item['book__title'], item['read_count']) for item in most_read_books]
+    return [
+        ('popular_genres', genre_data, {'x_label': 'Genre', 'y_label': 'Count', 'title': 'Most Popular Genres'}),
+        ('popular_authors', author_data, {'x_label': 'Author', 'y_label': 'Count', 'title': 'Most Popular Authors'}),
+        ('most_read_books', most_read_books_data,
+         {'x_label': 'Book', 'y_label': 'Read Count', 'title': 'Most Read Books'}),
+    ]
+
+
+def get_general_statistic_context(total_books, average_age, most_read_books, figures: list[str]) -> dict:
+    plot_div_genre, plot_div_author, plot_div_books = figures
+    return {
+        'total_books': total_books,
+        'average_age': average_age,
+        'most_read_books': most_read_books,
+        'plot_div_genre': plot_div_genre,
+        'plot_div_author': plot_div_author,
+        'plot_div_books': plot_div_books,
+    }
 
 
 def render_general_statistic_view(request: HttpRequest, template_name: str) -> HttpResponse:
@@ -46,39 +60,27 @@ def render_general_statistic_view(request: HttpRequest, template_name: str) -> H
     Render a view displaying general statistics about the library, including total books, average age of books,
     popular genres, popular authors, and most read books.
     """
-    total_books = get_total_books_count()
-    average_age = get_average_age_of_books()
-    popular_genres = get_popular_genres()
-    popular_authors = get_popular_authors()
-    most_read_books = get_most_read_books()
-
-    genre_labels = [item['book__genre__name'] for item in popular_genres]
-    genre_counts = [item['genre_count'] for item in popular_genres]
-
-    author_labels = [item['book__authors__full_name'] for item in popular_authors]
-    author_counts = [item['author_count'] for item in popular_authors]
-
-    most_read_books_labels = [item['book__title'] for item in most_read_books]
-    most_read_books_counts = [item['read_count'] for item in most_read_books]
-
-    fig_genre = px.bar(x=genre_labels, y=genre_counts, labels={'x': 'Genre', 'y': 'Count'},
-                       title='Most Popular Genres')
-    fig_author = px.bar(x=author_labels, y=author_counts, labels={'x': 'Author', 'y': 'Count'},
-                        title='Most Popular Authors')
-    fig_most_read_books = px.bar(x=most_read_books_labels, y=most_read_books_counts,
-                                 labels={'x': 'Book', 'y': 'Read Count'},
-                                 title='Most Read Books')
+    total_books, average_age, popular_genres, popular_authors, most_read_books = get_general_statistics(
+        get_stats_engine())
+    figures = [
+        get_figure_html(name, data, build_bar_figure, **params)
+        for name, data, params in get_general_figure_specs(popular_genres, popular_authors, most_read_books)
+    ]
+    context = get_general_statistic_context(total_books, average_age, most_read_books, figures)
+    return render(request, template_name, context)
 
-    plot_div_genre = fig_genre.to_html()
-    plot_div_author = fig_author.to_html()
-    plot_div_books = fig_most_read_books.to_html()
 
-    context = {
-        'total_books': total_books,
-        'average_age': average_age,
-        'most_read_books': most_read_books,
-        'plot_div_genre': plot_div_genre,
-        'plot_div_author': plot_div_author,
-        'plot_div_books': plot_div_books,
-    }
-    return render(request, template_name, context)
+async def arender_general_statistic_view(request: HttpRequest, template_name: str) -> HttpResponse:
+    """
+    Async version of render_general_statistic_view, the catalog and the rollups arrays are loaded concurrently
+    and then the figures are rendered concurrently.
+    """
+    catalog, rollups = await asyncio.gather(run_in_thread(get_catalog_arrays), run_in_thread(get_rollup_arrays))
+    engine = get_stats_engine(catalog, rollups)
+    total_books, average_age, popular_genres, popular_authors, most_read_books = get_general_statistics(engine)
+    figures = await asyncio.gather(*(
+        run_in_thread(get_figure_html, name, data, build_bar_figure, **params)
+        for name, data, params in get_general_figure_specs(popular_genres, popular_authors, most_read_books)
+    ))
+    context = get_general_statistic_context(total_books, average_age, most_read_books, figures)
+    return await sync_to_async(render)(request, template_name, context)
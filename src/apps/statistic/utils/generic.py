@@ -1,5 +1,45 @@
-from apps.library.models import Book
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from plotly.graph_objects import Figure
+
+from .engine import get_catalog_arrays
 
 
 def get_total_books_count():
-    return Book.objects.count()
+    return len(get_catalog_arrays().book_ids)
+
+
+def render_figure(fig: Figure) -> str:
+    """
+    Render a figure as a html fragment without the plotly.js bundle, the page loads it once as a static file.
+    """
+    return fig.to_html(include_plotlyjs=False, full_html=False)
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    Run a blocking function in a thread of its own, so that several of them run concurrently.
+    The thread uses its own database connection, which is released like at the end of a request.
+    """
+    def call():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+def async_login_required(view):
+    """
+    login_required for async views, the user is loaded from the session outside the event loop.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
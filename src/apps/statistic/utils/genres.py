@@ -1,48 +1,106 @@
+from dataclasses import dataclass
+
+import numpy as np
 from django.core.exceptions import ValidationError
-from django.db.models import Q, Count
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
 from plotly import express as px
 
 from apps.library.models import Genre
-from apps.statistic.forms import YearFilterForm
+from apps.library.utils.cache_utils import get_book_genres_version
+from apps.statistic.forms import GenreFilterForm
+from ..models import GenreYearStat
+from .authors import OTHER_LABEL
+from .engine import top_n
+from .figures import get_figure_html
 
 
-def get_years_from_request(request: HttpRequest) -> (int, int):
+def get_genre_filter_from_request(request: HttpRequest) -> (int, int, int):
     """
-    Extracts start year and end year from the HttpRequest object.
+    Extracts start year, end year and the number of top genres from the HttpRequest object.
     """
-    form = YearFilterForm(request.GET)
+    form = GenreFilterForm(request.GET)
     if not form.is_valid():
         all_errors = form.errors.get('__all__', [])
         error_messages = [str(error) for error in all_errors]
         raise ValidationError(error_messages)
     start_year = form.cleaned_data['start_year']
     end_year = form.cleaned_data['end_year']
-    return start_year, end_year
+    return start_year, end_year, form.cleaned_data['top']
 
 
-def filter_books_by_year(start_year: int, end_year: int) -> Q:
+@dataclass(frozen=True)
+class GenreYearIndex:
     """
-    Creates a filter based on the given start and end years attrs.
+    Cumulative histogram of books over publication years for every genre,
+    counts[g, i] is the number of books of genre g published before first_year + i.
     """
-    book_filter = Q()
-    if start_year:
-        book_filter &= Q(books__year_of_publication__gte=start_year)
-    if end_year:
-        book_filter &= Q(books__year_of_publication__lte=end_year)
-    return book_filter
+    names: list[str]
+    first_year: int
+    counts: np.ndarray
+
+    def count_books(self, start_year: int, end_year: int) -> np.ndarray:
+        """
+        Return the number of books of every genre published in [start_year, end_year].
+        """
+        last = self.counts.shape[1] - 1
+        start = min(max(start_year - self.first_year, 0), last)
+        end = min(max(end_year - self.first_year + 1, start), last)
+        return self.counts[:, end] - self.counts[:, start]
 
 
-def get_genre_statistics(book_filter: Q) -> dict[str, int]:
+def build_genre_year_index() -> GenreYearIndex:
     """
-    Retrieves genre statistics based on the provided book filter.
+    Build the index from the genre per year rollup.
     """
-    genre_counts = Genre.objects.annotate(
-        book_count=Count('books', filter=book_filter)
-    ).values('name', 'book_count').order_by('-book_count')
+    genres = list(Genre.objects.order_by('id').values_list('id', 'name'))
+    rows = np.array(list(GenreYearStat.objects.filter(book_count__gt=0).values_list('genre_id', 'year', 'book_count')),
+                    dtype=np.int64).reshape(-1, 3)
+    first_year = int(rows[:, 1].min()) if len(rows) else 0
+    years = int(rows[:, 1].max()) - first_year + 1 if len(rows) else 0
+    genre_ids = np.array([genre_id for genre_id, _ in genres], dtype=np.int64)
+    histogram = np.zeros((len(genres), years + 1), dtype=np.int64)
+    np.add.at(histogram, (np.searchsorted(genre_ids, rows[:, 0]), rows[:, 1] - first_year + 1), rows[:, 2])
+    return GenreYearIndex([name for _, name in genres], first_year, np.cumsum(histogram, axis=1))
+
+
+_genre_year_index: tuple[int, GenreYearIndex] | None = None
 
-    return {item['name']: item['book_count'] for item in genre_counts}
+
+def get_genre_year_index() -> GenreYearIndex:
+    """
+    Return the index for the current version of the books and their genres, it's built once per process
+    and change of them, the changes of the user libraries keep it.
+    """
+    global _genre_year_index
+    version = get_book_genres_version()
+    if _genre_year_index is None or _genre_year_index[0] != version:
+        _genre_year_index = version, build_genre_year_index()
+    return _genre_year_index[1]
+
+
+def get_genre_statistics(start_year: int, end_year: int, limit: int | None = None) -> dict[str, int]:
+    """
+    Retrieves the number of books of every genre published in the year range.
+    With a limit only the top genres are returned, the books of the other genres are counted as one entry.
+    """
+    index = get_genre_year_index()
+    counts = index.count_books(start_year, end_year)
+    if limit is not None:
+        top = top_n(counts, limit)
+        genre_count_dict = {index.names[i]: int(counts[i]) for i in top}
+        other_count = int(counts.sum() - counts[top].sum())
+        if other_count:
+            genre_count_dict[OTHER_LABEL] = other_count
+        return genre_count_dict
+    order = np.argsort(-counts, kind='stable')
+    return {index.names[i]: int(counts[i]) for i in order}
+
+
+def build_genre_figure(genre_count_dict: dict[str, int], title: str):
+    fig = px.pie(names=list(genre_count_dict.keys()), values=list(genre_count_dict.values()))
+    fig.update_layout(title=title)
+    return fig
 
 
 def render_genre_statistic_view(request: HttpRequest, template_name: str) -> HttpResponse:
@@ -50,19 +108,17 @@ def render_genre_statistic_view(request: HttpRequest, template_name: str) -> Htt
     Renders the genre statistic view.
     """
     try:
-        start_year, end_year = get_years_from_request(request)
+        start_year, end_year, top = get_genre_filter_from_request(request)
     except ValidationError as e:
-        return render(request, template_name, {'form': YearFilterForm(request.GET)})
+        return render(request, template_name, {'form': GenreFilterForm(request.GET)})
 
-    book_filter = filter_books_by_year(start_year, end_year)
-    genre_count_dict = get_genre_statistics(book_filter)
+    genre_count_dict = get_genre_statistics(start_year, end_year, top)
 
-    fig = px.pie(names=list(genre_count_dict.keys()), values=list(genre_count_dict.values()))
-    fig.update_layout(title='Genre statistic')
-    plotly_html = fig.to_html()
+    plotly_html = get_figure_html('genres', genre_count_dict, build_genre_figure,
+                                  slot=(start_year, end_year, top), title='Genre statistic')
 
     context = {
-        'form': YearFilterForm(request.GET),
+        'form': GenreFilterForm(request.GET),
         'fig': plotly_html,
     }
 
@@ -0,0 +1,328 @@
+import datetime
+from collections import Counter, defaultdict
+from functools import partial
+from typing import Iterable
+
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Count, F, Q, DateField
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+
+from apps.library.models import Book, UserBookInstance, ReadingEvent
+from apps.library.utils.cache_utils import get_version, bump_version, bump_book_genres_version
+from ..models import GenreYearStat, GenreStat, AuthorStat, BookStat, ReadingActivity, UserReadingActivity
+
+# sqlite limits the number of variables in a statement
+ROLLUP_CHUNK_SIZE = 500
+
+BookGenre = Book.genre.through
+BookAuthor = Book.authors.through
+
+ROLLUPS_VERSION_KEY = 'statistic:rollups:version'
+
+
+def get_rollups_version() -> int:
+    """
+    Return the version of the library adds and reads rollups, it changes only when their counters change.
+    """
+    return get_version(ROLLUPS_VERSION_KEY)
+
+
+def bump_rollups_version(using: str = DEFAULT_DB_ALIAS) -> None:
+    # on the commit of the changed counters, a reader would load the old ones under the new version
+    transaction.on_commit(partial(bump_version, ROLLUPS_VERSION_KEY), using=using)
+
+
+def chunked(values: list, size: int = ROLLUP_CHUNK_SIZE) -> Iterable[list]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def upsert_deltas(connection, model, key_fields: tuple[str, ...], deltas: dict[tuple, dict[str, int]]) -> None:
+    """
+    Add the deltas with one INSERT ... ON CONFLICT DO UPDATE statement per chunk of keys,
+    missing rows are inserted with the deltas as their counters.
+    """
+    meta = model._meta
+    quote_name = connection.ops.quote_name
+    table = quote_name(meta.db_table)
+    keys = [meta.get_field(name) for name in key_fields]
+    counters = [field for field in meta.concrete_fields if field not in keys and not field.primary_key]
+    columns = ', '.join(quote_name(field.column) for field in [*keys, *counters])
+    conflict = ', '.join(quote_name(field.column) for field in keys)
+    updates = ', '.join(f'{quote_name(field.column)} = {table}.{quote_name(field.column)} + '
+                        f'EXCLUDED.{quote_name(field.column)}' for field in counters)
+    row = f"({', '.join(['%s'] * (len(keys) + len(counters)))})"
+    with connection.cursor() as cursor:
+        for chunk in chunked(list(deltas.items()), ROLLUP_CHUNK_SIZE // (len(keys) + len(counters))):
+            params = []
+            for key, values in chunk:
+                params.extend(field.get_db_prep_value(value, connection) for field, value in zip(keys, key))
+                params.extend(values.get(field.name, 0) for field in counters)
+            cursor.execute(f"INSERT INTO {table} ({columns}) VALUES {', '.join([row] * len(chunk))} "
+                           f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}", params)
+
+
+def apply_deltas(model, key_fields: tuple[str, ...], deltas: dict[tuple, dict[str, int]],
+                 using: str | None = None) -> None:
+    """
+    Add the deltas to the counters of the rollup rows by key, missing rows are created.
+    Counters are changed by the database (count = count + delta), so concurrent changes are not lost.
+    Backends with upserts do it with one statement, the others insert the missing rows
+    and update the keys with the same deltas by one statement.
+    Written to the given database, by default to the one the router picks for the model.
+    """
+    deltas = {key: {field: delta for field, delta in values.items() if delta} for key, values in deltas.items()}
+    deltas = {key: values for key, values in deltas.items() if values}
+    if not deltas:
+        return
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if connection.features.supports_update_conflicts_with_target:
+        upsert_deltas(connection, model, key_fields, deltas)
+        return
+    model.objects.using(using).bulk_create([model(**dict(zip(key_fields, key))) for key in deltas],
+                              ignore_conflicts=True, batch_size=ROLLUP_CHUNK_SIZE)
+    groups = defaultdict(list)
+    for key, values in deltas.items():
+        groups[tuple(sorted(values.items()))].append(key)
+    for values, keys in groups.items():
+        for chunk in chunked(keys, ROLLUP_CHUNK_SIZE // len(key_fields)):
+            if len(key_fields) == 1:
+                query = Q(**{f'{key_fields[0]}__in': [key for key, in chunk]})
+            else:
+                query = Q()
+                for key in chunk:
+                    query |= Q(**dict(zip(key_fields, key)))
+            model.objects.using(using).filter(query).update(**{field: F(field) + delta for field, delta in values})
+
+
+def get_relation_pairs(through, related_field: str, book_ids: Iterable[int]) -> set[tuple[int, int]]:
+    """
+    Return (book_id, related_id) pairs of a many-to-many relation of the books.
+    """
+    pairs = set()
+    for chunk in chunked(list(book_ids)):
+        pairs.update(through.objects.filter(book_id__in=chunk).values_list('book_id', related_field))
+    return pairs
+
+
+def get_book_stats(book_ids: Iterable[int]) -> dict[int, dict[str, int]]:
+    stats = {}
+    for chunk in chunked(list(book_ids)):
+        for book_id, add_count, read_count in BookStat.objects.filter(
+                book_id__in=chunk).values_list('book_id', 'add_count', 'read_count'):
+            stats[book_id] = {'add_count': add_count, 'read_count': read_count}
+    return stats
+
+
+def get_book_years(book_ids: Iterable[int]) -> dict[int, int]:
+    years = {}
+    for chunk in chunked(list(book_ids)):
+        years.update(Book.objects.filter(pk__in=chunk).values_list('id', 'year_of_publication'))
+    return years
+
+
+def update_genre_stats(pairs: Iterable[tuple[int, int]], sign: int) -> None:
+    """
+    Count (book_id, genre_id) pairs added to (sign=1) or removed from (sign=-1) the book genres.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return
+    book_ids = {book_id for book_id, _ in pairs}
+    book_stats = get_book_stats(book_ids)
+    years = get_book_years(book_ids)
+    genre_deltas = defaultdict(Counter)
+    year_deltas = defaultdict(Counter)
+    for book_id, genre_id in pairs:
+        for field, count in book_stats.get(book_id, {}).items():
+            genre_deltas[(genre_id,)][field] += sign * count
+        year_deltas[(genre_id, years[book_id])]['book_count'] += sign
+    apply_deltas(GenreStat, ('genre_id',), genre_deltas)
+    apply_deltas(GenreYearStat, ('genre_id', 'year'), year_deltas)
+    bump_rollups_version()
+
+
+def update_author_stats(pairs: Iterable[tuple[int, int]], sign: int) -> None:
+    """
+    Count (book_id, author_id) pairs added to (sign=1) or removed from (sign=-1) the book authors.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return
+    book_stats = get_book_stats({book_id for book_id, _ in pairs})
+    author_deltas = defaultdict(Counter)
+    for book_id, author_id in pairs:
+        for field, count in book_stats.get(book_id, {}).items():
+            author_deltas[(author_id,)][field] += sign * count
+        author_deltas[(author_id,)]['book_count'] += sign
+    apply_deltas(AuthorStat, ('author_id',), author_deltas)
+    bump_rollups_version()
+
+
+def update_book_year(book_id: int, old_year: int, new_year: int) -> None:
+    """
+    Move the book between the years of its genres.
+    """
+    year_deltas = defaultdict(Counter)
+    for _, genre_id in get_relation_pairs(BookGenre, 'genre_id', [book_id]):
+        year_deltas[(genre_id, old_year)]['book_count'] -= 1
+        year_deltas[(genre_id, new_year)]['book_count'] += 1
+    apply_deltas(GenreYearStat, ('genre_id', 'year'), year_deltas)
+
+
+def add_books_stats(book_ids: Iterable[int]) -> None:
+    """
+    Count new books with their genres and authors.
+    """
+    book_ids = list(book_ids)
+    update_genre_stats(get_relation_pairs(BookGenre, 'genre_id', book_ids), 1)
+    update_author_stats(get_relation_pairs(BookAuthor, 'author_id', book_ids), 1)
+
+
+def remove_books_stats(book_ids: Iterable[int]) -> None:
+    """
+    Uncount the books from their genres and authors, called before the books are deleted.
+    """
+    book_ids = list(book_ids)
+    update_genre_stats(get_relation_pairs(BookGenre, 'genre_id', book_ids), -1)
+    update_author_stats(get_relation_pairs(BookAuthor, 'author_id', book_ids), -1)
+    # the stats of the books are deleted with them
+    bump_rollups_version()
+
+
+def refresh_book_instance_stats(book_ids: Iterable[int]) -> None:
+    """
+    Recount the library adds and reads of the books, the changes are added to their genres and authors.
+    Costs a count over the instances of the given books only.
+    """
+    book_ids = list(set(book_ids))
+    with transaction.atomic():
+        old_stats = {}
+        new_stats = {}
+        for chunk in chunked(book_ids):
+            for book_id, add_count, read_count in BookStat.objects.select_for_update().filter(
+                    book_id__in=chunk).values_list('book_id', 'add_count', 'read_count'):
+                old_stats[book_id] = (add_count, read_count)
+            for book_id, add_count, read_count in UserBookInstance.objects.filter(book_id__in=chunk).values(
+                    'book_id').annotate(add_count=Count('id'), read_count=Count('id', filter=Q(is_read=True))
+                                        ).values_list('book_id', 'add_count', 'read_count'):
+                new_stats[book_id] = (add_count, read_count)
+
+        book_deltas = {}
+        for book_id in book_ids:
+            old_add, old_read = old_stats.get(book_id, (0, 0))
+            new_add, new_read = new_stats.get(book_id, (0, 0))
+            if (old_add, old_read) != (new_add, new_read):
+                book_deltas[book_id] = {'add_count': new_add - old_add, 'read_count': new_read - old_read}
+        if not book_deltas:
+            return
+
+        apply_deltas(BookStat, ('book_id',), {(book_id,): values for book_id, values in book_deltas.items()})
+        genre_deltas = defaultdict(Counter)
+        author_deltas = defaultdict(Counter)
+        for book_id, genre_id in get_relation_pairs(BookGenre, 'genre_id', book_deltas):
+            genre_deltas[(genre_id,)].update(book_deltas[book_id])
+        for book_id, author_id in get_relation_pairs(BookAuthor, 'author_id', book_deltas):
+            author_deltas[(author_id,)].update(book_deltas[book_id])
+        apply_deltas(GenreStat, ('genre_id',), genre_deltas)
+        apply_deltas(AuthorStat, ('author_id',), author_deltas)
+        bump_rollups_version()
+
+
+ACTIVITY_COUNTERS = {
+    ReadingEvent.Action.ADD: 'add_count',
+    ReadingEvent.Action.REMOVE: 'remove_count',
+    ReadingEvent.Action.READ: 'read_count',
+    ReadingEvent.Action.UNREAD: 'unread_count',
+}
+
+ACTIVITY_TRUNCATES = {
+    ReadingActivity.Period.DAY: TruncDay,
+    ReadingActivity.Period.WEEK: TruncWeek,
+    ReadingActivity.Period.MONTH: TruncMonth,
+}
+
+
+def get_period_starts(day: datetime.date) -> dict[str, datetime.date]:
+    """
+    Return the first day of the day, week and month buckets of the day.
+    """
+    return {
+        ReadingActivity.Period.DAY: day,
+        ReadingActivity.Period.WEEK: day - datetime.timedelta(days=day.weekday()),
+        ReadingActivity.Period.MONTH: day.replace(day=1),
+    }
+
+
+def update_reading_activity(events: Iterable[ReadingEvent]) -> None:
+    """
+    Count the new reading events in the buckets of all users and of their users.
+    """
+    deltas = defaultdict(Counter)
+    user_deltas = defaultdict(Counter)
+    for event in events:
+        counter = ACTIVITY_COUNTERS[event.action]
+        for period, start in get_period_starts(timezone.localdate(event.created_at)).items():
+            deltas[(period, start)][counter] += 1
+            user_deltas[(event.user_id, period, start)][counter] += 1
+    apply_deltas(ReadingActivity, ('period', 'start'), deltas)
+    apply_deltas(UserReadingActivity, ('user_id', 'period', 'start'), user_deltas)
+
+
+def rebuild_reading_activity(using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Recompute the reading activity rollups from the reading log.
+    """
+    counters = {field: Count('id', filter=Q(action=action)) for action, field in ACTIVITY_COUNTERS.items()}
+    with transaction.atomic(using=using):
+        ReadingActivity.objects.using(using).all().delete()
+        UserReadingActivity.objects.using(using).all().delete()
+        for period, truncate in ACTIVITY_TRUNCATES.items():
+            events = ReadingEvent.objects.using(using).annotate(
+                start=truncate('created_at', output_field=DateField())).order_by()
+            ReadingActivity.objects.using(using).bulk_create([
+                ReadingActivity(period=period, **row) for row in events.values('start').annotate(**counters)
+            ], batch_size=ROLLUP_CHUNK_SIZE)
+            UserReadingActivity.objects.using(using).bulk_create([
+                UserReadingActivity(period=period, **row)
+                for row in events.values('user_id', 'start').annotate(**counters)
+            ], batch_size=ROLLUP_CHUNK_SIZE)
+
+
+def rebuild_statistics(using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Recompute all rollup tables of the database from scratch.
+    """
+    instances = UserBookInstance.objects.using(using).all()
+    adds_and_reads = {'add_count': Count('id'), 'read_count': Count('id', filter=Q(is_read=True))}
+    with transaction.atomic(using=using):
+        for model in (GenreYearStat, GenreStat, AuthorStat, BookStat):
+            model.objects.using(using).all().delete()
+
+        GenreYearStat.objects.using(using).bulk_create([
+            GenreYearStat(**row) for row in BookGenre.objects.using(using).values(
+                'genre_id', year=F('book__year_of_publication')).annotate(book_count=Count('id'))
+        ], batch_size=ROLLUP_CHUNK_SIZE)
+        BookStat.objects.using(using).bulk_create([
+            BookStat(**row) for row in instances.values('book_id').annotate(**adds_and_reads)
+        ], batch_size=ROLLUP_CHUNK_SIZE)
+        GenreStat.objects.using(using).bulk_create([
+            GenreStat(**row) for row in instances.filter(book__genre__isnull=False).values(
+                genre_id=F('book__genre')).annotate(**adds_and_reads)
+        ], batch_size=ROLLUP_CHUNK_SIZE)
+
+        authors = defaultdict(dict)
+        for row in BookAuthor.objects.using(using).values('author_id').annotate(book_count=Count('id')):
+            authors[row.pop('author_id')].update(row)
+        for row in instances.filter(book__authors__isnull=False).values(
+                author_id=F('book__authors')).annotate(**adds_and_reads):
+            authors[row.pop('author_id')].update(row)
+        AuthorStat.objects.using(using).bulk_create([
+            AuthorStat(author_id=author_id, **values) for author_id, values in authors.items()
+        ], batch_size=ROLLUP_CHUNK_SIZE)
+        bump_rollups_version(using)
+        # the genre per year rollup is rewritten too
+        transaction.on_commit(bump_book_genres_version, using=using)
+        rebuild_reading_activity(using)
@@ -3,6 +3,7 @@ from django.core.handlers.wsgi import WSGIRequest
 from django.shortcuts import render
 
 from . import utils
+from .utils.generic import async_login_required
 
 
 @login_required
@@ -46,8 +47,16 @@ def books_read_statistics_view(request: WSGIRequest):
 
 
 @login_required
-def general_statistics_view(request):
+def reading_activity_statistics_view(request: WSGIRequest):
     """
-    View function for rendering the authors statistics page.
+    View function for rendering the reading activity statistics page.
+    """
+    return utils.render_reading_activity_view(request, 'statistic/reading_activity_statistic.html')
+
+
+@async_login_required
+async def general_statistics_view(request):
+    """
+    View function for rendering the general statistics page, its queries run concurrently.
     """
-    return utils.render_general_statistic_view(request, 'statistic/general_statistics.html')
+    return await utils.arender_general_statistic_view(request, 'statistic/general_statistics.html')
@@ -46,6 +46,9 @@ INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
+# the toolbar instruments every request, it's installed for development only
+DEBUG_TOOLBAR = os.getenv('DEBUG_TOOLBAR', str(DEBUG)) == 'True'
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -56,30 +59,34 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
 
-    'debug_toolbar',
-
     'apps.account',
     'apps.library',
     'apps.statistic',
+    'apps.metrics',
 ]
 
 MIDDLEWARE = [
+    'apps.metrics.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.metrics.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # the django backend recording the render time of the templates in the request metrics
+        'BACKEND': 'apps.metrics.backends.DjangoTemplates',
         'DIRS': [
             BASE_DIR / 'templates',
         ],
@@ -107,6 +114,48 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# CACHE_BACKEND: locmem, file or db (the db backend requires `manage.py createcachetable`)
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'books-library',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / '.cache'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'cache_table'),
+    },
+}
+
+# the catalog and user library versions live in the cache and have to be shared by all the worker processes,
+# locmem is per process and fits the development server only (`manage.py check --deploy` rejects it)
+CACHES = {
+    'default': CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem' if DEBUG else 'file')],
+}
+
+# Metrics
+# every worker process writes its metrics to a file of the directory at most every METRICS_FLUSH_INTERVAL seconds,
+# /metrics sums the files and merges the files of the exited processes into one,
+# clear the directory on deploy to start the counters from zero
+
+METRICS_DIR = os.getenv('METRICS_DIR', BASE_DIR / '.metrics')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# /metrics is served to the listed addresses and to the requests with the `Authorization: Bearer <METRICS_TOKEN>`
+# header, by default to neither. The addresses are matched against REMOTE_ADDR, behind a reverse proxy it is the
+# address of the proxy for every client, so do not list addresses there and give the scraper the token instead
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# the requests of staff users sent with the X-Profile header or the _profile query parameter are profiled,
+# every profile is saved to a directory of its own
+PROFILES_DIR = os.getenv('PROFILES_DIR', BASE_DIR / '.profiles')
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -140,7 +189,24 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'apps.statistic.finders.PlotlyFinder',
+]
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # set to django.contrib.staticfiles.storage.ManifestStaticFilesStorage in production,
+    # collected files get content hashes in their names and can be cached forever
+    'staticfiles': {
+        'BACKEND': os.getenv('STATICFILES_BACKEND', 'django.contrib.staticfiles.storage.StaticFilesStorage'),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
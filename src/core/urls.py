@@ -4,8 +4,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
-    path('__debug__/', include('debug_toolbar.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', include('apps.metrics.urls', namespace='metrics')),
 
     # site paths
     path('account/', include('apps.account.urls', namespace='account')),
@@ -13,5 +13,8 @@ urlpatterns = [
     path('statistic/', include('apps.statistic.urls', namespace='statistic')),
 ]
 
+if settings.DEBUG_TOOLBAR:
+    urlpatterns.insert(0, path('__debug__/', include('debug_toolbar.urls')))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,7 +1,13 @@
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from io import BytesIO
 
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile, SimpleUploadedFile
+from django.db import connections
+from django.db.backends.signals import connection_created
 
 from apps.library.models import Book, Genre, Author
 
@@ -46,3 +52,73 @@ def create_book_in_db(
                          Genre.objects.get(name='Genre Name 2')])
     test_book.authors.set([Author.objects.get(first_name='Author First Name 1'),
                            Author.objects.get(first_name='Author First Name 2')])
+
+
+@contextmanager
+def capture_all_queries():
+    """
+    Record the sql of the queries run while in the block on every connection,
+    the connections opened by other threads, like the ones of async views, included.
+    """
+    queries = []
+    lock = threading.Lock()
+    wrapped = []
+
+    def record(execute, sql, params, many, context):
+        with lock:
+            queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def add_recorder(sender, connection, **kwargs):
+        if record not in connection.execute_wrappers:
+            with lock:
+                wrapped.append(connection)
+            connection.execute_wrappers.append(record)
+
+    connection_created.connect(add_recorder)
+    for connection in connections.all(initialized_only=True):
+        add_recorder(None, connection)
+    try:
+        yield queries
+    finally:
+        connection_created.disconnect(add_recorder)
+        for connection in wrapped:
+            if record in connection.execute_wrappers:
+                connection.execute_wrappers.remove(record)
+
+
+class QueryBudgetMixin(ABC):
+    """
+    Assertions on the number of queries a view runs. The budgets are declared as constants and checked
+    on catalogs of every size of catalog_sizes, grow_catalog adds the data up to the size,
+    so a view whose queries grow with the number of books fails on the larger one.
+    """
+    catalog_sizes = (2, 30)
+
+    @abstractmethod
+    def grow_catalog(self, size: int):
+        """
+        Add the data the budgets are checked on up to the size.
+        """
+
+    @contextmanager
+    def assertMaxQueries(self, budget: int, name: str = ''):
+        # the budget covers the uncached path
+        cache.clear()
+        with capture_all_queries() as queries:
+            yield queries
+        if len(queries) > budget:
+            listing = '\n'.join(f'{i}. {sql}' for i, sql in enumerate(queries, start=1))
+            self.fail(f'{name or "block"} ran {len(queries)} queries, over the budget of {budget}:\n{listing}')
+
+    def assertViewBudget(self, budget: int, name: str, request):
+        """
+        Check the budget of the view at every catalog size. request is called after the catalog grew
+        and returns the function sending the request, so that preparing it is not counted.
+        """
+        for size in self.catalog_sizes:
+            self.grow_catalog(size)
+            send = request()
+            with self.subTest(size=size), self.assertMaxQueries(budget, name):
+                response = send()
+            self.assertLess(response.status_code, 400)